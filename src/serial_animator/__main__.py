@@ -0,0 +1,5 @@
+import sys
+
+from serial_animator.cli import main
+
+sys.exit(main())
@@ -1,19 +1,28 @@
-import os
-import shutil
+from __future__ import annotations
+
 from pathlib import Path
-from typing import List, Tuple, Optional, Literal, Iterable
+from typing import List, Tuple, Optional, Literal, Iterable, Collection, Generator
 from collections import OrderedDict
 
 import serial_animator.find_nodes as find_nodes
 
-import pymel.core as pm
+import numpy as np
+from maya import cmds, mel
 from serial_animator.file_io import (
-    write_json_data,
-    archive_files,
+    get_member_name,
+    iter_json_data,
     read_data_from_archive,
+    iter_json_items_from_archive,
 )
 from serial_animator.utils import Undo
+from serial_animator.key_arrays import TimeTransform, transform_key_data
+import serial_animator.archive_header as archive_header
+import serial_animator.chunked_archive as chunked_archive
+import serial_animator.key_reduction as key_reduction
+import serial_animator.quantization as quantization
+import serial_animator.sampled_channels as sampled_channels
 import serial_animator.find_nodes
+from serial_animator.save_queue import Progress, ignore_progress
 
 
 from serial_animator import log
@@ -22,6 +31,13 @@ from serial_animator.exceptions import SerialAnimatorError
 _logger = log.log(__name__)
 _logger.setLevel("DEBUG")
 
+SKIP_EPSILON = 1e-6
+ANIM_CURVE_TYPES = {
+    "doubleLinear": "animCurveTL",
+    "doubleAngle": "animCurveTA",
+    "time": "animCurveTT",
+}
+
 
 class SerialAnimatorKeyError(SerialAnimatorError):
     pass
@@ -62,9 +78,9 @@ KeyDataType = OrderedDict[float, Tuple[float, TangentDataType]]
 
 class SerialAnimatorNoKeyError(SerialAnimatorKeyError):
     def __init__(
-            self,
-            message: Optional[str] = None,
-            attribute: Optional[pm.general.Attribute] = None,
+        self,
+        message: Optional[str] = None,
+        attribute: Optional[str] = None,
     ):
         if not message:
             if attribute:
@@ -76,36 +92,184 @@ class SerialAnimatorNoKeyError(SerialAnimatorKeyError):
 
 @Undo(name="Serial-Animator: Load Animation")
 def load_animation(
-        path: Path, nodes=None, start: Optional[float] = None, end: Optional[float] = None
-):
-    data = read_animation_data(path)
-    node_dict = find_nodes.search_nodes(list(data.keys()), nodes)
-    for node_name, node_data in data.items():
-        node = node_dict.get(node_name)
-        if node:
-            set_node_data(node, data[node_name], start, end)
+    path: Path,
+    nodes=None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    skip_unchanged: bool = False,
+    offset: Optional[float] = None,
+    fit_range: Optional[Tuple[float, float]] = None,
+    convert_time_unit: bool = False,
+    to_current_time: bool = False,
+) -> dict:
+    """
+    Loads animation from archive at path onto nodes. If skip_unchanged
+    is True, curves already matching the archive are left untouched.
+
+    Key-times can be transformed on load, in this order:
+    convert_time_unit converts from the archive's fps to the scene's,
+    fit_range retimes the saved frame-range to fit (start, end),
+    to_current_time moves the first frame to current time and offset
+    moves keys by a number of frames. start and end clip the
+    transformed keys.
+    Returns a dict with the number of "written" and "skipped" curves
+    """
+    meta_data = extract_meta_data(path)
+    transform = None
+    if offset or fit_range or convert_time_unit or to_current_time:
+        transform = get_time_transform(
+            meta_data,
+            offset=offset,
+            fit_range=fit_range,
+            convert_time_unit=convert_time_unit,
+            to_current_time=to_current_time,
+        )
+        _logger.debug(f"Loading with {transform}")
+    node_names = meta_data.get("nodes")
+    if node_names is None:
+        node_names = list(read_animation_data(path).keys())
+    node_dict = find_nodes.search_nodes(node_names, nodes)
+    stats = {"written": 0, "skipped": 0}
+    if not node_dict:
+        _logger.warning(f"No nodes matching animation in {path}")
+        return stats
+    # only decode data for the nodes and frames we need, one node at a time
+    source_start, source_end = start, end
+    if transform:
+        source_start, source_end = transform.unmap_range(start, end)
+    for node_name, node_data in iter_animation_data(
+        path, node_dict.keys(), source_start, source_end
+    ):
+        node = node_dict[node_name]
+        node_data = transform_node_data(node_data, transform, start, end)
+        node_stats = set_node_data(
+            node, node_data, start, end, skip_unchanged=skip_unchanged
+        )
+        stats["written"] += node_stats["written"]
+        stats["skipped"] += node_stats["skipped"]
+    _logger.info(
+        f"Loaded {stats['written']} curves from {path}. "
+        f"Skipped {stats['skipped']} unchanged curves"
+    )
+    return stats
+
+
+def get_time_transform(
+    meta_data: dict,
+    offset: Optional[float] = None,
+    fit_range: Optional[Tuple[float, float]] = None,
+    convert_time_unit: bool = False,
+    to_current_time: bool = False,
+) -> TimeTransform:
+    """Gets transform of key-times when loading animation described by meta_data"""
+    transform = TimeTransform()
+    source_range = meta_data.get("frame_range")
+    if convert_time_unit:
+        transform.convert_time_unit(meta_data.get("time_unit"), get_time_unit())
+    if fit_range:
+        transform.fit_range([transform.map_time(t) for t in source_range], fit_range)
+    if to_current_time:
+        transform.offset(get_current_time() - transform.map_time(source_range[0]))
+    if offset:
+        transform.offset(offset)
+    return transform
+
+
+def transform_node_data(
+    node_data: dict,
+    transform: Optional[TimeTransform] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+) -> dict:
+    """
+    Transforms and clips keys for all attributes in node_data.
+    Attributes left without keys are removed
+    """
+    if transform is None and start is None and end is None:
+        return node_data
+    transformed = dict()
+    for attribute_name, attribute_data in node_data.items():
+        if sampled_channels.is_sampled(attribute_data):
+            samples = attribute_data[sampled_channels.SAMPLES_KEY]
+            if transform and not transform.is_identity():
+                samples = sampled_channels.transform_samples(samples, transform)
+            samples = sampled_channels.clip_samples(samples, start, end)
+            if samples:
+                transformed[attribute_name] = dict(attribute_data, samples=samples)
+            continue
+        keys = transform_key_data(attribute_data.get("keys"), transform, start, end)
+        if keys:
+            transformed[attribute_name] = dict(attribute_data, keys=keys)
+    return transformed
 
 
 def read_animation_data(path: Path) -> dict:
+    if chunked_archive.is_chunked_archive(path):
+        return dict(chunked_archive.iter_chunked_animation_data(path))
     return read_data_from_archive(path, json_name="anim_data.json")
 
 
-def get_nodes_with_animation() -> [pm.PyNode]:
+def iter_animation_data(
+    path: Path,
+    node_names: Optional[Collection[str]] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+) -> Generator[Tuple[str, dict], None, None]:
+    """
+    Streams animation-data from archive one node at a time, so peak
+    memory is proportional to the largest node instead of the file.
+    If node_names is given, only those nodes are decoded. Keys are
+    clipped to start and end. Chunked archives only read the chunks
+    overlapping start to end
+    """
+    if chunked_archive.is_chunked_archive(path):
+        items = chunked_archive.iter_chunked_animation_data(
+            path, node_names, start, end
+        )
+    else:
+        items = iter_json_items_from_archive(path, "anim_data.json", keys=node_names)
+    for node_name, node_data in items:
+        yield node_name, transform_node_data(node_data, start=start, end=end)
+
+
+def get_nodes_with_animation() -> List[str]:
     """
     Gets animated nodes either from selection or if nothing is selected,
     from all scene nodes
     """
-    nodes = pm.selected() or pm.ls()
+    nodes = cmds.ls(selection=True, long=True) or cmds.ls(long=True)
     # don't find animation curves as we will get those from nodes connected to them
-    nodes = [node for node in nodes if not isinstance(node, pm.nodetypes.AnimCurve)]
-    return [node for node in nodes if has_animation(node)]
+    curves = set(cmds.ls(nodes, type="animCurve", long=True))
+    return [node for node in nodes if node not in curves and has_animation(node)]
 
 
-def get_selection() -> List[pm.PyNode]:
-    return pm.selected()
+def get_selection() -> List[str]:
+    return cmds.ls(selection=True, long=True)
 
 
-def get_infinity(attribute: pm.general.Attribute) -> Tuple[InfinityType, InfinityType]:
+def get_plug_name(attribute) -> str:
+    """
+    Gets the full name of a PyMEL attribute. Plug-names from maya.cmds
+    are expected to be full names already
+    """
+    if isinstance(attribute, str):
+        return attribute
+    return attribute.name(fullDagPath=True)
+
+
+def get_time_range(start: Optional[float] = None, end: Optional[float] = None) -> dict:
+    """Gets the time-flag for key-commands limited to start and end"""
+    if start is None and end is None:
+        return dict()
+    if start is None or end is None:
+        # open-ended ranges are only supported as strings, like "10:"
+        start = "" if start is None else start
+        end = "" if end is None else end
+        return {"time": (f"{start}:{end}",)}
+    return {"time": (start, end)}
+
+
+def get_infinity(attribute) -> Tuple[InfinityType, InfinityType]:
     """
     Gets the pre- and post-infinity for attribute.
     States are:
@@ -114,7 +278,9 @@ def get_infinity(attribute: pm.general.Attribute) -> Tuple[InfinityType, Infinit
     :raises: SerialAnimatorNoKeyError
     :return: pre-infinity, post-infinity
     """
-    res = pm.setInfinity(attribute, preInfinite=True, postInfinite=True, query=True)
+    res = cmds.setInfinity(
+        get_plug_name(attribute), preInfinite=True, postInfinite=True, query=True
+    )
     if res:
         return tuple(res)
     else:
@@ -122,9 +288,9 @@ def get_infinity(attribute: pm.general.Attribute) -> Tuple[InfinityType, Infinit
 
 
 def set_infinity(
-        attribute: pm.general.Attribute,
-        pre_infinity: InfinityType,
-        post_infinity: InfinityType,
+    attribute,
+    pre_infinity: InfinityType,
+    post_infinity: InfinityType,
 ):
     """
     Sets the pre- and post-infinity for attribute.
@@ -138,57 +304,101 @@ def set_infinity(
     :param pre_infinity: string representing infinity-type
     :param post_infinity: string representing infinity-type
     """
-    pm.setInfinity(attribute, preInfinite=pre_infinity, postInfinite=post_infinity)
+    cmds.setInfinity(
+        get_plug_name(attribute),
+        preInfinite=pre_infinity,
+        postInfinite=post_infinity,
+    )
 
 
-def get_weighted_tangents(attribute: pm.general.Attribute) -> bool:
+def get_weighted_tangents(attribute) -> bool:
     """
     Checks if keys on an attribute have weighted tangents
     :param attribute: attribute with keys
     :raises: SerialAnimatorNoKeyError
     :return: True if keys have weighted tangents, false if not.
     """
-    weighted_tangents = pm.keyTangent(attribute, weightedTangents=True, query=True)
+    weighted_tangents = cmds.keyTangent(
+        get_plug_name(attribute), weightedTangents=True, query=True
+    )
     if weighted_tangents:
         return weighted_tangents[0]
     else:
         raise SerialAnimatorNoKeyError(attribute=attribute)
 
 
-def set_weighted_tangents(attribute: pm.general.Attribute, weighted: bool) -> bool:
+def set_weighted_tangents(attribute, weighted: bool):
     """
     Sets weighted tangents for keys on an attribute
     """
-    pm.keyTangent(attribute, weightedTangents=weighted)
+    cmds.keyTangent(get_plug_name(attribute), weightedTangents=weighted)
 
 
 def has_animation(node):
     """Tests if node has keyframes"""
-    return pm.keyframe(node, q=True, keyframeCount=True) > 0
+    node_name = find_nodes.get_node_path(node)
+    return (cmds.keyframe(node_name, query=True, keyframeCount=True) or 0) > 0
 
 
 def set_node_data(
-        node, data, start: Optional[float] = None, end: Optional[float] = None
-):
+    node,
+    data,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    skip_unchanged: bool = False,
+    epsilon: float = SKIP_EPSILON,
+) -> dict:
+    """
+    Sets animation-data on node's attributes. If skip_unchanged is
+    True, attributes whose curves already match data within epsilon
+    are not cut and re-keyed.
+    Returns a dict with the number of "written" and "skipped" curves
+    """
+    stats = {"written": 0, "skipped": 0}
+    node_name = find_nodes.get_node_path(node)
     for attribute_name, attribute_data in data.items():
         input_type = attribute_data.get("attributeType")
-        if not hasattr(node, attribute_name):
+        if not cmds.attributeQuery(attribute_name, node=node_name, exists=True):
             _logger.debug(f"{node}.{attribute_name} doesn't exist. Adding attribute")
-            node.addAttr(attribute_name, attributeType=input_type, keyable=True)
-        attribute = node.attr(attribute_name)
-        attribute_type = attribute.type()
+            cmds.addAttr(
+                node_name,
+                longName=attribute_name,
+                attributeType=input_type,
+                keyable=True,
+            )
+        attribute = f"{node_name}.{attribute_name}"
+        attribute_type = cmds.getAttr(attribute, type=True)
         if input_type != attribute_type:
             raise SerialAnimatorAttributeMismatchError(
                 f"Error loading animation. {node}.{attribute_name} of type {attribute_type} "
                 f"doesn't match input type {input_type}"
             )
+        if skip_unchanged and attribute_data_matches(
+            attribute, attribute_data, start=start, end=end, epsilon=epsilon
+        ):
+            _logger.debug(f"{attribute} is unchanged. Skipping!")
+            stats["skipped"] += 1
+            continue
+        if sampled_channels.is_sampled(attribute_data):
+            samples = sampled_channels.clip_samples(
+                attribute_data[sampled_channels.SAMPLES_KEY], start, end
+            )
+            if samples:
+                set_sampled_data(attribute, samples)
+                set_infinity(
+                    attribute=attribute,
+                    pre_infinity=attribute_data.get("preInfinity"),
+                    post_infinity=attribute_data.get("postInfinity"),
+                )
+                stats["written"] += 1
+            continue
         key_data = attribute_data.get("keys")
         remove_existing_keys(attribute, key_data, start=start, end=end)
         weighted_tangents = attribute_data.get("weightedTangents")
         set_infinity(
             attribute=attribute,
             pre_infinity=attribute_data.get("preInfinity"),
-            post_infinity=attribute_data.get("preInfinity"),
+            post_infinity=attribute_data.get("postInfinity"),
         )
 
         set_key_data(
@@ -198,43 +408,171 @@ def set_node_data(
             end=end,
             weighted_tangents=weighted_tangents,
         )
+        stats["written"] += 1
+    return stats
+
+
+def attribute_data_matches(
+    attribute,
+    attribute_data: dict,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    epsilon: float = SKIP_EPSILON,
+) -> bool:
+    """
+    Checks if the curve on attribute already matches attribute_data
+    within epsilon in the time-range the data would be written to
+    """
+    sampled = sampled_channels.is_sampled(attribute_data)
+    if sampled:
+        samples = sampled_channels.clip_samples(
+            attribute_data[sampled_channels.SAMPLES_KEY], start, end
+        )
+        if samples is None:
+            return True
+        key_data = sampled_channels.samples_to_key_data(samples)
+    else:
+        key_data = attribute_data.get("keys")
+    incoming = [
+        (float(time), key)
+        for time, key in key_data.items()
+        if is_in_range(float(time), start, end)
+    ]
+    if not incoming:
+        return True
+    try:
+        pre_infinity, post_infinity = get_infinity(attribute)
+        weighted_tangents = get_weighted_tangents(attribute)
+    except SerialAnimatorNoKeyError:
+        return False
+    if (
+        pre_infinity != attribute_data.get("preInfinity")
+        or post_infinity != attribute_data.get("postInfinity")
+        or weighted_tangents != attribute_data.get("weightedTangents")
+    ):
+        return False
+    existing = get_key_data(attribute, incoming[0][0], incoming[-1][0])
+    if len(existing) != len(incoming):
+        return False
+    for (time, (value, tangent)), (in_time, (in_value, in_tangent)) in zip(
+        existing.items(), incoming
+    ):
+        if abs(time - in_time) > epsilon:
+            return False
+        if sampled:
+            # samples are stored as float32 and only imply tangent-types
+            if abs(value - in_value) > max(epsilon, abs(in_value) * 1e-6):
+                return False
+            if tangent[4:6] != in_tangent[4:6]:
+                return False
+            continue
+        if abs(value - in_value) > epsilon:
+            return False
+        for item, in_item in zip(tangent, in_tangent):
+            if isinstance(item, float):
+                if abs(item - in_item) > epsilon:
+                    return False
+            elif item != in_item:
+                return False
+    return True
+
+
+def set_sampled_data(attribute, samples: dict):
+    """
+    Writes sampled values onto attribute's curve, replacing keys in
+    their range. The values are set on a temporary curve in one call
+    and pasted onto the attribute, so it stays undoable
+    """
+    times = sampled_channels.get_sample_times(samples)
+    values = sampled_channels.decode_values(samples["values"])
+    count = len(times)
+    curve = cmds.createNode(get_anim_curve_type(attribute))
+    try:
+        cmds.setAttr(
+            f"{curve}.ktv[0:{count - 1}]",
+            *np.column_stack((times, values)).ravel().tolist(),
+            size=count,
+        )
+        out_type = "linear"
+        if samples["interpolation"] == sampled_channels.STEP:
+            out_type = "step"
+        cmds.keyTangent(curve, inTangentType="linear", outTangentType=out_type)
+        cmds.copyKey(curve)
+        start = float(times[0])
+        cmds.pasteKey(get_plug_name(attribute), option="replace", time=(start, start))
+    finally:
+        cmds.delete(curve)
+
+
+def get_anim_curve_type(attribute) -> str:
+    """Gets type of anim-curve driving an attribute of attribute's type"""
+    attribute_type = cmds.getAttr(get_plug_name(attribute), type=True)
+    return ANIM_CURVE_TYPES.get(attribute_type, "animCurveTU")
+
+
+def is_in_range(
+    time: float, start: Optional[float] = None, end: Optional[float] = None
+) -> bool:
+    """Checks if time is between start and end. None means no bound"""
+    if start is not None and time < start:
+        return False
+    if end is not None and time > end:
+        return False
+    return True
 
 
 def remove_existing_keys(
-        attribute,
-        key_data,
-        start: Optional[float] = None,
-        end: Optional[float] = None,
+    attribute,
+    key_data,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
 ):
     # get range of keys to remove
     time_values = list(key_data)
     min_frame = float(time_values[0])
     max_frame = float(time_values[-1])
-    if start:
+    if start is not None:
         min_frame = max(start, min_frame)
-    if end:
+    if end is not None:
         max_frame = min(end, max_frame)
     # remove existing keys in area we are writing data to
-    pm.cutKey(attribute, time=(min_frame, max_frame), clear=True)
+    cmds.cutKey(get_plug_name(attribute), time=(min_frame, max_frame), clear=True)
 
 
 def get_node_data(node, start: Optional[float] = None, end: Optional[float] = None):
     data = dict()
-    for attribute, _ in node.inputs(
-            plugs=True, connections=True, type=pm.nodetypes.AnimCurve
-    ):
+    node_name = find_nodes.get_node_path(node)
+    connections = cmds.listConnections(
+        node_name,
+        source=True,
+        destination=False,
+        plugs=True,
+        connections=True,
+        type="animCurve",
+    )
+    # connections alternate between the node's plug and the curve's output
+    for plug in (connections or list())[::2]:
         # todo: if node have keys out of range, should keyframes be inserted at start, end?
         # nodes might have keyframes out of range of start, end
+        attribute = f"{node_name}.{plug.split('.', 1)[1]}"
         attribute_data = get_attribute_data(attribute=attribute, start=start, end=end)
         if attribute_data["keys"]:
-            data[attribute.shortName()] = attribute_data
+            data[get_short_name(attribute)] = attribute_data
     return data
 
 
+def get_short_name(attribute: str) -> str:
+    """Gets the short name of a plug's attribute, keeping its index"""
+    node_name, attribute_path = attribute.split(".", 1)
+    name, bracket, index = attribute_path.split(".")[-1].partition("[")
+    short_name = cmds.attributeQuery(name, node=node_name, shortName=True)
+    return f"{short_name}{bracket}{index}"
+
+
 def get_attribute_data(
-        attribute: pm.general.Attribute,
-        start: Optional[float] = None,
-        end: Optional[float] = None,
+    attribute,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
 ) -> dict:
     """
     Gets key-data for attribute
@@ -245,7 +583,7 @@ def get_attribute_data(
     """
     data = dict()
     pre_infinity, post_infinity = get_infinity(attribute)
-    data["attributeType"] = attribute.type()
+    data["attributeType"] = cmds.getAttr(get_plug_name(attribute), type=True)
     data["preInfinity"] = pre_infinity
     data["postInfinity"] = post_infinity
     data["weightedTangents"] = get_weighted_tangents(attribute)
@@ -255,9 +593,9 @@ def get_attribute_data(
 
 
 def get_key_data(
-        attribute: pm.general.Attribute,
-        start: Optional[float] = None,
-        end: Optional[float] = None,
+    attribute,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
 ) -> KeyDataType:
     """
     Gets the animation-data for an attribute
@@ -284,18 +622,22 @@ def get_key_data(
 
     """
     data = OrderedDict()
-    time_values = pm.keyframe(
-        attribute,
+    plug = get_plug_name(attribute)
+    time_range = get_time_range(start, end)
+    # a flat list of time and value for each key
+    time_values = cmds.keyframe(
+        plug,
         query=True,
-        time=(start, end),
         absolute=True,
         timeChange=True,
         valueChange=True,
+        **time_range,
     )
-    tangent_values = pm.keyTangent(
-        attribute,
+    if not time_values:
+        return data
+    tangent_values = cmds.keyTangent(
+        plug,
         query=True,
-        time=(start, end),
         inAngle=True,
         outAngle=True,
         inWeight=True,
@@ -304,21 +646,22 @@ def get_key_data(
         outTangentType=True,
         lock=True,
         weightLock=True,
+        **time_range,
     )
-    for i, time_value in enumerate(time_values):
-        time, value = time_value
-        start_index = i * 8
-        tangent = tuple(tangent_values[start_index: start_index + 8])
+    for i in range(0, len(time_values), 2):
+        time, value = time_values[i : i + 2]
+        start_index = i * 4
+        tangent = tuple(tangent_values[start_index : start_index + 8])
         data[float(time)] = (value, tangent)
     return data
 
 
 def set_key_data(
-        attribute: pm.general.Attribute,
-        data: KeyDataType,
-        start: Optional[float] = None,
-        end: Optional[float] = None,
-        weighted_tangents: Optional[bool] = True,
+    attribute,
+    data: KeyDataType,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    weighted_tangents: Optional[bool] = True,
 ):
     """
     Removes existing keyframes in time-range and create new keys based on data
@@ -328,27 +671,26 @@ def set_key_data(
     :param end: ignore data after end
     :param weighted_tangents: If False, Maya will not be able to set lock-state of tangents
     """
+    plug = get_plug_name(attribute)
     should_change_curve_weight = False
     # if we are trying to set weighted tangents, we need to ensure that
     # the curve has that set. In order to do that, the curve must have keys
     if weighted_tangents is True:
-        if pm.keyTangent(attribute, weightedTangents=True, query=True) is not True:
+        weighted = cmds.keyTangent(plug, weightedTangents=True, query=True)
+        if not weighted or weighted[0] is not True:
             should_change_curve_weight = True
     for time, key_data in data.items():
-        if start:
-            if time < start:
-                continue
-        if end:
-            if time > end:
-                continue
+        time = float(time)
+        if not is_in_range(time, start, end):
+            continue
         value, tangent_data = key_data
-        pm.setKeyframe(attribute, time=time, value=value)
+        cmds.setKeyframe(plug, time=time, value=value)
         if should_change_curve_weight:
             # this is not settable before curve has keys!
-            set_weighted_tangents(attribute=attribute, weighted=weighted_tangents)
+            set_weighted_tangents(attribute=plug, weighted=weighted_tangents)
             should_change_curve_weight = False
         set_tangent(
-            attribute,
+            plug,
             time=time,
             tangent_data=tangent_data,
             curve_weights=weighted_tangents,
@@ -356,10 +698,10 @@ def set_key_data(
 
 
 def set_tangent(
-        attribute: pm.general.Attribute,
-        time: float,
-        tangent_data: TangentDataType,
-        curve_weights: Optional[bool] = True,
+    attribute,
+    time: float,
+    tangent_data: TangentDataType,
+    curve_weights: Optional[bool] = True,
 ):
     """Sets tangent-data for keyframe at time"""
     (
@@ -372,65 +714,169 @@ def set_tangent(
         lock,
         weight_lock,
     ) = tangent_data
-    pm.keyTangent(
-        attribute,
-        time=time,
+    plug = get_plug_name(attribute)
+    cmds.keyTangent(
+        plug,
+        time=(time, time),
         inAngle=in_angle,
         outAngle=out_angle,
         inWeight=in_weight,
-        outWeight=out_weight)
+        outWeight=out_weight,
+    )
     if curve_weights is True:
-        pm.keyTangent(
-            attribute,
-            time=time,
+        cmds.keyTangent(
+            plug,
+            time=(time, time),
             inTangentType=in_tangent_type,
             outTangentType=out_tangent_type,
             lock=lock,
             weightLock=weight_lock,
         )
     else:
-        pm.keyTangent(
-            attribute,
-            time=time,
+        cmds.keyTangent(
+            plug,
+            time=(time, time),
             inTangentType=in_tangent_type,
             outTangentType=out_tangent_type,
             lock=lock,
         )
 
 
-def save_animation_from_selection(path: Path, preview_dir_path: Path) -> Path:
+def save_animation_from_selection(path: Path, preview_dir_path: Path, **kwargs) -> Path:
+    """
+    Saves data for selected nodes to path and archives preview-images
+    in preview_dir_path with it. See write_animation for the options
+    """
+    capture = capture_animation_from_selection()
+    return write_animation(path, capture, preview_dir_path, **kwargs)
+
+
+def capture_animation_from_selection() -> dict:
     """
-    Saves data for selected nodes to path and archives preview-image
-    with it
+    Gets everything a save needs from the scene for selected nodes: the
+    animation as a node-path-dict, meta-data and the current frame.
+    The rest of a save doesn't touch the scene, so write_animation can
+    run in a background-thread
     """
     nodes = get_nodes_with_animation()
     frame_range = get_frame_range()
     anim_data = get_anim_data(nodes=nodes, frame_range=frame_range)
-    meta_data = get_meta_data(nodes=nodes, frame_range=frame_range)
+    return {
+        "path_data": serial_animator.find_nodes.node_dict_to_path_dict(anim_data),
+        "meta_data": get_meta_data(nodes=nodes, frame_range=frame_range),
+        "current_time": int(get_current_time()),
+    }
 
-    meta_path = preview_dir_path / "meta_data.json"
-    anim_data_path = preview_dir_path / "anim_data.json"
+
+def write_animation(
+    path: Path,
+    capture: dict,
+    preview_dir_path: Path,
+    chunked: bool = False,
+    block_size: int = chunked_archive.BLOCK_SIZE,
+    reduce_keys: bool = False,
+    tolerances: Optional[dict] = None,
+    sampled: bool = False,
+    quantize: bool = False,
+    precision: Optional[dict] = None,
+    preview_levels: Optional[Tuple[int, ...]] = None,
+    loose_frames: bool = False,
+    progress: Optional[Progress] = None,
+) -> Path:
+    """
+    Writes a capture from capture_animation_from_selection to path and
+    archives preview-images with it. If chunked is True,
+    animation-data is split into chunks per node and block_size frames,
+    so it can be partially loaded.
+    If reduce_keys is True, baked curves are refitted with fewer keys
+    within tolerances per attribute-class ("translate", "rotate" and
+    "scalar"). If sampled is True, evenly keyed curves are stored as
+    packed float32 samples with implied linear or stepped tangents.
+    If quantize is True, values and tangents are rounded to precision
+    per attribute-class (see quantization.DEFAULT_PRECISION).
+    The preview-image is also stored scaled down to preview_levels
+    (default preview_pyramid.PREVIEW_LEVELS), and the level matching
+    the browser's tiles is used as poster. The image-sequence is packed
+    into atlases per level, and only stored as loose full-size frames
+    if loose_frames is True. The captured frame-numbers are stored as
+    "preview_frames" in the meta-data, so sampled captures play at real
+    speed. Data and previews are encoded
+    in memory and streamed into the archive.
+    Steps are reported to progress
+    """
+    # preview-levels and atlases are built with Qt, imported on first save
+    import serial_animator.preview_pyramid as preview_pyramid
+
+    preview_levels = preview_levels or preview_pyramid.PREVIEW_LEVELS
+    progress = progress or ignore_progress
+    meta_data = dict(capture["meta_data"])
+    path_data = capture["path_data"]
+
+    progress(0.05, "Scaling preview")
     image_paths = list(preview_dir_path.iterdir())
     _logger.debug(f"first image: {image_paths}")
-    preview_image = preview_dir_path / "preview.jpg"
-    shutil.copy(
-        os.path.join(preview_dir_path, get_preview_image(image_paths)), preview_image
+    preview_image = get_preview_image(image_paths, capture["current_time"])
+    preview = ("preview.jpg", preview_image.read_bytes())
+    levels = preview_pyramid.build_levels(
+        preview_image, levels=preview_levels, name=preview[0]
+    )
+    preview_files = [preview, *levels]
+    progress(0.1, "Packing preview-atlases")
+    atlases, atlas_files = preview_pyramid.pack_sequence(
+        image_paths, levels=preview_levels
     )
-    path_data = serial_animator.find_nodes.node_dict_to_path_dict(anim_data)
-    write_json_data(path_data, anim_data_path)
-    write_json_data(meta_data, meta_path)
-    files = [preview_image, meta_path, anim_data_path, *image_paths]
-    _logger.debug(f"files: {files}")
-    archive = archive_files(
-        files=[preview_image, meta_path, anim_data_path, *image_paths], out_path=path
+    preview_files.extend(atlas_files)
+    if loose_frames:
+        preview_files.extend(image_paths)
+    poster_name = preview_pyramid.get_poster_name(preview[0], preview_levels)
+    poster = next((m for m in levels if m[0] == poster_name), preview)
+    meta_data["preview_levels"] = list(preview_levels)
+    meta_data["preview_atlases"] = atlases
+    # captures may sample the frame-range, see capture_policy
+    meta_data["preview_frames"] = sorted(
+        preview_pyramid.get_frame_number(p) for p in image_paths
+    )
+    progress(0.5, "Encoding animation")
+    if sampled:
+        path_data = sampled_channels.sample_anim_data(path_data)
+    if reduce_keys:
+        path_data, reports = key_reduction.reduce_anim_data(
+            path_data, fps=meta_data["time_unit"], tolerances=tolerances
+        )
+        key_reduction.log_reduction_report(reports)
+    if quantize:
+        meta_data["quantization"] = quantization.get_policy(precision)
+        path_data = quantization.quantize_anim_data(path_data, precision)
+    progress(0.7, "Writing archive")
+    if chunked:
+        return chunked_archive.write_chunked_archive(
+            path,
+            path_data,
+            meta_data,
+            files=preview_files,
+            block_size=block_size,
+            poster=poster,
+        )
+    files = [
+        ("meta_data.json", iter_json_data(meta_data)),
+        ("anim_data.json", iter_json_data(path_data)),
+        *preview_files,
+    ]
+    _logger.debug(f"files: {[get_member_name(f) for f in files]}")
+    archive = archive_header.write_archive(
+        path, files=files, meta_data=meta_data, kind="anim", poster=poster
     )
 
     return archive
 
 
-def get_preview_image(images: List[Path]) -> Path:
-    """Get the image in an image_sequence closest to current time"""
-    current_time = int(pm.currentTime())
+def get_preview_image(images: List[Path], current_time: Optional[int] = None) -> Path:
+    """
+    Get the image in an image_sequence closest to current_time, or the
+    scene's current time
+    """
+    if current_time is None:
+        current_time = int(get_current_time())
 
     def get_difference(img: Path) -> int:
         return abs(int(img.name.split(".")[1]) - current_time)
@@ -443,18 +889,22 @@ def get_frame_range() -> [int, int]:
     Gets the selected frame_range from time-slider. If nothing is
     selected, get playback range
     """
-    time_slider = pm.language.MelGlobals.get("gPlayBackSlider")
-    if pm.windows.timeControl(time_slider, q=True, rangeVisible=True):
-        start, end = pm.windows.timeControl(time_slider, q=True, rangeArray=True)
+    time_slider = mel.eval("$tmp = $gPlayBackSlider")
+    if cmds.timeControl(time_slider, q=True, rangeVisible=True):
+        start, end = cmds.timeControl(time_slider, q=True, rangeArray=True)
     else:
-        start = pm.animation.playbackOptions(q=True, min=True)
-        end = pm.animation.playbackOptions(q=True, max=True)
+        start = cmds.playbackOptions(q=True, min=True)
+        end = cmds.playbackOptions(q=True, max=True)
     return int(start), int(end)
 
 
 def get_time_unit() -> float:
     """Gets current time unit in fps"""
-    return pm.mel.eval("currentTimeUnitToFPS")
+    return mel.eval("currentTimeUnitToFPS")
+
+
+def get_current_time() -> float:
+    return cmds.currentTime(query=True)
 
 
 def get_meta_data(nodes: Iterable, frame_range=None) -> dict:
@@ -479,4 +929,11 @@ def get_anim_data(nodes: Iterable, frame_range=None) -> dict:
 
 
 def extract_meta_data(archive) -> dict:
+    """
+    Reads meta-data from the archive's header, or from meta_data.json
+    in archives without one
+    """
+    header = archive_header.read_header(archive)
+    if header:
+        return header["meta_data"]
     return read_data_from_archive(archive, json_name="meta_data.json")
@@ -0,0 +1,375 @@
+"""
+Compares two animation- or pose-archives without Maya.
+
+Channels (node.attribute) are matched by node-path and attribute-name.
+For animation, key-times are compared and both curves are sampled with
+curve_evaluation to measure the maximum and RMS deviation of values.
+Channels only in one archive, or pose-values that aren't numbers, have
+no deviation (None).
+
+Plain archives are compared per node on their undecoded json first, so
+only nodes that differ are decoded.
+"""
+
+import json
+from pathlib import Path
+import tarfile
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+import serial_animator.chunked_archive as chunked_archive
+from serial_animator.curve_evaluation import evaluate_attribute_data
+from serial_animator.file_io import read_json_members_from_archive
+from serial_animator.key_arrays import KeyArrays
+from serial_animator.sampled_channels import SAMPLES_KEY, get_sample_times, is_sampled
+from serial_animator.exceptions import SerialAnimatorError
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+DEFAULT_FPS = 24.0
+DIFF_TOLERANCE = 1e-6
+SETTINGS = ("attributeType", "preInfinity", "postInfinity", "weightedTangents")
+DATA_MEMBERS = {"anim_data.json": "anim", "pose.json": "pose"}
+# lookup-tables by byte of json's structural characters, and how they
+# change the nesting-depth
+_STRUCTURAL = np.zeros(256, dtype=bool)
+_STRUCTURAL[list(b"{}[]:,")] = True
+_DEPTH_CHANGE = np.zeros(256, dtype=np.int32)
+_DEPTH_CHANGE[list(b"{[")] = 1
+_DEPTH_CHANGE[list(b"}]")] = -1
+
+
+class SerialAnimatorDiffError(SerialAnimatorError):
+    """Error when archives can't be compared"""
+
+
+def read_archive(path: Path) -> Tuple[str, dict, dict]:
+    """
+    Reads an archive's data without Maya. Returns the kind of archive
+    ("anim" or "pose"), its data and meta-data
+    """
+    path = Path(path)
+    if chunked_archive.is_chunked_archive(path):
+        data = dict(chunked_archive.iter_chunked_animation_data(path))
+        meta = read_json_members_from_archive(path, ["meta_data.json"])
+        return "anim", data, meta.get("meta_data.json", dict())
+    members = read_json_members_from_archive(
+        path, ["anim_data.json", "pose.json", "meta_data.json"]
+    )
+    meta = members.get("meta_data.json", dict())
+    if "anim_data.json" in members:
+        return "anim", members["anim_data.json"], meta
+    if "pose.json" in members:
+        return "pose", members["pose.json"], meta
+    raise SerialAnimatorDiffError(f"{path} has no animation- or pose-data")
+
+
+def read_raw_archive(path: Path) -> Optional[Tuple[str, bytes, dict]]:
+    """
+    Reads a plain archive's undecoded data-member. Returns the kind of
+    archive, the data as json-bytes and meta-data, or None for chunked
+    archives and archives without data
+    """
+    path = Path(path)
+    if chunked_archive.is_chunked_archive(path):
+        return None
+    kind = raw = None
+    meta = dict()
+    with tarfile.open(str(path)) as tf:
+        for name in tf.getnames():
+            if name == "meta_data.json":
+                meta = json.load(tf.extractfile(name))
+            elif name in DATA_MEMBERS and raw is None:
+                kind = DATA_MEMBERS[name]
+                raw = tf.extractfile(name).read()
+    if raw is None:
+        return None
+    return kind, raw, meta
+
+
+def split_json_object(raw: bytes) -> Dict[str, Tuple[bytes, int]]:
+    """
+    Splits a json-object into its items without decoding the values.
+    Returns {key: (value as json-bytes, number of items in the value)}
+    """
+    chars = np.frombuffer(raw, dtype=np.uint8)
+    quotes = np.flatnonzero(chars == ord('"'))
+    escaped = quotes[(quotes > 0) & (chars[quotes - 1] == ord("\\"))]
+    if len(escaped):
+        # a quote is escaped by an odd number of backslashes before it
+        drop = list()
+        for index in escaped.tolist():
+            start = index
+            while start > 0 and raw[start - 1] == ord("\\"):
+                start -= 1
+            if (index - start) % 2:
+                drop.append(index)
+        quotes = np.setdiff1d(quotes, drop)
+    positions = np.flatnonzero(_STRUCTURAL[chars])
+    # characters after an even number of quotes are outside strings
+    positions = positions[np.searchsorted(quotes, positions) % 2 == 0]
+    symbols = chars[positions]
+    depth = np.cumsum(_DEPTH_CHANGE[symbols])
+    start = len(raw) - len(raw.lstrip())
+    ends = np.flatnonzero(depth == 0)
+    if not len(positions) or positions[0] != start or symbols[0] != ord("{"):
+        raise json.JSONDecodeError("Expected a json-object", raw.decode(), start)
+    if not len(ends):
+        raise json.JSONDecodeError("Unexpected end of data", raw.decode(), len(raw))
+    # the object ends where the depth first returns to 0
+    end = int(positions[ends[0]])
+    positions, symbols, depth = (a[: ends[0]] for a in (positions, symbols, depth))
+    separators = _DEPTH_CHANGE[symbols] == 0
+    bounds = [start, *positions[separators & (depth == 1)].tolist(), end]
+    items = dict()
+    if len(bounds) == 2 and not raw[start + 1 : end].strip():
+        return items
+    # keys one level down are counted as the items of each value
+    colons = positions[separators & (depth == 2) & (symbols == ord(":"))]
+    counts = np.diff(np.searchsorted(colons, bounds[::2])).tolist()
+    for i in range(0, len(bounds) - 1, 2):
+        if i + 2 >= len(bounds) or raw[bounds[i + 1]] != ord(":"):
+            raise json.JSONDecodeError("Expected ':'", raw.decode(), bounds[i])
+        key = json.loads(raw[bounds[i] + 1 : bounds[i + 1]])
+        items[key] = raw[bounds[i + 1] + 1 : bounds[i + 2]].strip(), counts[i // 2]
+    return items
+
+
+def get_channels(data: dict) -> dict:
+    """Flattens node-dict data to {node.attribute: data}"""
+    return {
+        f"{node_path}.{name}": value
+        for node_path, node_data in data.items()
+        for name, value in node_data.items()
+    }
+
+
+def get_key_arrays(attribute_data: dict) -> Tuple[np.ndarray, Optional[KeyArrays]]:
+    """Gets key-times and key-arrays, or None for sampled channels"""
+    if is_sampled(attribute_data):
+        return get_sample_times(attribute_data[SAMPLES_KEY]), None
+    keys = KeyArrays.from_key_data(attribute_data["keys"])
+    return keys.times, keys
+
+
+def get_deviation(values: np.ndarray, other: np.ndarray) -> Tuple[float, float]:
+    """Gets maximum and RMS difference between values"""
+    if not len(values):
+        return 0.0, 0.0
+    difference = np.abs(values - other)
+    return float(np.max(difference)), float(np.sqrt(np.mean(difference**2)))
+
+
+def diff_attribute_data(
+    data_a: dict, data_b: dict, fps_a: float, fps_b: float, step: float = 1.0
+) -> dict:
+    """
+    Compares an attribute's animation. Key-times are compared exactly,
+    values are sampled every step frames across both keyed ranges and
+    at every key
+    """
+    times_a, keys_a = get_key_arrays(data_a)
+    times_b, keys_b = get_key_arrays(data_b)
+    if len(times_a) and len(times_b):
+        keyed = np.union1d(times_a, times_b)
+        times = np.union1d(np.arange(keyed[0], keyed[-1], step), keyed)
+        max_deviation, rms_deviation = get_deviation(
+            evaluate_attribute_data(data_a, times, fps_a, keys=keys_a),
+            evaluate_attribute_data(data_b, times, fps_b, keys=keys_b),
+        )
+    elif len(times_a) or len(times_b):
+        # keys on one side only can't be measured against the other
+        max_deviation = rms_deviation = None
+    else:
+        max_deviation = rms_deviation = 0.0
+    channel_diff = {
+        "added_times": np.setdiff1d(times_b, times_a).tolist(),
+        "removed_times": np.setdiff1d(times_a, times_b).tolist(),
+        "settings": {
+            k: [data_a.get(k), data_b.get(k)]
+            for k in SETTINGS
+            if data_a.get(k) != data_b.get(k)
+        },
+        "max_deviation": max_deviation,
+        "rms_deviation": rms_deviation,
+    }
+    if max_deviation is None:
+        channel_diff["one_sided"] = True
+    return channel_diff
+
+
+def diff_pose_value(value_a, value_b) -> dict:
+    try:
+        deviation = abs(float(value_a) - float(value_b))
+    except (TypeError, ValueError):
+        if value_a == value_b:
+            deviation = 0.0
+        else:
+            # values that aren't numbers have no deviation to measure
+            return {
+                "max_deviation": None,
+                "rms_deviation": None,
+                "values": [value_a, value_b],
+            }
+    return {"max_deviation": deviation, "rms_deviation": deviation}
+
+
+def is_changed(channel_diff: dict, tolerance: float) -> bool:
+    return bool(
+        channel_diff.get("added_times")
+        or channel_diff.get("removed_times")
+        or channel_diff.get("settings")
+        or channel_diff["max_deviation"] is None
+        or channel_diff["max_deviation"] > tolerance
+    )
+
+
+def diff_data(
+    kind: str,
+    data_a: dict,
+    data_b: dict,
+    fps_a: float = DEFAULT_FPS,
+    fps_b: float = DEFAULT_FPS,
+    step: float = 1.0,
+    tolerance: float = DIFF_TOLERANCE,
+) -> dict:
+    """
+    Compares animation- or pose-data (node-path-dicts). Returns channels
+    added in b, removed from a, and changed channels with their diff
+    """
+    channels_a = get_channels(data_a)
+    channels_b = get_channels(data_b)
+    changed = dict()
+    unchanged = 0
+    for channel in [c for c in channels_a if c in channels_b]:
+        if channels_a[channel] == channels_b[channel] and fps_a == fps_b:
+            # identical data needs no sampling
+            unchanged += 1
+            continue
+        if kind == "anim":
+            channel_diff = diff_attribute_data(
+                channels_a[channel], channels_b[channel], fps_a, fps_b, step
+            )
+        else:
+            channel_diff = diff_pose_value(channels_a[channel], channels_b[channel])
+        if is_changed(channel_diff, tolerance):
+            changed[channel] = channel_diff
+        else:
+            unchanged += 1
+    return {
+        "kind": kind,
+        "added": [c for c in channels_b if c not in channels_a],
+        "removed": [c for c in channels_a if c not in channels_b],
+        "changed": changed,
+        "unchanged": unchanged,
+    }
+
+
+def diff_archives(
+    path_a: Path,
+    path_b: Path,
+    step: float = 1.0,
+    tolerance: float = DIFF_TOLERANCE,
+) -> dict:
+    """Compares two archives of the same kind. See diff_data"""
+    report = diff_raw_archives(path_a, path_b, step=step, tolerance=tolerance)
+    if report is not None:
+        report["a"] = str(path_a)
+        report["b"] = str(path_b)
+        return report
+    kind_a, data_a, meta_a = read_archive(path_a)
+    kind_b, data_b, meta_b = read_archive(path_b)
+    if kind_a != kind_b:
+        raise SerialAnimatorDiffError(f"Can't compare {kind_a} with {kind_b}")
+    report = diff_data(
+        kind_a,
+        data_a,
+        data_b,
+        fps_a=meta_a.get("time_unit", DEFAULT_FPS),
+        fps_b=meta_b.get("time_unit", DEFAULT_FPS),
+        step=step,
+        tolerance=tolerance,
+    )
+    report["a"] = str(path_a)
+    report["b"] = str(path_b)
+    return report
+
+
+def diff_raw_archives(
+    path_a: Path,
+    path_b: Path,
+    step: float = 1.0,
+    tolerance: float = DIFF_TOLERANCE,
+) -> Optional[dict]:
+    """
+    Compares two plain archives, decoding only nodes whose json differs.
+    Returns None if they can't be compared this way. See diff_data
+    """
+    raw_a = read_raw_archive(path_a)
+    raw_b = read_raw_archive(path_b)
+    if raw_a is None or raw_b is None:
+        return None
+    (kind_a, data_a, meta_a), (kind_b, data_b, meta_b) = raw_a, raw_b
+    fps_a = meta_a.get("time_unit", DEFAULT_FPS)
+    fps_b = meta_b.get("time_unit", DEFAULT_FPS)
+    if kind_a != kind_b or fps_a != fps_b:
+        return None
+    nodes_a = split_json_object(data_a)
+    nodes_b = split_json_object(data_b)
+    unchanged = 0
+    for node_path in [n for n in nodes_a if nodes_b.get(n) == nodes_a[n]]:
+        # identical json is identical data
+        unchanged += nodes_a.pop(node_path)[1]
+        del nodes_b[node_path]
+    report = diff_data(
+        kind_a,
+        {node_path: json.loads(value) for node_path, (value, _) in nodes_a.items()},
+        {node_path: json.loads(value) for node_path, (value, _) in nodes_b.items()},
+        fps_a=fps_a,
+        fps_b=fps_b,
+        step=step,
+        tolerance=tolerance,
+    )
+    report["unchanged"] += unchanged
+    return report
+
+
+def has_differences(report: dict) -> bool:
+    return bool(report["added"] or report["removed"] or report["changed"])
+
+
+def format_report(report: dict, as_json: bool = False) -> str:
+    """Formats a diff-report as json or one line per channel"""
+    if as_json:
+        return json.dumps(report, indent=4)
+    lines = [f"--- {report['a']}", f"+++ {report['b']}"]
+    lines.extend(f"+ {channel}" for channel in report["added"])
+    lines.extend(f"- {channel}" for channel in report["removed"])
+    for channel, channel_diff in report["changed"].items():
+        line = f"~ {channel}"
+        if channel_diff.get("added_times") or channel_diff.get("removed_times"):
+            line += (
+                f" keys +{len(channel_diff['added_times'])}"
+                f" -{len(channel_diff['removed_times'])}"
+            )
+        for setting, (value_a, value_b) in channel_diff.get("settings", {}).items():
+            line += f" {setting} {value_a}->{value_b}"
+        if channel_diff.get("one_sided"):
+            line += " one-sided"
+        elif "values" in channel_diff:
+            value_a, value_b = channel_diff["values"]
+            line += f" {value_a}->{value_b}"
+        else:
+            line += (
+                f" max {channel_diff['max_deviation']:.6g}"
+                f" rms {channel_diff['rms_deviation']:.6g}"
+            )
+        lines.append(line)
+    lines.append(
+        f"{len(report['added'])} added, {len(report['removed'])} removed, "
+        f"{len(report['changed'])} changed, {report['unchanged']} unchanged"
+    )
+    return "\n".join(lines)
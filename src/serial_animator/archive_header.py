@@ -0,0 +1,210 @@
+"""
+Versioned header at the start of archives.
+
+Archives start with header.json, followed by the poster-image. The
+header holds the archive's kind, layout and meta-data, and the offset
+and length of the poster-image's data in the archive, so a browser can
+show an archive from one small read at the start of the file. The
+archive is still a normal tar-file, and older archives without a
+header are read as before.
+"""
+
+import io
+import json
+from pathlib import Path
+import tarfile
+from typing import List, Optional, Tuple, Union
+
+from serial_animator.file_io import ArchiveWriter, NamedPayload, get_member_name
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+HEADER_NAME = "header.json"
+HEADER_VERSION = 1
+# bytes read from the start of an archive, enough for header and a
+# small poster-image in most archives
+READ_SIZE = 64 * 1024
+TAR_FORMAT = tarfile.PAX_FORMAT
+TAR_ENCODING = "utf-8"
+
+Member = Tuple[tarfile.TarInfo, bytes]
+# a poster-image's file-path, or its name and data
+Poster = Union[Path, Tuple[str, bytes]]
+
+
+def get_tar_info(name: str, size: int, mtime: int = 0) -> tarfile.TarInfo:
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    return info
+
+
+def get_header_size(info: tarfile.TarInfo) -> int:
+    return len(info.tobuf(TAR_FORMAT, TAR_ENCODING, "surrogateescape"))
+
+
+def get_padded_size(size: int) -> int:
+    blocks, remainder = divmod(size, tarfile.BLOCKSIZE)
+    return (blocks + bool(remainder)) * tarfile.BLOCKSIZE
+
+
+def get_members_size(members: List[Member]) -> int:
+    """Gets the number of bytes members take up in an archive"""
+    return sum(
+        get_header_size(info) + get_padded_size(len(payload))
+        for info, payload in members
+    )
+
+
+def read_poster(poster: Optional[Poster]) -> Optional[Member]:
+    """Gets the poster-member for poster, or None if there is no poster"""
+    if isinstance(poster, tuple):
+        name, data = poster
+        return get_tar_info(name, len(data)), data
+    if not poster or not Path(poster).is_file():
+        return None
+    poster = Path(poster)
+    data = poster.read_bytes()
+    return get_tar_info(poster.name, len(data), int(poster.stat().st_mtime)), data
+
+
+def get_header_members(
+    meta_data: dict, kind: str, poster: Optional[Poster] = None, layout: str = "flat"
+) -> List[Member]:
+    """
+    Gets the header-member and the poster-member (if poster is given) to
+    start an archive with
+    """
+    header = {
+        "version": HEADER_VERSION,
+        "kind": kind,
+        "layout": layout,
+        "meta_data": meta_data,
+        "poster": None,
+    }
+    poster_member = read_poster(poster)
+    if not poster_member:
+        payload = json.dumps(header).encode("utf-8")
+        return [(get_tar_info(HEADER_NAME, len(payload)), payload)]
+    poster_info, poster_data = poster_member
+    header["poster"] = {
+        "name": poster_info.name,
+        "offset": 0,
+        "length": len(poster_data),
+    }
+    # the poster's offset depends on the header's size, so update until
+    # the header's padded size is stable
+    padded_size = -1
+    payload = json.dumps(header).encode("utf-8")
+    while padded_size != get_padded_size(len(payload)):
+        padded_size = get_padded_size(len(payload))
+        header_info = get_tar_info(HEADER_NAME, len(payload))
+        header["poster"]["offset"] = (
+            get_header_size(header_info) + padded_size + get_header_size(poster_info)
+        )
+        payload = json.dumps(header).encode("utf-8")
+    return [
+        (get_tar_info(HEADER_NAME, len(payload)), payload),
+        (poster_info, poster_data),
+    ]
+
+
+def add_members(tf: tarfile.TarFile, members: List[Member]):
+    for info, payload in members:
+        tf.addfile(info, io.BytesIO(payload))
+
+
+def write_members(writer: ArchiveWriter, members: List[Member]):
+    for info, payload in members:
+        writer.add(info.name, payload, info.mtime)
+
+
+def write_files(writer: ArchiveWriter, files: List[Union[Path, NamedPayload]]):
+    """
+    Writes files to archive, skipping names already in it. Files are
+    file-paths, or tuples of member-name and payload. Missing
+    file-paths are skipped
+    """
+    for f in files:
+        if get_member_name(f) in writer.names:
+            continue
+        if isinstance(f, tuple):
+            writer.add(*f)
+        elif f.is_file():
+            writer.add_file(f)
+
+
+def write_archive(
+    out_path: Path,
+    files: List[Union[Path, NamedPayload]],
+    meta_data: dict,
+    kind: str,
+    poster: Optional[Poster] = None,
+) -> Path:
+    """
+    Creates a tar-archive at out_path starting with a header and poster,
+    followed by files, in a single pass. Files are file-paths or
+    in-memory payloads (see file_io.ArchiveWriter)
+    """
+    members = get_header_members(meta_data, kind, poster)
+    with ArchiveWriter(out_path, tar_format=TAR_FORMAT, encoding=TAR_ENCODING) as w:
+        write_members(w, members)
+        write_files(w, files)
+    return out_path
+
+
+def parse_header(buffer: bytes, f=None) -> Optional[dict]:
+    """
+    Parses the header from the start of an archive in buffer. If the
+    header is longer than buffer, the rest is read from f
+    """
+    try:
+        info = tarfile.TarInfo.frombuf(
+            buffer[: tarfile.BLOCKSIZE], TAR_ENCODING, "surrogateescape"
+        )
+    except tarfile.TarError:
+        return None
+    if info.name != HEADER_NAME:
+        return None
+    start = tarfile.BLOCKSIZE
+    payload = buffer[start : start + info.size]
+    if len(payload) < info.size and f is not None:
+        f.seek(start + len(payload))
+        payload += f.read(info.size - len(payload))
+    try:
+        header = json.loads(payload)
+    except ValueError as e:
+        _logger.warning(f"Couldn't decode archive-header: {e}")
+        return None
+    if header.get("version", 0) > HEADER_VERSION:
+        _logger.debug(f"Header version {header['version']} isn't supported")
+        return None
+    return header
+
+
+def read_header(path: Path) -> Optional[dict]:
+    """Reads the header of archive at path, or None if it has none"""
+    return read_header_and_poster(path, poster=False, read_size=4096)[0]
+
+
+def read_header_and_poster(
+    path: Path, poster: bool = True, read_size: int = READ_SIZE
+) -> Tuple[Optional[dict], Optional[bytes]]:
+    """
+    Reads header and poster-image data from the start of archive at
+    path, usually in a single read. Returns None for archives without a
+    header, or a poster
+    """
+    with open(path, "rb") as f:
+        buffer = f.read(read_size)
+        header = parse_header(buffer, f)
+        if not header or not poster or not header.get("poster"):
+            return header, None
+        offset = header["poster"]["offset"]
+        length = header["poster"]["length"]
+        if offset + length <= len(buffer):
+            return header, buffer[offset : offset + length]
+        f.seek(offset)
+        return header, f.read(length)
@@ -0,0 +1,169 @@
+"""
+Reads summary-information about archives without decoding their data.
+
+Archives with a header are summarized from one small read at the start
+of the file. For older archives, only the tar-headers are scanned,
+seeking past member-data, until meta_data.json is found. Directories
+are traversed in parallel, which matters on network-shares where each
+listing and open has a long round-trip.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+from pathlib import Path
+import tarfile
+from typing import Collection, Iterable, List, Optional, Tuple
+
+from serial_animator.archive_header import read_header
+from serial_animator.chunked_archive import MANIFEST_NAME
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+ARCHIVE_SUFFIXES = (".anim", ".pose")
+MAX_WORKERS = 16
+TABLE_COLUMNS = ("kind", "nodes", "frame_range", "size", "path")
+
+
+def find_archives(
+    paths: Iterable[Path],
+    suffixes: Collection[str] = ARCHIVE_SUFFIXES,
+    max_workers: int = MAX_WORKERS,
+) -> List[Path]:
+    """
+    Finds archives in paths, searching directories recursively. Each
+    directory is listed in a thread of its own
+    """
+    archives = list()
+    directories = list()
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            directories.append(path)
+        elif path.suffix in suffixes:
+            archives.append(path)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while directories:
+            listings = executor.map(list_directory, directories)
+            directories = list()
+            for files, sub_directories in listings:
+                archives.extend(f for f in files if f.suffix in suffixes)
+                directories.extend(sub_directories)
+    return sorted(archives)
+
+
+def list_directory(directory: Path):
+    """Lists files and sub-directories in directory"""
+    files = list()
+    directories = list()
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    directories.append(Path(entry.path))
+                elif entry.is_file():
+                    files.append(Path(entry.path))
+    except OSError as e:
+        _logger.warning(f"Couldn't list {directory}: {e}")
+    return files, directories
+
+
+def read_archive_info(path: Path) -> dict:
+    """
+    Reads kind, layout, node-count, frame-range and time-unit from an
+    archive's meta-data, along with its size and modification-time
+    """
+    path = Path(path)
+    stat = path.stat()
+    info = {
+        "path": str(path),
+        "kind": path.suffix.lstrip("."),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+    }
+    header = read_header(path)
+    if header:
+        info["kind"] = header["kind"]
+        info["layout"] = header["layout"]
+        meta_data = header["meta_data"]
+    else:
+        info["layout"], meta_data = scan_meta_data(path)
+    nodes = meta_data.get("nodes")
+    info["nodes"] = None if nodes is None else len(nodes)
+    info["frame_range"] = meta_data.get("frame_range")
+    info["time_unit"] = meta_data.get("time_unit")
+    info["meta_data"] = meta_data
+    return info
+
+
+def scan_meta_data(path: Path) -> Tuple[str, dict]:
+    """
+    Scans tar-headers of an archive without a header for meta_data.json.
+    Returns the archive's layout and meta-data
+    """
+    with tarfile.open(str(path), mode="r:") as tf:
+        members = list()
+        meta_data = dict()
+        for member in tf:
+            members.append(member.name)
+            if member.name == "meta_data.json":
+                meta_data = json.load(tf.extractfile(member))
+                break
+    layout = "chunked" if members[:1] == [MANIFEST_NAME] else "flat"
+    return layout, meta_data
+
+
+def read_archive_infos(
+    paths: Iterable[Path], max_workers: int = MAX_WORKERS
+) -> List[dict]:
+    """
+    Reads info for all archives in paths in parallel. Archives that
+    can't be read get an "error" instead
+    """
+
+    def read_info(path: Path) -> dict:
+        try:
+            return read_archive_info(path)
+        except (OSError, tarfile.TarError, ValueError) as e:
+            return {"path": str(path), "error": str(e)}
+
+    archives = find_archives(paths, max_workers=max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(read_info, archives))
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}"
+        size /= 1024.0
+    return f"{size:.1f}GB"
+
+
+def format_infos(
+    infos: List[dict], as_json: bool = False, columns: Optional[List[str]] = None
+) -> str:
+    """Formats archive-infos as json or a table with a row per archive"""
+    if as_json:
+        return json.dumps(infos, indent=4)
+    columns = columns or TABLE_COLUMNS
+    rows = [[c.upper() for c in columns]]
+    for info in infos:
+        row = list()
+        for column in columns:
+            value = info.get(column)
+            if column == "size" and value is not None:
+                value = format_size(value)
+            elif column == "frame_range" and value:
+                value = "-".join(f"{v:g}" for v in value)
+            elif column == "kind" and "error" in info:
+                value = "error"
+            row.append("" if value is None else str(value))
+        rows.append(row)
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+        for row in rows
+    )
@@ -0,0 +1,61 @@
+"""
+Budget for capturing animation-previews.
+
+Long clips are captured as at most max_frames frames, sampled evenly
+over the frame-range, at a resolution fitting within size pixels and
+with jpg-quality quality, rather than every frame at the viewport's
+resolution. The captured frame-numbers are stored in the archive's
+meta-data, and a player shows the last captured frame at or before the
+current frame, so previews play at the animation's real speed.
+"""
+
+from bisect import bisect_right
+from typing import List, Optional, Sequence, Tuple
+
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+MAX_FRAMES = 120
+# matches the biggest preview-level, so captured frames need no scaling
+CAPTURE_SIZE = 250
+CAPTURE_QUALITY = 85
+
+
+def get_policy(
+    max_frames: int = MAX_FRAMES,
+    size: int = CAPTURE_SIZE,
+    quality: int = CAPTURE_QUALITY,
+) -> dict:
+    """Gets a capture-policy dict"""
+    return {"max_frames": max(int(max_frames), 1), "size": size, "quality": quality}
+
+
+def sample_frames(start_frame: int, end_frame: int, max_frames: int) -> List[int]:
+    """
+    Gets at most max_frames frame-numbers spread evenly from start_frame
+    to end_frame, both included
+    """
+    count = end_frame - start_frame + 1
+    if count <= max_frames:
+        return list(range(start_frame, end_frame + 1))
+    if max_frames == 1:
+        return [start_frame]
+    step = (end_frame - start_frame) / (max_frames - 1)
+    return [start_frame + int(round(i * step)) for i in range(max_frames)]
+
+
+def get_capture_size(width: int, height: int, size: int) -> Tuple[int, int]:
+    """Gets width and height scaled to fit within size. Never enlarges"""
+    scale = min(1.0, size / max(width, height, 1))
+    return max(int(round(width * scale)), 1), max(int(round(height * scale)), 1)
+
+
+def get_sampled_frame(frames: Sequence[int], frame: int) -> Optional[int]:
+    """
+    Gets the last of the sorted captured frames at or before frame, or
+    None if frame is before all of them
+    """
+    index = bisect_right(frames, frame) - 1
+    return frames[index] if index >= 0 else None
@@ -0,0 +1,229 @@
+"""
+Archive layout with animation-data split into chunks per node and
+time-block, so partial loads only read the chunks they need.
+
+The archive is a normal tar-file starting with the archive-header and
+poster-image, followed by manifest.json. The manifest lists each node's
+attribute-settings and chunks with their frame-range and byte-offset in
+the archive, so a reader can seek straight to the chunks after reading
+the manifest.
+"""
+
+from collections import OrderedDict
+import json
+import math
+from pathlib import Path
+import tarfile
+from typing import Collection, Dict, Generator, List, Optional, Tuple, Union
+
+from serial_animator.archive_header import (
+    Poster,
+    TAR_ENCODING,
+    TAR_FORMAT,
+    get_header_members,
+    get_header_size,
+    get_members_size,
+    get_padded_size,
+    get_tar_info,
+    read_header,
+    write_files,
+    write_members,
+)
+from serial_animator.file_io import ArchiveWriter, NamedPayload
+from serial_animator.sampled_channels import (
+    SAMPLES_KEY,
+    concatenate_samples,
+    is_sampled,
+    split_samples,
+)
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+BLOCK_SIZE = 256
+# members before the manifest in archives with a header
+MAX_LEADING_MEMBERS = 2
+
+
+def get_block_index(time: float, block_size: int = BLOCK_SIZE) -> int:
+    return int(math.floor(time / block_size))
+
+
+def split_node_data(
+    node_data: dict, block_size: int = BLOCK_SIZE
+) -> Tuple[dict, Dict[int, dict]]:
+    """
+    Splits a node's animation-data into attribute-settings and
+    per-block key-data: {block_index: {attribute_name: keys}}
+    """
+    attributes = dict()
+    blocks = dict()
+    for attribute_name, attribute_data in node_data.items():
+        attributes[attribute_name] = {
+            k: v for k, v in attribute_data.items() if k not in ("keys", SAMPLES_KEY)
+        }
+        if is_sampled(attribute_data):
+            samples = attribute_data[SAMPLES_KEY]
+            for block_index, block_samples in split_samples(samples, block_size):
+                block = blocks.setdefault(block_index, dict())
+                block[attribute_name] = {SAMPLES_KEY: block_samples}
+            continue
+        for time, key in attribute_data.get("keys").items():
+            block = blocks.setdefault(get_block_index(float(time), block_size), dict())
+            block.setdefault(attribute_name, OrderedDict())[time] = key
+    return attributes, blocks
+
+
+def encode_json(data) -> bytes:
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def write_chunked_archive(
+    out_path: Path,
+    path_data: dict,
+    meta_data: dict,
+    files: List[Union[Path, NamedPayload]],
+    block_size: int = BLOCK_SIZE,
+    poster: Optional[Poster] = None,
+) -> Path:
+    """
+    Writes animation-data (a node-path-dict) as chunks per node and
+    time-block, followed by meta-data and files. The archive starts
+    with a header holding meta_data and the poster-image. Files are
+    file-paths or in-memory payloads
+    """
+    header_members = get_header_members(meta_data, "anim", poster, layout="chunked")
+    prefix_size = get_members_size(header_members)
+    nodes = dict()
+    members = list()
+    for node_index, (node_path, node_data) in enumerate(path_data.items()):
+        attributes, blocks = split_node_data(node_data, block_size)
+        chunks = list()
+        for block_index in sorted(blocks):
+            payload = encode_json(blocks[block_index])
+            members.append((f"anim/{node_index:06d}/{block_index:06d}.json", payload))
+            block_start = block_index * block_size
+            # offset is filled in when the layout is known
+            chunks.append([block_start, block_start + block_size, 0, len(payload)])
+        nodes[node_path] = {"attributes": attributes, "chunks": chunks}
+    members.append(("meta_data.json", encode_json(meta_data)))
+
+    manifest = {"version": MANIFEST_VERSION, "block_size": block_size, "nodes": nodes}
+    manifest_payload = encode_json(manifest)
+    # offsets depend on the size of the manifest which depends on the
+    # offsets, so update until the manifest's padded size is stable
+    padded_manifest_size = -1
+    while padded_manifest_size != get_padded_size(len(manifest_payload)):
+        padded_manifest_size = get_padded_size(len(manifest_payload))
+        offset = prefix_size
+        offset += get_header_size(get_tar_info(MANIFEST_NAME, len(manifest_payload)))
+        offset += padded_manifest_size
+        chunk_iter = iter(c for n in nodes.values() for c in n["chunks"])
+        for name, payload in members[:-1]:
+            offset += get_header_size(get_tar_info(name, len(payload)))
+            next(chunk_iter)[2] = offset
+            offset += get_padded_size(len(payload))
+        manifest_payload = encode_json(manifest)
+
+    with ArchiveWriter(out_path, tar_format=TAR_FORMAT, encoding=TAR_ENCODING) as w:
+        write_members(w, header_members)
+        for name, payload in [(MANIFEST_NAME, manifest_payload), *members]:
+            w.add(name, payload)
+        write_files(w, files)
+    return out_path
+
+
+def is_chunked_archive(path: Path) -> bool:
+    """
+    Checks if archive at path has a chunked layout, from its header or,
+    for archives without one, if it starts with a chunk-manifest
+    """
+    try:
+        header = read_header(path)
+    except OSError:
+        return False
+    if header:
+        return header.get("layout") == "chunked"
+    try:
+        with tarfile.open(str(path), mode="r:") as tf:
+            info = tf.next()
+    except (tarfile.TarError, OSError):
+        return False
+    return info is not None and info.name == MANIFEST_NAME
+
+
+def read_manifest(f) -> dict:
+    """
+    Reads the manifest from the start of an open archive, after the
+    header and poster-image if it has them
+    """
+    f.seek(0)
+    tf = tarfile.open(fileobj=f, mode="r:")
+    info = tf.next()
+    for _ in range(MAX_LEADING_MEMBERS):
+        if info is None or info.name == MANIFEST_NAME:
+            break
+        info = tf.next()
+    if info is None or info.name != MANIFEST_NAME:
+        raise tarfile.ReadError("Archive doesn't start with a chunk-manifest")
+    return json.load(tf.extractfile(info))
+
+
+def chunk_overlaps(
+    chunk: list, start: Optional[float] = None, end: Optional[float] = None
+) -> bool:
+    chunk_start, chunk_end = chunk[:2]
+    if start is not None and chunk_end <= start:
+        return False
+    if end is not None and chunk_start > end:
+        return False
+    return True
+
+
+def iter_chunked_animation_data(
+    path: Path,
+    node_names: Optional[Collection[str]] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+) -> Generator[Tuple[str, dict], None, None]:
+    """
+    Yields animation-data for nodes in node_names (all nodes if None)
+    one node at a time, only reading chunks overlapping start to end.
+    Keys in the chunks that are out of range are not removed
+    """
+    bytes_read = 0
+    with open(path, "rb") as f:
+        manifest = read_manifest(f)
+        bytes_read += f.tell()
+        for node_path, node_entry in manifest["nodes"].items():
+            if node_names is not None and node_path not in node_names:
+                continue
+            node_data = {
+                name: dict(settings, keys=OrderedDict())
+                for name, settings in node_entry["attributes"].items()
+            }
+            samples = dict()
+            for chunk in node_entry["chunks"]:
+                if not chunk_overlaps(chunk, start, end):
+                    continue
+                offset, size = chunk[2:]
+                f.seek(offset)
+                payload = f.read(size)
+                bytes_read += size
+                for attribute_name, keys in json.loads(payload).items():
+                    if SAMPLES_KEY in keys:
+                        samples.setdefault(attribute_name, []).append(keys[SAMPLES_KEY])
+                    else:
+                        node_data[attribute_name]["keys"].update(keys)
+            for attribute_name, samples_list in samples.items():
+                node_data[attribute_name].pop("keys")
+                node_data[attribute_name][SAMPLES_KEY] = concatenate_samples(
+                    samples_list
+                )
+            yield node_path, {
+                k: v for k, v in node_data.items() if v.get("keys") or is_sampled(v)
+            }
+    _logger.debug(f"Read {bytes_read} bytes from {path}")
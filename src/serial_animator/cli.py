@@ -0,0 +1,141 @@
+"""
+Command-line tools for working with archives outside of Maya.
+
+Run with: python -m serial_animator <command> ...
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+
+def diff_command(args: argparse.Namespace) -> int:
+    import serial_animator.archive_diff as archive_diff
+
+    report = archive_diff.diff_archives(
+        Path(args.a), Path(args.b), step=args.step, tolerance=args.tolerance
+    )
+    print(archive_diff.format_report(report, as_json=args.json))
+    return 1 if archive_diff.has_differences(report) else 0
+
+
+def ls_command(args: argparse.Namespace) -> int:
+    import serial_animator.archive_info as archive_info
+
+    infos = archive_info.read_archive_infos(
+        [Path(p) for p in args.paths], max_workers=args.workers
+    )
+    if not args.json:
+        for info in infos:
+            info.pop("meta_data", None)
+    print(archive_info.format_infos(infos, as_json=args.json))
+    return 1 if any("error" in info for info in infos) else 0
+
+
+def inspect_command(args: argparse.Namespace) -> int:
+    import serial_animator.archive_info as archive_info
+
+    infos = [archive_info.read_archive_info(Path(p)) for p in args.paths]
+    if args.json:
+        print(archive_info.format_infos(infos, as_json=True))
+        return 0
+    for info in infos:
+        meta_data = info.pop("meta_data")
+        for key, value in [*info.items(), *meta_data.items()]:
+            if isinstance(value, list) and len(value) > 8:
+                value = f"[{len(value)} items]"
+            print(f"{key}: {value}")
+        print()
+    return 0
+
+
+def migrate_command(args: argparse.Namespace) -> int:
+    import serial_animator.migration as migration
+
+    report = migration.migrate_library(
+        [Path(p) for p in args.paths], max_workers=args.workers, dry_run=args.dry_run
+    )
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        print(migration.format_report(report))
+    return 1 if report["failed"] else 0
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="serial-animator", description="Tools for serial-animator archives"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    diff_parser = subparsers.add_parser(
+        "diff", help="Compare two .anim or .pose archives per node and attribute"
+    )
+    diff_parser.add_argument("a", help="Archive to compare from")
+    diff_parser.add_argument("b", help="Archive to compare to")
+    diff_parser.add_argument(
+        "--step", type=float, default=1.0, help="Frames between sampled values"
+    )
+    diff_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-6,
+        help="Largest value deviation not reported as a change",
+    )
+    diff_parser.add_argument("--json", action="store_true", help="Output json")
+    diff_parser.set_defaults(func=diff_command)
+
+    ls_parser = subparsers.add_parser(
+        "ls", help="List archives with node-counts, frame-ranges and sizes"
+    )
+    ls_parser.add_argument(
+        "paths", nargs="*", default=["."], help="Archives or directories to search"
+    )
+    ls_parser.add_argument(
+        "--workers", type=int, default=16, help="Files and directories read at once"
+    )
+    ls_parser.add_argument("--json", action="store_true", help="Output json")
+    ls_parser.set_defaults(func=ls_command)
+
+    inspect_parser = subparsers.add_parser(
+        "inspect", help="Show an archive's info and meta-data"
+    )
+    inspect_parser.add_argument("paths", nargs="+", help="Archives to inspect")
+    inspect_parser.add_argument("--json", action="store_true", help="Output json")
+    inspect_parser.set_defaults(func=inspect_command)
+
+    migrate_parser = subparsers.add_parser(
+        "migrate", help="Rewrite archives in place in the current layout"
+    )
+    migrate_parser.add_argument(
+        "paths", nargs="+", help="Archives or directories to migrate"
+    )
+    migrate_parser.add_argument(
+        "--workers", type=int, default=None, help="Archives migrated at once"
+    )
+    migrate_parser.add_argument(
+        "--dry-run", action="store_true", help="Verify without replacing archives"
+    )
+    migrate_parser.add_argument("--json", action="store_true", help="Output json")
+    migrate_parser.set_defaults(func=migrate_command)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs a command. Returns the exit-code: 0 on success, 1 if diff
+    found differences, or ls or migrate failed on an archive
+    """
+    args = get_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Evaluation of stored animation-curves outside of Maya.
+
+Segments between keys are evaluated like Maya's anim-curves: cubic
+hermite from the tangent angles on non-weighted curves, cubic bezier
+from the tangent angles and weights on weighted curves, and held values
+for step and stepnext out-tangents. Times outside the keys follow the
+curve's pre- and post-infinity.
+
+Tangents follow the convention in key_arrays: angles are against
+seconds, and a bezier control-point is a third of the tangent-vector
+(weight * cos(angle) seconds, weight * sin(angle)) away from its key.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+from serial_animator.key_arrays import KeyArrays, angle_to_slope
+from serial_animator.key_reduction import evaluate_hermite
+from serial_animator.sampled_channels import (
+    SAMPLES_KEY,
+    STEP,
+    decode_values,
+    get_sample_times,
+    is_sampled,
+)
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+CYCLING_INFINITY = ("cycle", "cycleRelative", "oscillate")
+BEZIER_ITERATIONS = 32
+
+
+def wrap_times(
+    times: np.ndarray, first: float, last: float, infinity: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Maps times outside the keys into the keyed range for cycling
+    infinity. Returns mapped times and the number of cycles each time
+    was moved
+    """
+    period = last - first
+    cycles = np.floor((times - first) / period)
+    mapped = times - cycles * period
+    if infinity == "oscillate":
+        odd = np.mod(cycles, 2) == 1
+        mapped = np.where(odd, last - (mapped - first), mapped)
+    return mapped, cycles
+
+
+def solve_bezier(x0, x1, x2, x3, times: np.ndarray) -> np.ndarray:
+    """
+    Finds bezier-parameters where x(s) reaches times by bisection. x
+    must be increasing, which holds when the control-points are within
+    the segment
+    """
+    lo = np.zeros(len(times))
+    hi = np.ones(len(times))
+    for _ in range(BEZIER_ITERATIONS):
+        s = (lo + hi) * 0.5
+        x = evaluate_bezier(x0, x1, x2, x3, s)
+        below = x < times
+        lo = np.where(below, s, lo)
+        hi = np.where(below, hi, s)
+    return (lo + hi) * 0.5
+
+
+def evaluate_bezier(p0, p1, p2, p3, s: np.ndarray) -> np.ndarray:
+    r = 1.0 - s
+    return r * r * r * p0 + 3 * r * r * s * p1 + 3 * r * s * s * p2 + s * s * s * p3
+
+
+def evaluate_segments(
+    keys: KeyArrays, times: np.ndarray, fps: float, weighted: bool
+) -> np.ndarray:
+    """Evaluates times within the keyed range"""
+    index = np.clip(
+        np.searchsorted(keys.times, times, side="right") - 1, 0, len(keys) - 2
+    )
+    t0 = keys.times[index]
+    t1 = keys.times[index + 1]
+    v0 = keys.values[index]
+    v1 = keys.values[index + 1]
+    out_angles = np.radians(keys.out_angles[index])
+    in_angles = np.radians(keys.in_angles[index + 1])
+    if weighted:
+        out_weights = keys.out_weights[index]
+        in_weights = keys.in_weights[index + 1]
+        # control-points are kept within the segment, as in Maya
+        x1 = np.minimum(t0 + out_weights * np.cos(out_angles) * fps / 3.0, t1)
+        x2 = np.maximum(t1 - in_weights * np.cos(in_angles) * fps / 3.0, t0)
+        y1 = v0 + out_weights * np.sin(out_angles) / 3.0
+        y2 = v1 - in_weights * np.sin(in_angles) / 3.0
+        s = solve_bezier(t0, x1, x2, t1, times)
+        values = evaluate_bezier(v0, y1, y2, v1, s)
+    else:
+        m0 = np.tan(out_angles) / fps
+        m1 = np.tan(in_angles) / fps
+        values = evaluate_hermite(t0, v0, m0, t1, v1, m1, times)
+    out_types = keys.out_types[index]
+    values = np.where(out_types == "step", np.where(times >= t1, v1, v0), values)
+    values = np.where(out_types == "stepnext", np.where(times <= t0, v0, v1), values)
+    return values
+
+
+def evaluate_keys(
+    keys: KeyArrays,
+    times,
+    fps: float,
+    weighted: bool = False,
+    pre_infinity: str = "constant",
+    post_infinity: str = "constant",
+) -> np.ndarray:
+    """Evaluates the curve given by keys at times (in frames)"""
+    times = np.asarray(times, dtype=np.float64)
+    if not len(keys):
+        raise ValueError("Can't evaluate a curve without keys")
+    first = keys.times[0]
+    last = keys.times[-1]
+    if len(keys) == 1 or first == last:
+        values = np.full(len(times), keys.values[0])
+        before = times < first
+        after = times > last
+    else:
+        mapped = times.copy()
+        offsets = np.zeros(len(times))
+        change = keys.values[-1] - keys.values[0]
+        for infinity, mask in (
+            (pre_infinity, times < first),
+            (post_infinity, times > last),
+        ):
+            if infinity not in CYCLING_INFINITY or not np.any(mask):
+                continue
+            wrapped, cycles = wrap_times(times[mask], first, last, infinity)
+            mapped[mask] = wrapped
+            if infinity == "cycleRelative":
+                offsets[mask] = cycles * change
+        values = evaluate_segments(keys, np.clip(mapped, first, last), fps, weighted)
+        values += offsets
+        before = (times < first) & (pre_infinity not in CYCLING_INFINITY)
+        after = (times > last) & (post_infinity not in CYCLING_INFINITY)
+    if pre_infinity == "linear":
+        slope = angle_to_slope(keys.in_angles[0], fps)
+        values = np.where(before, keys.values[0] + (times - first) * slope, values)
+    else:
+        values = np.where(before, keys.values[0], values)
+    if post_infinity == "linear":
+        slope = angle_to_slope(keys.out_angles[-1], fps)
+        values = np.where(after, keys.values[-1] + (times - last) * slope, values)
+    else:
+        values = np.where(after, keys.values[-1], values)
+    return values
+
+
+def evaluate_samples(samples: dict, times) -> np.ndarray:
+    """Evaluates sampled channels at times, holding the ends"""
+    times = np.asarray(times, dtype=np.float64)
+    sample_times = get_sample_times(samples)
+    values = decode_values(samples["values"])
+    if samples["interpolation"] == STEP:
+        index = np.searchsorted(sample_times, times, side="right") - 1
+        return values[np.clip(index, 0, len(values) - 1)]
+    return np.interp(times, sample_times, values)
+
+
+def evaluate_attribute_data(
+    attribute_data: dict, times, fps: float, keys: Optional[KeyArrays] = None
+) -> np.ndarray:
+    """
+    Evaluates an attribute's stored animation-data at times. keys can
+    be given if the key-data is already converted to arrays
+    """
+    if is_sampled(attribute_data):
+        return evaluate_samples(attribute_data[SAMPLES_KEY], times)
+    if keys is None:
+        keys = KeyArrays.from_key_data(attribute_data["keys"])
+    return evaluate_keys(
+        keys,
+        times,
+        fps,
+        weighted=attribute_data.get("weightedTangents", False),
+        pre_infinity=attribute_data.get("preInfinity", "constant"),
+        post_infinity=attribute_data.get("postInfinity", "constant"),
+    )
+
+
+def sample_attribute_data(
+    attribute_data: dict,
+    fps: float,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    step: float = 1.0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Samples an attribute's animation every step frames from start to
+    end, defaulting to the keyed range. Returns times and values
+    """
+    if is_sampled(attribute_data):
+        keyed_times = get_sample_times(attribute_data[SAMPLES_KEY])
+    else:
+        keyed_times = KeyArrays.from_key_data(attribute_data["keys"]).times
+    start = keyed_times[0] if start is None else start
+    end = keyed_times[-1] if end is None else end
+    times = np.arange(start, end + step * 0.5, step)
+    return times, evaluate_attribute_data(attribute_data, times, fps)
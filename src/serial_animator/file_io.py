@@ -1,14 +1,220 @@
-from typing import List
+from typing import (
+    Any,
+    BinaryIO,
+    Collection,
+    Generator,
+    IO,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 from pathlib import Path
+import io
+import os
 import tarfile
 import json
+import uuid
 
+from serial_animator.exceptions import SerialAnimatorError
 from serial_animator import log
 
 _logger = log.log(__name__)
 # _logger.setLevel("DEBUG")
 
 
+# data of an archive-member: bytes, a binary file or a generator of bytes
+Payload = Union[bytes, BinaryIO, Iterable[bytes]]
+# an archive-member written from memory
+NamedPayload = Tuple[str, Payload]
+JSON_CHUNK_SIZE = 64 * 1024
+COPY_SIZE = 1024 * 1024
+# characters that can continue a json-number
+NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+
+class SerialAnimatorArchiveError(SerialAnimatorError):
+    """Error when writing an archive"""
+
+
+class ArchiveWriter(object):
+    """
+    Writes a tar-archive in a single pass from in-memory payloads and
+    files. Payloads are bytes, binary files or generators of bytes.
+    Generators are streamed, and their member's size is written once
+    they are exhausted, so they are never joined in memory.
+    The archive is written to a temporary file next to out_path, which
+    replaces out_path when the writer is closed
+    """
+
+    def __init__(
+            self,
+            out_path: Path,
+            tar_format: int = tarfile.PAX_FORMAT,
+            encoding: str = "utf-8",
+    ):
+        self.out_path = Path(out_path)
+        self.tar_format = tar_format
+        self.encoding = encoding
+        self.names = list()
+        self.tmp_path = self.out_path.with_name(
+            f".{self.out_path.name}.{uuid.uuid4().hex}.tmp"
+        )
+        self.out_path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(self.tmp_path, "wb")
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.discard()
+        else:
+            self.close()
+
+    def get_header(self, info: tarfile.TarInfo) -> bytes:
+        return info.tobuf(self.tar_format, self.encoding, "surrogateescape")
+
+    def add(self, name: str, payload: Payload, mtime: int = 0) -> int:
+        """
+        Adds payload to the archive as member name. Returns the offset
+        of the member's data in the archive
+        """
+        info = tarfile.TarInfo(name)
+        info.mtime = mtime
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            info.size = len(payload)
+            offset = self._write_header(info)
+            self._f.write(payload)
+        elif hasattr(payload, "read"):
+            info.size = get_remaining_size(payload)
+            offset = self._write_header(info)
+            copied = copy_file_data(payload, self._f, info.size)
+            if copied != info.size:
+                raise SerialAnimatorArchiveError(
+                    f"{name} ended after {copied} of {info.size} bytes"
+                )
+        else:
+            offset = self._write_streamed(info, payload)
+        self._pad(info.size)
+        self.names.append(name)
+        return offset
+
+    def add_file(self, path: Path, name: Optional[str] = None) -> int:
+        """
+        Adds file at path to the archive, by its name unless name is
+        given. The modification-time is truncated to whole seconds,
+        which avoids an extended pax-header per file
+        """
+        path = Path(path)
+        with open(path, "rb") as f:
+            return self.add(name or path.name, f, int(os.fstat(f.fileno()).st_mtime))
+
+    def _write_header(self, info: tarfile.TarInfo) -> int:
+        self._f.write(self.get_header(info))
+        return self._f.tell()
+
+    def _write_streamed(self, info: tarfile.TarInfo, chunks: Iterable[bytes]) -> int:
+        """
+        Writes a header for an empty member, streams chunks after it and
+        rewrites the header with their size
+        """
+        header_offset = self._f.tell()
+        header_size = len(self.get_header(info))
+        offset = self._write_header(info)
+        for chunk in chunks:
+            self._f.write(chunk)
+            info.size += len(chunk)
+        header = self.get_header(info)
+        if len(header) != header_size:
+            raise SerialAnimatorArchiveError(
+                f"{info.name} is too big to stream ({info.size} bytes)"
+            )
+        self._f.seek(header_offset)
+        self._f.write(header)
+        self._f.seek(0, io.SEEK_END)
+        return offset
+
+    def _pad(self, size: int):
+        remainder = size % tarfile.BLOCKSIZE
+        if remainder:
+            self._f.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+
+    def close(self):
+        """
+        Ends the archive with two empty blocks, padded to a full record,
+        and moves it to out_path
+        """
+        if self._f.closed:
+            return
+        try:
+            self._f.write(tarfile.NUL * (tarfile.BLOCKSIZE * 2))
+            remainder = self._f.tell() % tarfile.RECORDSIZE
+            if remainder:
+                self._f.write(tarfile.NUL * (tarfile.RECORDSIZE - remainder))
+            self._f.close()
+            os.replace(self.tmp_path, self.out_path)
+        except OSError:
+            self.discard()
+            raise
+
+    def discard(self):
+        """Stops writing and removes the unfinished archive"""
+        self._f.close()
+        if self.tmp_path.exists():
+            self.tmp_path.unlink()
+
+
+def get_remaining_size(f: BinaryIO) -> int:
+    """Gets the number of bytes from the position of f to its end"""
+    if isinstance(f, io.BytesIO):
+        return len(f.getbuffer()) - f.tell()
+    position = f.tell()
+    size = f.seek(0, io.SEEK_END) - position
+    f.seek(position)
+    return size
+
+
+def copy_file_data(f: BinaryIO, out_f: BinaryIO, size: int) -> int:
+    """Copies size bytes from f to out_f. Returns the number of bytes copied"""
+    copied = 0
+    while copied < size:
+        data = f.read(min(COPY_SIZE, size - copied))
+        if not data:
+            break
+        out_f.write(data)
+        copied += len(data)
+    return copied
+
+
+def get_member_name(member: Union[Path, NamedPayload]) -> str:
+    """Gets the name of a file-path or named payload in an archive"""
+    if isinstance(member, tuple):
+        return member[0]
+    return Path(member).name
+
+
+def iter_json_data(
+        data: Any, encoder=json.JSONEncoder, chunk_size: int = JSON_CHUNK_SIZE
+) -> Generator[bytes, None, None]:
+    """
+    Encodes data as json like write_json_data, yielding utf-8 chunks of
+    about chunk_size, so it can be streamed into an archive
+    """
+    chunks = list()
+    size = 0
+    for chunk in encoder(indent=4).iterencode(data):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            yield "".join(chunks).encode("utf-8")
+            chunks = list()
+            size = 0
+    if chunks:
+        yield "".join(chunks).encode("utf-8")
+
+
 def archive_files(files: List[Path], out_path: Path, compression="") -> Path:
     """Creates a tar-archive at out_path containing specified files"""
     tf = None
@@ -45,6 +251,109 @@ def read_data_from_archive(archive_path: Path, json_name: str) -> dict:
     return data
 
 
+def read_json_members_from_archive(archive_path: Path, json_names: List[str]) -> dict:
+    """
+    Reads several json-files from archive in one pass. Returns a dict
+    with file-name: data. Files missing from archive are left out
+    """
+    data = dict()
+    with tarfile.open(str(archive_path)) as tf:
+        for json_name in json_names:
+            try:
+                j_data = tf.extractfile(json_name)
+            except KeyError:
+                continue
+            data[json_name] = json.load(j_data)
+    return data
+
+
+def iter_json_items_from_archive(
+        archive_path: Path, json_name: str, keys: Optional[Collection[str]] = None
+) -> Generator[Tuple[str, Any], None, None]:
+    """
+    Streams the items of a json-object in archive one at a time. If keys
+    is given, only those items are yielded
+    """
+    with tarfile.open(str(archive_path)) as tf:
+        j_data = tf.extractfile(json_name)
+        yield from iter_json_object_items(j_data, keys=keys)
+
+
+def iter_json_object_items(
+        f: IO, keys: Optional[Collection[str]] = None, chunk_size: int = 1024 * 1024
+) -> Generator[Tuple[str, Any], None, None]:
+    """
+    Decodes a json-object from a binary file one item at a time, so
+    only the largest item needs to be held in memory. Items not in keys
+    are decoded and dropped right away.
+    """
+    text = io.TextIOWrapper(f, encoding="utf-8")
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def read_more(size: int) -> bool:
+        nonlocal buffer, pos, eof
+        chunk = text.read(size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def next_char() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not read_more(chunk_size):
+                raise json.JSONDecodeError("Unexpected end of data", buffer, pos)
+
+    def decode_value():
+        nonlocal pos
+        next_char()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # a value at the end of the buffer, or a number cut
+                # short (like "1." of "1.5"), might continue in the
+                # next chunk
+                if eof or (end < len(buffer) and buffer[end] not in NUMBER_CHARS):
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            read_more(max(chunk_size, len(buffer) - pos))
+
+    try:
+        if next_char() != "{":
+            raise json.JSONDecodeError("Expected a json-object", buffer, pos)
+        pos += 1
+        while True:
+            char = next_char()
+            if char == "}":
+                return
+            if char == ",":
+                pos += 1
+                continue
+            key = decode_value()
+            if next_char() != ":":
+                raise json.JSONDecodeError("Expected ':'", buffer, pos)
+            pos += 1
+            value = decode_value()
+            if keys is None or key in keys:
+                yield key, value
+            del value
+    finally:
+        # don't let the wrapper close the file it was given
+        text.detach()
+
+
 def write_json_data(data: dict, path: Path, encoder=json.JSONEncoder):
     with open(path, "w") as f:
         json.dump(data, fp=f, indent=4, cls=encoder)
@@ -1,6 +1,6 @@
 """Utilities to find nodes from path-name but in different namespaces"""
 from typing import Generator, Optional, List
-import pymel.core as pm
+from maya import cmds
 
 from serial_animator import log
 
@@ -9,17 +9,17 @@ _logger = log.log(__name__)
 # _logger.setLevel("DEBUG")
 
 
-def search_nodes(node_paths: List[str], target_nodes: List[pm.PyNode]) -> dict:
+def search_nodes(node_paths: List[str], target_nodes: list) -> dict:
     """
     finds relevant nodes in target-dict based on full path defined in
-    node_paths.
+    node_paths. target_nodes are PyNodes or long node-names.
     Returns a dict with node_path: target_node
     """
     target_dict = get_node_path_dict(target_nodes)
     node_dict = dict()
     stripped_names = [strip_all_namespaces(name) for name in target_dict.keys()]
     node_list = list(target_dict.values())
-    scene_namespaces = pm.namespaceInfo(listNamespace=True)
+    scene_namespaces = cmds.namespaceInfo(listNamespace=True) or list()
     for node_name in node_paths:
         for ns, search_name in strip_namespaces_gen(node_name):
             if ns in scene_namespaces:
@@ -69,7 +69,7 @@ def strip_all_namespaces(name: str) -> Optional[str]:
     return name.replace(namespaces, "")
 
 
-def get_node_path_dict(nodes: List[pm.PyNode]) -> dict:
+def get_node_path_dict(nodes: list) -> dict:
     path_dict = dict()
     for node in nodes:
         path_dict[get_node_path(node)] = node
@@ -83,7 +83,13 @@ def node_dict_to_path_dict(node_dict: dict) -> dict:
     return node_path_data
 
 
-def get_node_path(node):
+def get_node_path(node) -> str:
+    """
+    Gets the full path of a PyNode, or the name of a dependency-node.
+    Node-names from maya.cmds are expected to be long names already
+    """
+    if isinstance(node, str):
+        return node
     try:
         return node.fullPath()
     except AttributeError:
@@ -0,0 +1,253 @@
+"""
+Array representation of key-data, for operating on whole curves at a
+time instead of key by key.
+
+Times are in frames. Tangent angles and weights are expressed against
+seconds, so changing time unit doesn't change them, while retiming a
+curve does.
+"""
+
+from collections import OrderedDict
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+ATTRIBUTE_CLASSES = {
+    "doubleLinear": "translate",
+    "distance": "translate",
+    "doubleAngle": "rotate",
+    "angle": "rotate",
+}
+
+
+class KeyArrays(object):
+    """Key-data for one curve as parallel arrays sorted by time"""
+
+    def __init__(
+        self,
+        times: np.ndarray,
+        values: np.ndarray,
+        in_angles: np.ndarray,
+        out_angles: np.ndarray,
+        in_weights: np.ndarray,
+        out_weights: np.ndarray,
+        in_types: Sequence[str],
+        out_types: Sequence[str],
+        locks: np.ndarray,
+        weight_locks: np.ndarray,
+    ):
+        self.times = times
+        self.values = values
+        self.in_angles = in_angles
+        self.out_angles = out_angles
+        self.in_weights = in_weights
+        self.out_weights = out_weights
+        self.in_types = np.asarray(in_types, dtype=object)
+        self.out_types = np.asarray(out_types, dtype=object)
+        self.locks = locks
+        self.weight_locks = weight_locks
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @classmethod
+    def from_key_data(cls, key_data: dict) -> "KeyArrays":
+        """
+        Creates arrays from key-data as stored in archives:
+        {time: (value, (inAngle, outAngle, inWeight, outWeight,
+        inTangentType, outTangentType, lock, weightLock))}.
+        Times may be strings, as json stores keys as strings
+        """
+        times = np.array([float(t) for t in key_data], dtype=np.float64)
+        keys = list(key_data.values())
+        values = np.array([k[0] for k in keys], dtype=np.float64)
+        tangents = [k[1] for k in keys]
+        numeric = np.array([t[:4] for t in tangents], dtype=np.float64).reshape(-1, 4)
+        arrays = cls(
+            times=times,
+            values=values,
+            in_angles=numeric[:, 0],
+            out_angles=numeric[:, 1],
+            in_weights=numeric[:, 2],
+            out_weights=numeric[:, 3],
+            in_types=[t[4] for t in tangents],
+            out_types=[t[5] for t in tangents],
+            locks=np.array([t[6] for t in tangents], dtype=bool),
+            weight_locks=np.array([t[7] for t in tangents], dtype=bool),
+        )
+        if len(times) > 1 and np.any(np.diff(times) < 0):
+            arrays = arrays.take(np.argsort(times, kind="stable"))
+        return arrays
+
+    def to_key_data(self) -> OrderedDict:
+        """Converts arrays back to key-data"""
+        data = OrderedDict()
+        for i, time in enumerate(self.times.tolist()):
+            data[time] = (
+                float(self.values[i]),
+                (
+                    float(self.in_angles[i]),
+                    float(self.out_angles[i]),
+                    float(self.in_weights[i]),
+                    float(self.out_weights[i]),
+                    self.in_types[i],
+                    self.out_types[i],
+                    bool(self.locks[i]),
+                    bool(self.weight_locks[i]),
+                ),
+            )
+        return data
+
+    def take(self, index) -> "KeyArrays":
+        """Gets new arrays holding the keys at index (a slice or index-array)"""
+        return KeyArrays(
+            times=self.times[index],
+            values=self.values[index],
+            in_angles=self.in_angles[index],
+            out_angles=self.out_angles[index],
+            in_weights=self.in_weights[index],
+            out_weights=self.out_weights[index],
+            in_types=self.in_types[index],
+            out_types=self.out_types[index],
+            locks=self.locks[index],
+            weight_locks=self.weight_locks[index],
+        )
+
+    def clip(
+        self, start: Optional[float] = None, end: Optional[float] = None
+    ) -> "KeyArrays":
+        """Gets keys in the range start to end (inclusive) by binary search"""
+        lo = 0 if start is None else np.searchsorted(self.times, start, side="left")
+        hi = len(self)
+        if end is not None:
+            hi = np.searchsorted(self.times, end, side="right")
+        return self.take(slice(lo, hi))
+
+
+def get_attribute_class(attribute_type: str) -> str:
+    """
+    Gets the class of an attribute-type for tolerances and precision:
+    "translate" for distances, "rotate" for angles or else "scalar"
+    """
+    return ATTRIBUTE_CLASSES.get(attribute_type, "scalar")
+
+
+def angle_to_slope(angles, fps: float):
+    """Converts tangent angles in degrees to slopes in value per frame"""
+    return np.tan(np.radians(angles)) / fps
+
+
+def slope_to_angle(slopes, fps: float):
+    """Converts slopes in value per frame to tangent angles in degrees"""
+    return np.degrees(np.arctan(np.asarray(slopes) * fps))
+
+
+def scale_tangents(
+    angles: np.ndarray, weights: np.ndarray, time_scale: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Gets angles (in degrees) and weights of tangents after stretching
+    time by time_scale. The tangent-vector's time-component is scaled,
+    its value-component kept
+    """
+    radians = np.radians(angles)
+    x = weights * np.cos(radians) * time_scale
+    y = weights * np.sin(radians)
+    return np.degrees(np.arctan2(y, x)), np.hypot(x, y)
+
+
+class TimeTransform(object):
+    """
+    Affine transform of key-times: time * scale + shift. tangent_scale
+    is the part of scale that retimes the curve in seconds, and so
+    changes tangents. Converting time unit only changes scale
+    """
+
+    def __init__(self, scale: float = 1.0, shift: float = 0.0, tangent_scale=1.0):
+        self.scale = scale
+        self.shift = shift
+        self.tangent_scale = tangent_scale
+
+    def __repr__(self):
+        return (
+            f"TimeTransform(scale={self.scale}, shift={self.shift}, "
+            f"tangent_scale={self.tangent_scale})"
+        )
+
+    def is_identity(self) -> bool:
+        return self.scale == 1.0 and self.shift == 0.0 and self.tangent_scale == 1.0
+
+    def map_time(self, time: float) -> float:
+        return time * self.scale + self.shift
+
+    def unmap_range(
+        self, start: Optional[float] = None, end: Optional[float] = None
+    ) -> Tuple[Optional[float], Optional[float]]:
+        """Gets the range of source-times mapping to start and end"""
+        source = [
+            None if t is None else (t - self.shift) / self.scale for t in (start, end)
+        ]
+        if self.scale < 0:
+            source.reverse()
+        return source[0], source[1]
+
+    def convert_time_unit(self, source_fps: float, target_fps: float):
+        """Converts frames at source_fps to frames at target_fps"""
+        ratio = float(target_fps) / float(source_fps)
+        self.scale *= ratio
+        self.shift *= ratio
+
+    def fit_range(self, source_range: Sequence[float], target_range: Sequence[float]):
+        """
+        Retimes so source_range (in frames after the transform so far)
+        fits target_range
+        """
+        source_start, source_end = source_range
+        target_start, target_end = target_range
+        if source_end == source_start:
+            factor = 1.0
+        else:
+            factor = (target_end - target_start) / float(source_end - source_start)
+        self.scale *= factor
+        self.shift = target_start + (self.shift - source_start) * factor
+        self.tangent_scale *= factor
+
+    def offset(self, frames: float):
+        """Moves keys by frames"""
+        self.shift += frames
+
+    def apply(self, keys: KeyArrays) -> KeyArrays:
+        """Gets new key-arrays with transform applied"""
+        keys = keys.take(slice(None))
+        keys.times = keys.times * self.scale + self.shift
+        if self.tangent_scale != 1.0:
+            keys.in_angles, keys.in_weights = scale_tangents(
+                keys.in_angles, keys.in_weights, self.tangent_scale
+            )
+            keys.out_angles, keys.out_weights = scale_tangents(
+                keys.out_angles, keys.out_weights, self.tangent_scale
+            )
+        return keys
+
+
+def transform_key_data(
+    key_data: dict,
+    transform: Optional[TimeTransform] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+) -> OrderedDict:
+    """
+    Transforms key-times of key_data and clips them to start and end
+    (in transformed time)
+    """
+    keys = KeyArrays.from_key_data(key_data)
+    if transform and not transform.is_identity():
+        keys = transform.apply(keys)
+    if start is not None or end is not None:
+        keys = keys.clip(start, end)
+    return keys.to_key_data()
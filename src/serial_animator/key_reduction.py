@@ -0,0 +1,213 @@
+"""
+Save-time key reduction for baked animation.
+
+Curves with a key on every frame are refitted with fewer keys and fixed
+tangents, keeping the curve within a tolerance per attribute-class.
+Curves that don't change are collapsed to a single key.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from serial_animator.key_arrays import (
+    KeyArrays,
+    get_attribute_class,
+    slope_to_angle,
+)
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+DEFAULT_TOLERANCES = {"translate": 0.001, "rotate": 0.01, "scalar": 0.001}
+# keys further apart than this are not considered baked
+MAX_BAKED_STEP = 1.0
+
+
+def is_baked(keys: KeyArrays) -> bool:
+    """Checks if keys are on every frame (or closer) with smooth tangents"""
+    if len(keys) < 3:
+        return False
+    if np.max(np.diff(keys.times)) > MAX_BAKED_STEP + 1e-6:
+        return False
+    stepped = ("step", "stepnext")
+    return not any(t in stepped for t in (*keys.in_types, *keys.out_types))
+
+
+def is_static(keys: KeyArrays, tolerance: float) -> bool:
+    """Checks if keys are within tolerance of the first value and flat"""
+    if np.max(np.abs(keys.values - keys.values[0])) > tolerance:
+        return False
+    if is_baked(keys):
+        return True
+    return bool(np.allclose(keys.in_angles, 0) and np.allclose(keys.out_angles, 0))
+
+
+def evaluate_hermite(
+    t0: float, v0: float, m0: float, t1: float, v1: float, m1: float, times
+) -> np.ndarray:
+    """
+    Evaluates a cubic hermite segment between two keys with slopes m0,
+    m1 in value per frame at times
+    """
+    dt = t1 - t0
+    s = (np.asarray(times) - t0) / dt
+    s2 = s * s
+    s3 = s2 * s
+    h00 = 2 * s3 - 3 * s2 + 1
+    h10 = s3 - 2 * s2 + s
+    h01 = -2 * s3 + 3 * s2
+    h11 = s3 - s2
+    return h00 * v0 + h10 * dt * m0 + h01 * v1 + h11 * dt * m1
+
+
+def fit_keys(
+    times: np.ndarray, values: np.ndarray, tolerance: float
+) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Picks the keys needed to stay within tolerance of values when
+    interpolating with hermite-segments. Slopes are estimated from the
+    samples. Segments are split at their worst sample until all
+    samples are within tolerance.
+    Returns indices of kept keys, their slopes and the maximum error
+    """
+    slopes = np.gradient(values, times)
+    last = len(times) - 1
+    kept = {0, last}
+    segments = [(0, last)]
+    while segments:
+        i, j = segments.pop()
+        if j - i < 2:
+            continue
+        fitted = evaluate_hermite(
+            times[i], values[i], slopes[i], times[j], values[j], slopes[j], times[i:j]
+        )
+        errors = np.abs(fitted - values[i:j])
+        worst = int(np.argmax(errors))
+        if errors[worst] > tolerance:
+            split = i + worst
+            kept.add(split)
+            segments.append((i, split))
+            segments.append((split, j))
+    indices = np.array(sorted(kept))
+    return indices, slopes[indices], get_fit_error(times, values, indices, slopes)
+
+
+def get_fit_error(times, values, indices, slopes) -> float:
+    """Gets maximum error of the kept keys against all samples"""
+    max_error = 0.0
+    for a, b in zip(indices[:-1], indices[1:]):
+        fitted = evaluate_hermite(
+            times[a], values[a], slopes[a], times[b], values[b], slopes[b], times[a:b]
+        )
+        if len(fitted):
+            max_error = max(max_error, float(np.max(np.abs(fitted - values[a:b]))))
+    return max_error
+
+
+def reduce_key_data(
+    key_data: dict, tolerance: float, fps: float
+) -> Tuple[Optional[OrderedDict], dict]:
+    """
+    Reduces keys in key_data within tolerance. Returns the new key-data,
+    or None if the curve was left as is, and a report with the number
+    of keys before and after, the reduction ratio and max error
+    """
+    keys = KeyArrays.from_key_data(key_data)
+    report = {"before": len(keys), "after": len(keys), "ratio": 1.0, "max_error": 0.0}
+    if not len(keys):
+        return None, report
+    if is_static(keys, tolerance):
+        reduced = keys.take(slice(0, 1))
+        reduced.in_angles[:] = 0.0
+        reduced.out_angles[:] = 0.0
+        reduced.in_types[:] = "flat"
+        reduced.out_types[:] = "flat"
+        max_error = float(np.max(np.abs(keys.values - keys.values[0])))
+    elif is_baked(keys):
+        indices, slopes, max_error = fit_keys(keys.times, keys.values, tolerance)
+        reduced = keys.take(indices)
+        angles = slope_to_angle(slopes, fps)
+        reduced.in_angles = angles
+        reduced.out_angles = angles.copy()
+        reduced.in_weights = np.ones(len(indices))
+        reduced.out_weights = np.ones(len(indices))
+        reduced.in_types[:] = "fixed"
+        reduced.out_types[:] = "fixed"
+        reduced.locks[:] = True
+        reduced.weight_locks[:] = False
+    else:
+        return None, report
+    report["after"] = len(reduced)
+    report["ratio"] = report["after"] / float(report["before"])
+    report["max_error"] = max_error
+    return reduced.to_key_data(), report
+
+
+def reduce_node_data(
+    node_data: dict, fps: float, tolerances: Optional[Dict[str, float]] = None
+) -> Tuple[dict, dict]:
+    """
+    Reduces keys on all attributes in node_data. Returns new node-data
+    and a report per attribute
+    """
+    tolerances = dict(DEFAULT_TOLERANCES, **(tolerances or dict()))
+    reduced_data = dict()
+    reports = dict()
+    for attribute_name, attribute_data in node_data.items():
+        if "keys" not in attribute_data:
+            # sampled channels have no keys to reduce
+            reduced_data[attribute_name] = attribute_data
+            continue
+        attribute_class = get_attribute_class(attribute_data.get("attributeType"))
+        keys, report = reduce_key_data(
+            attribute_data.get("keys"), tolerances[attribute_class], fps
+        )
+        reports[attribute_name] = report
+        if keys is None:
+            reduced_data[attribute_name] = attribute_data
+            continue
+        reduced_data[attribute_name] = dict(
+            attribute_data, keys=keys, weightedTangents=False
+        )
+    return reduced_data, reports
+
+
+def reduce_anim_data(
+    path_data: dict, fps: float, tolerances: Optional[Dict[str, float]] = None
+) -> Tuple[dict, dict]:
+    """
+    Reduces keys on all nodes in path_data. Returns new data and a
+    report per node and attribute
+    """
+    reduced_data = dict()
+    reports = dict()
+    for node_path, node_data in path_data.items():
+        reduced_data[node_path], reports[node_path] = reduce_node_data(
+            node_data, fps, tolerances
+        )
+    return reduced_data, reports
+
+
+def log_reduction_report(reports: dict):
+    """Logs reduction per curve and in total"""
+    before = 0
+    after = 0
+    max_error = 0.0
+    for node_path, node_reports in reports.items():
+        for attribute_name, report in node_reports.items():
+            _logger.debug(
+                f"{node_path}.{attribute_name}: {report['before']} -> "
+                f"{report['after']} keys ({report['ratio']:.1%}), "
+                f"max error {report['max_error']:.6g}"
+            )
+            before += report["before"]
+            after += report["after"]
+            max_error = max(max_error, report["max_error"])
+    if before:
+        _logger.info(
+            f"Reduced {before} keys to {after} ({after / before:.1%}), "
+            f"max error {max_error:.6g}"
+        )
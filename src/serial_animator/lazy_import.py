@@ -0,0 +1,34 @@
+"""
+Imports modules on first use.
+
+PyMEL takes seconds to import, so modules that use it for less frequent
+work (grabbing previews from the viewport) import it with lazy_import,
+and only pay for it when that work is done.
+"""
+
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that imports it on first attribute-access"""
+
+    def __init__(self, name: str):
+        super(LazyModule, self).__init__(name)
+        self.__dict__["_module"] = None
+
+    def load(self) -> types.ModuleType:
+        if self._module is None:
+            self.__dict__["_module"] = importlib.import_module(self.__name__)
+        return self._module
+
+    def __getattr__(self, name: str):
+        return getattr(self.load(), name)
+
+    def __dir__(self):
+        return dir(self.load())
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Gets module name, imported when one of its attributes is used"""
+    return LazyModule(name)
@@ -0,0 +1,287 @@
+"""
+Local read-through mirror of archives on slow file-systems.
+
+Archives under the mirrored roots, usually the shared library on a
+network-share, are copied to a local cache-directory the first time they
+are read, and read from there while their size and modification-time on
+the share are unchanged. The mirror is bounded by max_bytes and evicts
+the least recently used copies. The order of use is kept in an index,
+so recently used archives can be prefetched in the background when the
+library is opened in a new session. The index is saved when copies are
+added or evicted; reordering it on reads is only kept in memory until
+flush() is called.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+MIRROR_MAX_BYTES = 2 * 1024**3
+INDEX_NAME = "index.json"
+INDEX_VERSION = 1
+PREFETCH_COUNT = 64
+MAX_WORKERS = 2
+
+
+class LocalFileSystem(object):
+    """Access to source-archives. Subclass to change how they are read"""
+
+    def stat(self, path) -> os.stat_result:
+        return os.stat(path)
+
+    def copy(self, path, out_path):
+        shutil.copyfile(path, out_path)
+
+    def read(self, path, size: int = -1, offset: int = 0) -> bytes:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+
+
+class SlowFileSystem(LocalFileSystem):
+    """
+    Stand-in for a network-share, for measuring the mirror locally.
+    Each call waits latency seconds, and data moves at bytes_per_second
+    """
+
+    def __init__(self, latency: float = 0.005, bytes_per_second: float = 50e6):
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+
+    def wait(self, size: int = 0):
+        time.sleep(self.latency + size / self.bytes_per_second)
+
+    def stat(self, path) -> os.stat_result:
+        self.wait()
+        return super(SlowFileSystem, self).stat(path)
+
+    def copy(self, path, out_path):
+        self.wait(os.path.getsize(path))
+        super(SlowFileSystem, self).copy(path, out_path)
+
+    def read(self, path, size: int = -1, offset: int = 0) -> bytes:
+        data = super(SlowFileSystem, self).read(path, size, offset)
+        self.wait(len(data))
+        return data
+
+
+class LibraryMirror(object):
+    """
+    LRU-mirror of archives under roots in cache_dir, bounded by
+    max_bytes. Source-archives are accessed through file_system
+    """
+
+    def __init__(
+        self,
+        cache_dir,
+        roots: Iterable = (),
+        max_bytes: int = MIRROR_MAX_BYTES,
+        file_system: Optional[LocalFileSystem] = None,
+        max_workers: int = MAX_WORKERS,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.max_bytes = max_bytes
+        self.file_system = file_system or LocalFileSystem()
+        self.max_workers = max_workers
+        # source-path: {"size", "mtime_ns", "name"}, least recently used first
+        self._entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # set when the order of use changed since the index was saved
+        self._dirty = False
+        self._lock = threading.Lock()
+        # serializes writing the index, without blocking readers
+        self._index_lock = threading.Lock()
+        self._executor = None
+        self._load_index()
+
+    def is_mirrored(self, path) -> bool:
+        path = os.path.abspath(path)
+        return any(
+            path == root or path.startswith(root + os.sep) for root in self.roots
+        )
+
+    def get_path(self, path, fetch: bool = True) -> Path:
+        """
+        Gets the path to read archive at path from: its local copy if it
+        is current, else the source-path. If fetch is True, a missing or
+        outdated copy is made first. A copy is also used if the source
+        can't be reached
+        """
+        path = Path(path)
+        if not self.is_mirrored(path):
+            return path
+        source = os.path.abspath(path)
+        try:
+            stat = self.file_system.stat(path)
+        except OSError as e:
+            local_path = self._get_local_path(source)
+            if local_path and local_path.is_file():
+                _logger.debug(f"Using mirrored copy of unreachable {path}: {e}")
+                return local_path
+            return path
+        with self._lock:
+            entry = self._entries.get(source)
+            if entry and is_current(entry, stat):
+                local_path = self.cache_dir / entry["name"]
+                if local_path.is_file():
+                    self.hits += 1
+                    if next(reversed(self._entries)) != source:
+                        self._entries.move_to_end(source)
+                        self._dirty = True
+                    return local_path
+            self.misses += 1
+        if not fetch or stat.st_size > self.max_bytes:
+            return path
+        return self._copy(path, source, stat)
+
+    def _get_local_path(self, source: str) -> Optional[Path]:
+        with self._lock:
+            entry = self._entries.get(source)
+        return self.cache_dir / entry["name"] if entry else None
+
+    def _copy(self, path: Path, source: str, stat: os.stat_result) -> Path:
+        name = hashlib.sha1(source.encode("utf-8")).hexdigest() + path.suffix
+        local_path = self.cache_dir / name
+        tmp_path = local_path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self.file_system.copy(path, tmp_path)
+            os.replace(tmp_path, local_path)
+        except OSError as e:
+            _logger.debug(f"Couldn't mirror {path}: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+            return path
+        with self._lock:
+            self._remove(source, delete=False)
+            self._entries[source] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "name": name,
+            }
+            self.current_bytes += stat.st_size
+            self._evict()
+        self._save_index()
+        _logger.debug(f"Mirrored {path} to {local_path}")
+        return local_path
+
+    def _remove(self, source: str, delete: bool = True):
+        entry = self._entries.pop(source, None)
+        if not entry:
+            return
+        self.current_bytes -= entry["size"]
+        if delete:
+            try:
+                os.remove(self.cache_dir / entry["name"])
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Removes least recently used copies until within max_bytes"""
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+
+    def _load_index(self):
+        index_path = self.cache_dir / INDEX_NAME
+        try:
+            with open(index_path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if index.get("version") != INDEX_VERSION:
+            return
+        for source, entry in index["entries"]:
+            if (self.cache_dir / entry["name"]).is_file():
+                self._entries[source] = entry
+                self.current_bytes += entry["size"]
+        self._evict()
+
+    def _save_index(self):
+        """Writes the index. Must not be called holding self._lock"""
+        index_path = self.cache_dir / INDEX_NAME
+        tmp_path = index_path.with_suffix(f".{threading.get_ident()}.tmp")
+        with self._index_lock:
+            with self._lock:
+                entries = [(k, dict(v)) for k, v in self._entries.items()]
+                self._dirty = False
+            index = {"version": INDEX_VERSION, "entries": entries}
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, index_path)
+            except OSError as e:
+                _logger.debug(f"Couldn't save mirror-index: {e}")
+
+    def flush(self):
+        """Saves the order of use, if it changed since the index was saved"""
+        if self._dirty:
+            self._save_index()
+
+    def get_recent(self, count: int = PREFETCH_COUNT) -> List[Path]:
+        """Gets the source-paths of the most recently used archives"""
+        with self._lock:
+            sources = list(self._entries)
+        return [Path(source) for source in reversed(sources[-count:])]
+
+    def prefetch(self, paths: Iterable) -> List[Future]:
+        """Mirrors archives at paths in background threads"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return [self._executor.submit(self.get_path, path) for path in paths]
+
+    def prefetch_recent(self, count: int = PREFETCH_COUNT) -> List[Future]:
+        """Refreshes copies of the most recently used archives"""
+        return self.prefetch(self.get_recent(count))
+
+    def clear(self):
+        with self._lock:
+            for source in list(self._entries):
+                self._remove(source)
+        self._save_index()
+
+    def get_stats(self) -> dict:
+        return {
+            "archives": len(self._entries),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def is_current(entry: dict, stat: os.stat_result) -> bool:
+    return entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+
+_LIBRARY_MIRROR: Optional[LibraryMirror] = None
+
+
+def get_library_mirror() -> Optional[LibraryMirror]:
+    """Gets the library-wide mirror, or None if mirroring is off"""
+    return _LIBRARY_MIRROR
+
+
+def set_library_mirror(mirror: Optional[LibraryMirror]):
+    global _LIBRARY_MIRROR
+    _LIBRARY_MIRROR = mirror
+
+
+def get_read_path(path, fetch: bool = True) -> Path:
+    """Gets the path to read archive at path from. See LibraryMirror.get_path"""
+    if _LIBRARY_MIRROR is None:
+        return Path(path)
+    return _LIBRARY_MIRROR.get_path(path, fetch=fetch)
@@ -0,0 +1,227 @@
+"""
+Migrates archives to the current layout.
+
+Each archive is rewritten next to itself with a header and poster-image
+first and json-members compactly encoded, verified by decoding both
+versions, and then atomically moved over the original. Archives that
+already have a current header are skipped, so an interrupted migration
+can be run again. Member-names are kept, so readers of the old layout
+keep working on migrated flat archives.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import tarfile
+import tempfile
+import time
+from typing import Iterable, List, Optional
+
+from serial_animator.archive_diff import read_archive
+from serial_animator.archive_header import (
+    HEADER_NAME,
+    HEADER_VERSION,
+    read_header,
+    write_archive,
+)
+from serial_animator.archive_info import find_archives
+import serial_animator.chunked_archive as chunked_archive
+from serial_animator.exceptions import SerialAnimatorError
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+MIGRATING_SUFFIX = ".migrating"
+MAX_WORKERS = os.cpu_count() or 4
+
+
+class SerialAnimatorMigrationError(SerialAnimatorError):
+    """Error when an archive can't be migrated"""
+
+
+def is_migrated(path: Path) -> bool:
+    header = read_header(path)
+    return bool(header) and header.get("version") == HEADER_VERSION
+
+
+def is_data_member(name: str) -> bool:
+    """Checks if a member holds data that is rewritten rather than copied"""
+    return (
+        name.endswith(".json")
+        or name.startswith("anim/")
+        or name in (HEADER_NAME, chunked_archive.MANIFEST_NAME)
+    )
+
+
+def extract_members(path: Path, out_dir: Path) -> List[Path]:
+    """
+    Extracts regular members of archive to out_dir in archive-order.
+    Json-members are re-encoded without whitespace. Raises
+    SerialAnimatorMigrationError if two members have the same file-name,
+    as the archive is rewritten flat
+    """
+    files = list()
+    with tarfile.open(str(path), mode="r:") as tf:
+        for member in tf:
+            name = Path(member.name).name
+            if not member.isfile() or member.name.startswith("anim/"):
+                continue
+            if member.name in (HEADER_NAME, chunked_archive.MANIFEST_NAME):
+                continue
+            out_path = out_dir / name
+            if out_path.exists():
+                raise SerialAnimatorMigrationError(
+                    f"More than one member in {path} is named {name}"
+                )
+            data = tf.extractfile(member).read()
+            if name.endswith(".json"):
+                data = json.dumps(json.loads(data), separators=(",", ":"))
+                data = data.encode("utf-8")
+            out_path.write_bytes(data)
+            files.append(out_path)
+    return files
+
+
+def get_poster(kind: str, files: List[Path]) -> Optional[Path]:
+    """Gets the image shown for an archive"""
+    images = [f for f in files if not f.name.endswith(".json")]
+    if kind == "anim":
+        images = [f for f in images if f.name == "preview.jpg"]
+    return images[0] if images else None
+
+
+def rewrite_archive(path: Path, out_path: Path, decoded: tuple):
+    """
+    Writes archive at path in the current layout to out_path. decoded
+    is the archive's kind, data and meta-data from read_archive
+    """
+    kind, data, meta_data = decoded
+    with tempfile.TemporaryDirectory(prefix="serial_animator_") as tmp_dir:
+        files = extract_members(path, Path(tmp_dir))
+        poster = get_poster(kind, files)
+        if kind == "pose" and "nodes" not in meta_data:
+            meta_data = dict(meta_data, nodes=list(data.keys()))
+        if chunked_archive.is_chunked_archive(path):
+            with open(path, "rb") as f:
+                block_size = chunked_archive.read_manifest(f)["block_size"]
+            files = [f for f in files if f.name != "meta_data.json"]
+            chunked_archive.write_chunked_archive(
+                out_path, data, meta_data, files, block_size, poster=poster
+            )
+        else:
+            write_archive(out_path, files, meta_data, kind, poster=poster)
+
+
+def get_file_hashes(path: Path) -> dict:
+    """Gets sha1 of each non-data member in archive"""
+    hashes = dict()
+    with tarfile.open(str(path), mode="r:") as tf:
+        for member in tf:
+            if member.isfile() and not is_data_member(member.name):
+                data = tf.extractfile(member).read()
+                hashes[member.name] = hashlib.sha1(data).hexdigest()
+    return hashes
+
+
+def verify_archive(path: Path, migrated_path: Path, decoded: tuple):
+    """
+    Checks that migrated_path decodes to the same data, meta-data and
+    files as path, which decoded to decoded. Meta-data may only have
+    been added to
+    """
+    kind, data, meta_data = decoded
+    new_kind, new_data, new_meta_data = read_archive(migrated_path)
+    if kind != new_kind or data != new_data:
+        raise SerialAnimatorMigrationError(f"Data in {path} changed in migration")
+    if any(new_meta_data.get(k) != v for k, v in meta_data.items()):
+        raise SerialAnimatorMigrationError(f"Meta-data in {path} changed in migration")
+    if get_file_hashes(path) != get_file_hashes(migrated_path):
+        raise SerialAnimatorMigrationError(f"Files in {path} changed in migration")
+
+
+def migrate_archive(path: Path, dry_run: bool = False) -> dict:
+    """
+    Migrates archive at path in place. Returns a result with status
+    "migrated", "skipped" or "failed", and sizes before and after
+    """
+    path = Path(path)
+    result = {"path": str(path), "status": "skipped", "before": 0, "after": 0}
+    tmp_path = path.with_name(path.name + MIGRATING_SUFFIX)
+    size = 0
+    try:
+        size = path.stat().st_size
+        result["before"] = result["after"] = size
+        if is_migrated(path):
+            return result
+        decoded = read_archive(path)
+        rewrite_archive(path, tmp_path, decoded)
+        verify_archive(path, tmp_path, decoded)
+        result["after"] = tmp_path.stat().st_size
+        if not dry_run:
+            shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+        result["status"] = "migrated"
+    except Exception as e:
+        # any archive that can't be migrated is reported, rather than
+        # stopping the migration of the rest of the library
+        result["status"] = "failed"
+        result["error"] = str(e)
+        result["after"] = size
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return result
+
+
+def migrate_library(
+    paths: Iterable[Path], max_workers: int = MAX_WORKERS, dry_run: bool = False
+) -> dict:
+    """
+    Migrates all archives in paths across a process-pool. Returns a
+    report with the results per archive, counts per status, bytes saved
+    and throughput
+    """
+    start_time = time.perf_counter()
+    archives = find_archives(paths)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(
+            executor.map(migrate_archive, archives, [dry_run] * len(archives))
+        )
+    seconds = time.perf_counter() - start_time
+    migrated = [r for r in results if r["status"] == "migrated"]
+    before = sum(r["before"] for r in migrated)
+    after = sum(r["after"] for r in migrated)
+    report = {
+        "results": results,
+        "migrated": len(migrated),
+        "skipped": len([r for r in results if r["status"] == "skipped"]),
+        "failed": len([r for r in results if r["status"] == "failed"]),
+        "bytes_before": before,
+        "bytes_after": after,
+        "bytes_saved": before - after,
+        "seconds": seconds,
+        "files_per_second": len(results) / seconds if seconds else 0.0,
+        "megabytes_per_second": before / seconds / 1024**2 if seconds else 0.0,
+    }
+    _logger.debug(format_report(report))
+    return report
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"{r['status']}: {r['path']}: {r['error']}"
+        for r in report["results"]
+        if r["status"] == "failed"
+    ]
+    lines.append(
+        f"{report['migrated']} migrated, {report['skipped']} skipped, "
+        f"{report['failed']} failed. Saved {report['bytes_saved']} of "
+        f"{report['bytes_before']} bytes in {report['seconds']:.1f} s "
+        f"({report['files_per_second']:.1f} files/s, "
+        f"{report['megabytes_per_second']:.1f} MB/s)"
+    )
+    return "\n".join(lines)
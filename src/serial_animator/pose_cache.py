@@ -0,0 +1,200 @@
+"""
+Library-wide cache of decoded pose-data.
+
+Poses are keyed by (path, mtime, size) so a changed file is decoded
+again, while an unchanged file is served from memory, or from a compact
+binary copy on disk, without opening the archive.
+"""
+
+from array import array
+from collections import OrderedDict
+import copy
+import hashlib
+import numbers
+import os
+from pathlib import Path
+import pickle
+from typing import Callable, Optional, Tuple
+
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+CACHE_VERSION = 2
+CACHE_SUFFIX = ".posecache"
+
+CacheKey = Tuple[str, int, int]
+
+
+def get_cache_key(path) -> CacheKey:
+    """Gets key identifying the current state of file at path"""
+    stat = os.stat(path)
+    return str(Path(path).resolve()), stat.st_mtime_ns, stat.st_size
+
+
+def pack_pose(data: dict) -> dict:
+    """
+    Packs a pose-dict into attribute-name tuples and value-arrays.
+    Nodes with non-numeric values are kept as plain dicts
+    """
+    packed = dict()
+    for node_name, node_data in data.items():
+        values = list(node_data.values())
+        if all(isinstance(v, numbers.Real) for v in values):
+            types = "".join("b" if isinstance(v, bool) else "d" for v in values)
+            packed[node_name] = (tuple(node_data.keys()), array("d", values), types)
+        else:
+            packed[node_name] = dict(node_data)
+    return packed
+
+
+def unpack_pose(packed: dict) -> dict:
+    """Creates a new pose-dict from packed data"""
+    data = dict()
+    for node_name, node_data in packed.items():
+        if isinstance(node_data, dict):
+            data[node_name] = dict(node_data)
+            continue
+        names, values, types = node_data
+        data[node_name] = {
+            name: bool(value) if t == "b" else value
+            for name, value, t in zip(names, values, types)
+        }
+    return data
+
+
+def get_packed_size(packed: dict) -> int:
+    """Estimates memory used by packed pose-data in bytes"""
+    size = 0
+    for node_name, node_data in packed.items():
+        size += len(node_name)
+        if isinstance(node_data, dict):
+            size += sum(len(k) + 32 for k in node_data)
+            continue
+        names, values, types = node_data
+        size += sum(len(n) for n in names)
+        size += values.itemsize * len(values) + len(types)
+    return size
+
+
+class PoseCache(object):
+    """
+    LRU-cache of decoded poses bounded by max_bytes. If persist_dir is
+    set, decoded poses are also written there and read back when they
+    are no longer in memory
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, persist_dir=None):
+        self.max_bytes = max_bytes
+        self.persist_dir = Path(persist_dir) if persist_dir else None
+        self._entries = OrderedDict()
+        self._sizes = dict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self, path, loader: Callable[[Path], Tuple[dict, dict]]
+    ) -> Tuple[dict, dict]:
+        """
+        Gets pose-data and meta-data for path. If not cached, the data
+        is decoded with loader(path), which returns pose- and meta-data.
+        New dicts are returned on each call, so callers can modify them
+        freely
+        """
+        key = get_cache_key(path)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            _logger.debug(f"Memory cache hit: {path}")
+            return self._unpack_entry(entry)
+        entry = self._read_persisted(key)
+        if entry is None:
+            self.misses += 1
+            pose, meta = loader(path)
+            entry = (pack_pose(pose), dict(meta or {}))
+            self._write_persisted(key, entry)
+        else:
+            self.hits += 1
+        self._store(key, entry)
+        return self._unpack_entry(entry)
+
+    @staticmethod
+    def _unpack_entry(entry: tuple) -> Tuple[dict, dict]:
+        packed, meta = entry
+        return unpack_pose(packed), copy.deepcopy(meta)
+
+    def clear(self):
+        """Clears in-memory entries. Persisted entries are kept"""
+        self._entries.clear()
+        self._sizes.clear()
+        self.current_bytes = 0
+
+    def _store(self, key: CacheKey, entry: tuple):
+        # drop entries for older versions of the same file
+        for old_key in [k for k in self._entries if k[0] == key[0]]:
+            self._remove(old_key)
+        size = get_packed_size(entry[0])
+        if size > self.max_bytes:
+            _logger.debug(f"{key[0]} is larger than the cache, not storing it")
+            return
+        self._entries[key] = entry
+        self._sizes[key] = size
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: CacheKey):
+        self._entries.pop(key)
+        self.current_bytes -= self._sizes.pop(key)
+
+    def _get_persist_path(self, key: CacheKey) -> Optional[Path]:
+        if not self.persist_dir:
+            return None
+        name = hashlib.sha1(key[0].encode("utf-8")).hexdigest()
+        return self.persist_dir / f"{name}{CACHE_SUFFIX}"
+
+    def _read_persisted(self, key: CacheKey) -> Optional[tuple]:
+        persist_path = self._get_persist_path(key)
+        if not persist_path or not persist_path.is_file():
+            return None
+        try:
+            with open(persist_path, "rb") as f:
+                version, stored_key, entry = pickle.load(f)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError) as e:
+            _logger.debug(f"Couldn't read persisted pose {persist_path}: {e}")
+            return None
+        if version != CACHE_VERSION or tuple(stored_key) != key:
+            return None
+        _logger.debug(f"Persisted cache hit: {key[0]}")
+        return entry
+
+    def _write_persisted(self, key: CacheKey, entry: tuple):
+        persist_path = self._get_persist_path(key)
+        if not persist_path:
+            return
+        tmp_path = persist_path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            persist_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(
+                    (CACHE_VERSION, key, entry), f, protocol=pickle.HIGHEST_PROTOCOL
+                )
+            os.replace(tmp_path, persist_path)
+        except OSError as e:
+            _logger.debug(f"Couldn't persist pose {key[0]}: {e}")
+
+
+_POSE_CACHE = PoseCache()
+
+
+def get_pose_cache() -> PoseCache:
+    """Gets the library-wide pose-cache"""
+    return _POSE_CACHE
+
+
+def set_persist_dir(persist_dir):
+    """Sets directory the library-wide pose-cache persists poses to"""
+    _POSE_CACHE.persist_dir = Path(persist_dir) if persist_dir else None
@@ -1,13 +1,18 @@
 from pathlib import Path
-import tempfile
-import pymel.core as pm
+from typing import Optional, Tuple
+from maya import cmds
+import maya.api.OpenMaya as om
+
 from serial_animator.exceptions import SerialAnimatorError
+import serial_animator.archive_header as archive_header
 from serial_animator.file_io import (
-    archive_files,
-    read_data_from_archive,
-    write_json_data,
+    iter_json_data,
+    read_json_members_from_archive,
 )
 import serial_animator.find_nodes as find_nodes
+import serial_animator.quantization as quantization
+from serial_animator.pose_cache import get_pose_cache
+from serial_animator.save_queue import Progress, ignore_progress
 
 from serial_animator import log
 
@@ -15,6 +20,19 @@ _logger = log.log(__name__)
 
 # _logger.setLevel("DEBUG")
 
+SPARSE_ENCODING = "sparse"
+SPARSE_TOLERANCE = 1e-5
+SKIP_EPSILON = 1e-6
+# numeric attribute-types holding a single number
+NUMERIC_TYPES = (
+    om.MFnNumericData.kByte,
+    om.MFnNumericData.kChar,
+    om.MFnNumericData.kShort,
+    om.MFnNumericData.kInt,
+    om.MFnNumericData.kFloat,
+    om.MFnNumericData.kDouble,
+)
+
 
 class SerialAnimatorPoseLibraryError(SerialAnimatorError):
     """Overall error for tool"""
@@ -28,67 +46,317 @@ def get_nodes() -> list:
     """
     Gets selected nodes. If no nodes are selected, get all scene nodes
     """
-    return pm.selected() or pm.ls()
+    return cmds.ls(selection=True, long=True) or cmds.ls(long=True)
 
 
-def get_data_from_nodes(nodes=None) -> dict:
+def get_data_from_nodes(
+    nodes=None,
+    sparse: bool = False,
+    tolerance: float = SPARSE_TOLERANCE,
+    reference: Optional[dict] = None,
+    policy: Optional[dict] = None,
+) -> dict:
     """
     Gets keyable data from nodes and returns them as a node-dict with
-    a dict of attribute-names and values
+    a dict of attribute-names and values.
+    If sparse is True, values within tolerance of the attribute's
+    default, or of the node's value in reference (a node-dict), are
+    left out. If policy is given, values are quantized by it
     """
     nodes = nodes or get_nodes()
+    reference = reference or dict()
     data = dict()
     for node in nodes:
-        data[node] = get_keyable_data(node)
+        data[node] = get_keyable_data(
+            node,
+            sparse=sparse,
+            tolerance=tolerance,
+            reference=reference.get(node),
+            policy=policy,
+        )
     return data
 
 
-def get_path_data_from_nodes(nodes=None) -> dict:
+def get_path_data_from_nodes(nodes=None, **kwargs) -> dict:
     """
     Gets keyable data from nodes and returns them as a node-path-dict
     with a dict of attribute-names and values
     """
-    data = get_data_from_nodes(nodes)
+    data = get_data_from_nodes(nodes, **kwargs)
     return find_nodes.node_dict_to_path_dict(data)
 
 
-def save_pose_from_selection(path: Path, img_path: Path) -> Path:
+def save_pose_from_selection(
+    path: Path,
+    img_path: Path,
+    sparse: bool = False,
+    tolerance: float = SPARSE_TOLERANCE,
+    reference_path: Optional[Path] = None,
+    quantize: bool = False,
+    precision: Optional[dict] = None,
+) -> Path:
     """
     Saves data for selected nodes to path and archives preview-image
-    with it
+    with it.
+    If sparse is True, only values differing from the attribute's
+    default, or from the pose at reference_path, are saved.
+    If quantize is True, values are rounded to precision per
+    attribute-class (see quantization.DEFAULT_PRECISION).
+    The saved node-paths are listed in the meta-data, so tools can
+    summarize the pose without decoding it
     """
-    data = get_path_data_from_nodes()
-    return save_data(path, data, img_path)
+    data, meta_data = capture_pose_from_selection(
+        sparse, tolerance, reference_path, quantize, precision
+    )
+    return save_data(path, data, img_path, meta_data=meta_data)
 
 
-def save_data(path, data: dict, img_path) -> Path:
-    with tempfile.TemporaryDirectory(prefix="serial_animator_") as tmp_dir:
-        pose_path = Path(tmp_dir) / "pose.json"
-        write_json_data(data, pose_path)
-        archive = archive_files(files=[pose_path, img_path], out_path=path)
-    return archive
+def capture_pose_from_selection(
+    sparse: bool = False,
+    tolerance: float = SPARSE_TOLERANCE,
+    reference_path: Optional[Path] = None,
+    quantize: bool = False,
+    precision: Optional[dict] = None,
+) -> Tuple[dict, dict]:
+    """
+    Gets the pose of selected nodes as a node-path-dict, and its
+    meta-data, like save_pose_from_selection. Writing them with
+    save_data doesn't touch the scene, so it can run in a
+    background-thread
+    """
+    meta_data = None
+    policy = quantization.get_policy(precision) if quantize else None
+    if sparse:
+        nodes = get_nodes()
+        reference = None
+        if reference_path:
+            reference = read_pose_data_to_nodes(reference_path, nodes)
+        data = get_path_data_from_nodes(
+            nodes,
+            sparse=True,
+            tolerance=tolerance,
+            reference=reference,
+            policy=policy,
+        )
+        meta_data = get_sparse_meta_data(tolerance, reference_path)
+    else:
+        data = get_path_data_from_nodes(policy=policy)
+    meta_data = dict(meta_data or dict(), nodes=list(data.keys()))
+    if policy:
+        meta_data["quantization"] = policy
+    return data, meta_data
+
+
+def save_data(
+    path,
+    data: dict,
+    img_path,
+    meta_data: Optional[dict] = None,
+    preview_levels: Optional[Tuple[int, ...]] = None,
+    progress: Optional[Progress] = None,
+) -> Path:
+    """
+    Saves pose-data to an archive starting with a header holding
+    meta_data and the preview-image, scaled to the browser's tiles.
+    The preview-image is also stored scaled down to preview_levels,
+    defaulting to preview_pyramid.PREVIEW_LEVELS.
+    Data is encoded in memory and streamed into the archive. Steps are
+    reported to progress
+    """
+    # scaling the preview needs Qt, so it is only imported when saving
+    import serial_animator.preview_pyramid as preview_pyramid
+
+    preview_levels = preview_levels or preview_pyramid.PREVIEW_LEVELS
+    progress = progress or ignore_progress
+    img_path = Path(img_path)
+    meta_data = dict(meta_data or dict(), preview_levels=list(preview_levels))
+    files = [
+        ("pose.json", iter_json_data(data)),
+        img_path,
+        ("meta_data.json", iter_json_data(meta_data)),
+    ]
+    poster = img_path
+    if img_path.is_file():
+        progress(0.1, "Scaling preview")
+        levels = preview_pyramid.build_levels(img_path, levels=preview_levels)
+        files.extend(levels)
+        poster_name = preview_pyramid.get_poster_name(img_path.name, preview_levels)
+        poster = next((m for m in levels if m[0] == poster_name), img_path)
+    progress(0.5, "Writing archive")
+    return archive_header.write_archive(
+        Path(path), files, meta_data, kind="pose", poster=poster
+    )
 
 
-def get_keyable_data(node) -> dict:
+def get_sparse_meta_data(
+    tolerance: float = SPARSE_TOLERANCE, reference_path: Optional[Path] = None
+) -> dict:
+    """Gets meta-data describing how a sparse pose was saved"""
+    return {
+        "encoding": SPARSE_ENCODING,
+        "tolerance": tolerance,
+        "reference": str(reference_path) if reference_path else None,
+    }
+
+
+def get_keyable_data(
+    node,
+    sparse: bool = False,
+    tolerance: float = SPARSE_TOLERANCE,
+    reference: Optional[dict] = None,
+    policy: Optional[dict] = None,
+) -> dict:
+    """
+    Gets values of keyable attributes on node. If sparse is True,
+    values within tolerance of the value in reference or the
+    attribute's default are left out. If policy is given, values are
+    quantized by it
+    """
+    reference = reference or dict()
     data = dict()
-    for a in [a for a in node.listAttr() if a.isKeyable()]:
-        data[a.attrName()] = a.get()
+    node_name = find_nodes.get_node_path(node)
+    for name in get_keyable_attributes(node_name):
+        plug = f"{node_name}.{name}"
+        value = get_value(plug)
+        if sparse:
+            rest_value = reference.get(name)
+            if rest_value is None:
+                rest_value = get_default_value(node, name)
+            if is_close(value, rest_value, tolerance):
+                continue
+        if policy:
+            attribute_type = cmds.getAttr(plug, type=True)
+            value = quantization.quantize_value(value, attribute_type, policy)
+        data[name] = value
     return data
 
 
-def interpolate(target: dict, origin: dict, weight: float):
+def get_keyable_attributes(node_name: str) -> list:
+    """Gets short names of keyable attributes on node"""
+    return cmds.listAttr(node_name, keyable=True, shortNames=True) or list()
+
+
+def get_value(plug: str):
+    """Gets value of plug. Compound values are returned as a list"""
+    value = cmds.getAttr(plug)
+    if isinstance(value, list) and len(value) == 1 and isinstance(value[0], tuple):
+        return list(value[0])
+    return value
+
+
+def set_value(plug: str, value):
+    if isinstance(value, (list, tuple)):
+        cmds.setAttr(plug, *value)
+    else:
+        cmds.setAttr(plug, value)
+
+
+def get_node_plugs(node_name: str, attribute_names) -> dict:
+    """
+    Gets plugs by name for the attributes in attribute_names that exist
+    on node, looking the node up once
+    """
+    selection = om.MSelectionList()
+    selection.add(node_name)
+    fn_node = om.MFnDependencyNode(selection.getDependNode(0))
+    plugs = dict()
+    for name in attribute_names:
+        if fn_node.hasAttribute(name):
+            plugs[name] = fn_node.findPlug(name, False)
+    return plugs
+
+
+def get_plug_value(plug: om.MPlug):
+    """
+    Gets value of a plug holding a single number in ui-units, like
+    cmds.getAttr, or None for other attributes
+    """
+    attribute = plug.attribute()
+    if attribute.hasFn(om.MFn.kUnitAttribute):
+        unit_type = om.MFnUnitAttribute(attribute).unitType()
+        if unit_type == om.MFnUnitAttribute.kDistance:
+            return plug.asMDistance().asUnits(om.MDistance.uiUnit())
+        if unit_type == om.MFnUnitAttribute.kAngle:
+            return plug.asMAngle().asUnits(om.MAngle.uiUnit())
+        if unit_type == om.MFnUnitAttribute.kTime:
+            return plug.asMTime().asUnits(om.MTime.uiUnit())
+        return None
+    if attribute.hasFn(om.MFn.kEnumAttribute):
+        return plug.asInt()
+    if attribute.hasFn(om.MFn.kNumericAttribute):
+        numeric_type = om.MFnNumericAttribute(attribute).numericType()
+        if numeric_type == om.MFnNumericData.kBoolean:
+            return plug.asBool()
+        if numeric_type in NUMERIC_TYPES:
+            return plug.asDouble()
+    return None
+
+
+def get_default_value(node, attribute_name: str):
+    """Gets default value of attribute on node or None if it has none"""
+    default = cmds.attributeQuery(
+        attribute_name, node=find_nodes.get_node_path(node), listDefault=True
+    )
+    if default:
+        return default[0]
+
+
+def is_close(value, other, tolerance: float) -> bool:
+    """Checks if two numeric values are within tolerance of each other"""
+    try:
+        return abs(value - other) <= tolerance
+    except TypeError:
+        return False
+
+
+def fill_sparse_data(node, node_data: dict, reference: Optional[dict] = None):
+    """
+    Adds values left out of sparse node_data from reference or the
+    attribute's default
+    """
+    reference = reference or dict()
+    for name in get_keyable_attributes(find_nodes.get_node_path(node)):
+        if name in node_data:
+            continue
+        value = reference.get(name)
+        if value is None:
+            value = get_default_value(node, name)
+        if value is not None:
+            node_data[name] = value
+
+
+def interpolate(
+    target: dict,
+    origin: dict,
+    weight: float,
+    skip_unchanged: bool = False,
+    epsilon: float = SKIP_EPSILON,
+) -> dict:
+    """
+    Sets attributes on nodes in target to the weighted value between
+    origin and target. If skip_unchanged is True, attributes already
+    within epsilon of the new value are not set, which keeps them out
+    of the undo-queue and avoids dirtying the graph.
+    Returns a dict with the number of "written" and "skipped" values
+    """
+    stats = {"written": 0, "skipped": 0}
     for node, node_data in target.items():
+        node_name = find_nodes.get_node_path(node)
+        # plugs and their values are read per node through the api,
+        # rather than with commands per attribute
+        plugs = get_node_plugs(node_name, node_data)
         for attribute_name, value in node_data.items():
-            if not node.hasAttr(attribute_name):
+            plug = plugs.get(attribute_name)
+            if plug is None:
                 _logger.debug(
                     f"{node} doesn't have the attribute {attribute_name}. Skipping!"
                 )
                 continue
-            target_attribute = node.attr(attribute_name)
-            if target_attribute.isLocked():
+            target_attribute = f"{node_name}.{attribute_name}"
+            if plug.isLocked:
                 _logger.debug(f"{target_attribute} is locked")
                 continue
-            if target_attribute.isFromReferencedFile():
+            if plug.isFromReferencedFile:
                 _logger.debug(
                     f"{target_attribute} has incoming connections from reference"
                 )
@@ -96,20 +364,44 @@ def interpolate(target: dict, origin: dict, weight: float):
             try:
                 o_value = origin[node][attribute_name]
                 delta = (value - o_value) * weight
-                target_attribute = node.attr(attribute_name)
-
-                target_attribute.set(o_value + delta)
+                new_value = o_value + delta
             except KeyError:
                 # attribute not in target dict, so apply 100% of target value
-                node.attr(attribute_name).set(value)
+                new_value = value
+            if skip_unchanged:
+                current_value = get_plug_value(plug)
+                if current_value is None:
+                    current_value = get_value(target_attribute)
+                if is_close(current_value, new_value, epsilon):
+                    stats["skipped"] += 1
+                    continue
+            set_value(target_attribute, new_value)
+            stats["written"] += 1
+    _logger.debug(f"Wrote {stats['written']} values, skipped {stats['skipped']}")
+    return stats
 
 
 def read_pose_data(path) -> dict:
-    data = read_data_from_archive(path, json_name="pose.json")
+    """
+    Reads pose-data from archive. Decoded poses are kept in the
+    library-wide pose-cache, so unchanged files are only read once
+    """
+    data, _ = get_pose_cache().get(path, read_pose_data_from_archive)
     _logger.debug(data)
     return data
 
 
+def read_pose_meta_data(path) -> dict:
+    """Reads meta-data for pose. Poses saved without any returns an empty dict"""
+    _, meta_data = get_pose_cache().get(path, read_pose_data_from_archive)
+    return meta_data
+
+
+def read_pose_data_from_archive(path) -> Tuple[dict, dict]:
+    data = read_json_members_from_archive(path, ["pose.json", "meta_data.json"])
+    return data["pose.json"], data.get("meta_data.json", dict())
+
+
 def read_pose_data_to_nodes(path, nodes=None) -> dict:
     data = read_pose_data(path)
     node_dict = find_nodes.search_nodes(list(data.keys()), nodes)
@@ -118,12 +410,23 @@ def read_pose_data_to_nodes(path, nodes=None) -> dict:
         node = node_dict.get(node_name)
         if node:
             pose[node] = data[node_name]
+    meta_data = read_pose_meta_data(path)
+    if meta_data.get("encoding") == SPARSE_ENCODING:
+        reference = dict()
+        reference_path = meta_data.get("reference")
+        if reference_path:
+            if Path(reference_path).is_file():
+                reference = read_pose_data_to_nodes(reference_path, nodes)
+            else:
+                _logger.warning(f"Reference pose {reference_path} doesn't exist")
+        for node, node_data in pose.items():
+            fill_sparse_data(node, node_data, reference.get(node))
     return pose
 
 
 def start_undo():
     _logger.debug("Start undo")
-    pm.undoInfo(
+    cmds.undoInfo(
         openChunk=True,
         chunkName="SerialAnimator Apply Pose",
         undoName="SerialAnimator Apply Pose",
@@ -133,11 +436,11 @@ def start_undo():
 
 def end_undo():
     _logger.debug("End undo")
-    pm.undoInfo(closeChunk=True)
+    cmds.undoInfo(closeChunk=True)
 
 
 def refresh_viewport():
-    pm.refresh()
+    cmds.refresh()
 
 
 def get_pose_filetype() -> str:
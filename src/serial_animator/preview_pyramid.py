@@ -0,0 +1,301 @@
+"""
+Downscaled levels of preview-images stored alongside the full images.
+
+Each preview-image is saved at full size and in smaller levels, named
+after the level's size: preview.0001.jpg gets preview_96.0001.jpg and
+preview_250.0001.jpg. Browsers pick the smallest level at least as big
+as their tiles, so showing a tile or playing it on hover decodes small
+jpgs rather than full viewport-captures. Levels are scaled in worker
+threads when an archive is saved, and encoded in memory, so they are
+written straight into the archive.
+
+Image-sequences are packed into atlases per level: grids of frames in
+one jpg, named like preview_250.atlas.0000.jpg. A player reads and
+decodes one atlas per columns * rows frames and cuts frames out of it.
+Where and how frames are laid out is described by an atlas-dict in the
+archive's meta-data.
+"""
+
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from PySide2 import QtCore, QtGui
+
+from serial_animator.exceptions import SerialAnimatorError
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+PREVIEW_LEVELS = (96, 250)
+# size of tiles in the library-browser, which the poster is scaled to
+TILE_SIZE = 250
+JPEG_QUALITY = 85
+MAX_WORKERS = 4
+ATLAS_COLUMNS = 4
+ATLAS_ROWS = 4
+
+
+class SerialAnimatorPreviewError(SerialAnimatorError):
+    """Error when a preview-image can't be scaled"""
+
+
+def get_level_name(name: str, level: Optional[int]) -> str:
+    """
+    Gets the name of name's image at level, or name itself for the
+    full-size level (None)
+    """
+    if level is None:
+        return name
+    stem, _, rest = name.partition(".")
+    return f"{stem}_{level}.{rest}"
+
+
+def get_level(levels: Iterable[int], size: int) -> Optional[int]:
+    """
+    Gets the smallest level at least size pixels big, or None if only
+    the full-size image is big enough
+    """
+    levels = sorted(level for level in levels if level >= size)
+    return levels[0] if levels else None
+
+
+def get_poster_name(name: str, levels: Iterable[int]) -> str:
+    """Gets the name of the level of image name shown on a tile"""
+    return get_level_name(name, get_level(levels, TILE_SIZE))
+
+
+def get_frame_number(path: Path) -> int:
+    """Gets the frame-number of an image in a sequence, like preview.0012.jpg"""
+    return int(Path(path).name.split(".")[1])
+
+
+def read_image(path: Path) -> QtGui.QImage:
+    image = QtGui.QImage(str(path))
+    if image.isNull():
+        raise SerialAnimatorPreviewError(f"Couldn't read image: {path}")
+    return image
+
+
+def fit_image(image: QtGui.QImage, level: int) -> QtGui.QImage:
+    """Scales image to fit within level pixels. Images are never enlarged"""
+    if image.width() <= level and image.height() <= level:
+        return image
+    return image.scaled(
+        level, level, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation
+    )
+
+
+def encode_image(image: QtGui.QImage) -> bytes:
+    """Encodes image as jpg-data in memory"""
+    data = QtCore.QByteArray()
+    buffer = QtCore.QBuffer(data)
+    buffer.open(QtCore.QIODevice.WriteOnly)
+    try:
+        if not image.save(buffer, "JPG", JPEG_QUALITY):
+            raise SerialAnimatorPreviewError("Couldn't encode image")
+    finally:
+        buffer.close()
+    return bytes(data)
+
+
+def scale_image_data(path: Path, level: int) -> bytes:
+    """
+    Gets jpg-data of image at path scaled to fit within level pixels.
+    The data of images that already fit is returned as is
+    """
+    image = read_image(path)
+    if image.width() <= level and image.height() <= level:
+        return Path(path).read_bytes()
+    return encode_image(fit_image(image, level))
+
+
+def scale_image(path: Path, out_path: Path, level: int) -> Path:
+    """Scales image at path to fit within level pixels and saves it to out_path"""
+    out_path.write_bytes(scale_image_data(path, level))
+    return out_path
+
+
+def build_levels(
+    path: Path,
+    levels: Sequence[int] = PREVIEW_LEVELS,
+    name: Optional[str] = None,
+    max_workers: int = MAX_WORKERS,
+) -> List[Tuple[str, bytes]]:
+    """
+    Scales image at path to each level in a thread-pool. Returns the
+    level-names, after name or the image's name, and jpg-data
+    """
+    name = name or Path(path).name
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        data = list(executor.map(lambda level: scale_image_data(path, level), levels))
+    return [(get_level_name(name, level), d) for level, d in zip(levels, data)]
+
+
+def build_pyramid(
+    image_paths: Sequence[Path],
+    out_dir: Path,
+    levels: Sequence[int] = PREVIEW_LEVELS,
+    max_workers: int = MAX_WORKERS,
+) -> List[Path]:
+    """
+    Scales each image to each level in a thread-pool and saves them in
+    out_dir. Returns the paths of the scaled images
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    jobs = [
+        (Path(path), out_dir / get_level_name(Path(path).name, level), level)
+        for level in levels
+        for path in image_paths
+    ]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        out_paths = list(executor.map(lambda job: scale_image(*job), jobs))
+    _logger.debug(f"Scaled {len(image_paths)} images to levels {list(levels)}")
+    return out_paths
+
+
+def paint_atlas(
+    image_paths: Sequence[Path],
+    level: int,
+    frame_size: Tuple[int, int],
+    columns: int,
+) -> bytes:
+    """
+    Paints images scaled to level into a grid with columns, left to
+    right and top to bottom. Returns its jpg-data
+    """
+    width, height = frame_size
+    rows = -(-len(image_paths) // columns)
+    atlas = QtGui.QImage(columns * width, rows * height, QtGui.QImage.Format_RGB32)
+    atlas.fill(QtCore.Qt.black)
+    painter = QtGui.QPainter(atlas)
+    try:
+        for i, path in enumerate(image_paths):
+            row, column = divmod(i, columns)
+            image = fit_image(read_image(path), level)
+            painter.drawImage(column * width, row * height, image)
+    finally:
+        painter.end()
+    return encode_image(atlas)
+
+
+def pack_atlas_data(
+    image_paths: Sequence[Path],
+    level: int,
+    columns: int = ATLAS_COLUMNS,
+    rows: int = ATLAS_ROWS,
+    max_workers: int = MAX_WORKERS,
+) -> Tuple[Optional[dict], List[Tuple[str, bytes]]]:
+    """
+    Packs an image-sequence scaled to level into atlases of columns *
+    rows frames, painted in a thread-pool. Sequences sampled from a
+    frame-range list their frame-numbers in the atlas-dict. Returns the
+    atlas-dict for the archive's meta-data, and the names and jpg-data
+    of the atlases
+    """
+    if not image_paths:
+        return None, list()
+    image_paths = sorted(image_paths, key=get_frame_number)
+    frame = fit_image(read_image(image_paths[0]), level)
+    frame_size = (frame.width(), frame.height())
+    frames_per_atlas = columns * rows
+    groups = [
+        image_paths[i : i + frames_per_atlas]
+        for i in range(0, len(image_paths), frames_per_atlas)
+    ]
+    names = [
+        get_level_name(f"preview.atlas.{i:04d}.jpg", level) for i in range(len(groups))
+    ]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        data = list(
+            executor.map(
+                lambda group: paint_atlas(group, level, frame_size, columns), groups
+            )
+        )
+    atlas = {
+        "level": level,
+        "frame_size": list(frame_size),
+        "columns": columns,
+        "rows": rows,
+        "first_frame": get_frame_number(image_paths[0]),
+        "frame_count": len(image_paths),
+        "atlases": names,
+    }
+    frames = [get_frame_number(path) for path in image_paths]
+    if frames[-1] - frames[0] + 1 != len(frames):
+        atlas["frames"] = frames
+    _logger.debug(f"Packed {len(image_paths)} frames in {len(names)} atlases")
+    return atlas, list(zip(names, data))
+
+
+def pack_atlases(
+    image_paths: Sequence[Path],
+    out_dir: Path,
+    level: int,
+    columns: int = ATLAS_COLUMNS,
+    rows: int = ATLAS_ROWS,
+    max_workers: int = MAX_WORKERS,
+) -> Tuple[Optional[dict], List[Path]]:
+    """
+    Packs an image-sequence into atlases like pack_atlas_data and saves
+    them in out_dir. Returns the atlas-dict and the paths of the atlases
+    """
+    atlas, members = pack_atlas_data(image_paths, level, columns, rows, max_workers)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_paths = list()
+    for name, data in members:
+        (out_dir / name).write_bytes(data)
+        out_paths.append(out_dir / name)
+    return atlas, out_paths
+
+
+def pack_sequence(
+    image_paths: Sequence[Path], levels: Sequence[int] = PREVIEW_LEVELS
+) -> Tuple[List[dict], List[Tuple[str, bytes]]]:
+    """
+    Packs an image-sequence into atlases for each level. Returns the
+    atlas-dicts, and the names and jpg-data of all atlases
+    """
+    atlases = list()
+    members = list()
+    for level in levels:
+        atlas, level_members = pack_atlas_data(image_paths, level)
+        if atlas:
+            atlases.append(atlas)
+            members.extend(level_members)
+    return atlases, members
+
+
+def get_atlas(atlases: Sequence[dict], size: int) -> Optional[dict]:
+    """
+    Gets the atlas with the smallest level at least size pixels big, or
+    the biggest atlas if none is big enough
+    """
+    if not atlases:
+        return None
+    atlases = sorted(atlases, key=lambda atlas: atlas["level"])
+    return next((a for a in atlases if a["level"] >= size), atlases[-1])
+
+
+def get_atlas_frame(
+    atlas: dict, frame: int
+) -> Optional[Tuple[str, Tuple[int, int, int, int]]]:
+    """
+    Gets the name of the atlas holding frame and the frame's rectangle
+    (x, y, width, height) in it, or None if frame isn't in the atlases.
+    Sampled sequences give the last frame at or before frame
+    """
+    if atlas.get("frames"):
+        index = bisect_right(atlas["frames"], int(frame)) - 1
+        if index < 0:
+            return None
+    else:
+        index = int(frame) - atlas["first_frame"]
+        if not 0 <= index < atlas["frame_count"]:
+            return None
+    atlas_index, cell = divmod(index, atlas["columns"] * atlas["rows"])
+    row, column = divmod(cell, atlas["columns"])
+    width, height = atlas["frame_size"]
+    return atlas["atlases"][atlas_index], (column * width, row * height, width, height)
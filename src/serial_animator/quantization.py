@@ -0,0 +1,170 @@
+"""
+Optional quantization of values before they are written to archives.
+
+Values are rounded to a precision per attribute-class, tangent angles
+to the "angle" precision and tangent weights to float32 precision.
+Rounding to a power of ten keeps the json short, and near-zeros and
+denormals are flushed to zero.
+"""
+
+import json
+import math
+import numbers
+from typing import Dict, Optional
+
+import numpy as np
+
+from serial_animator.key_arrays import KeyArrays, get_attribute_class
+from serial_animator.sampled_channels import (
+    SAMPLES_KEY,
+    decode_values,
+    is_sampled,
+    make_samples,
+)
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+DEFAULT_PRECISION = {"translate": 1e-4, "rotate": 1e-3, "scalar": 1e-4, "angle": 1e-3}
+# significant digits of a float32
+WEIGHT_DIGITS = 7
+
+
+def get_policy(precision: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """Gets the default precision updated with precision"""
+    return dict(DEFAULT_PRECISION, **(precision or dict()))
+
+
+def get_decimals(precision: float) -> int:
+    """
+    Gets decimals to round to for precision. Precisions between powers
+    of ten get the finer power, so errors stay within precision
+    """
+    # the small epsilon keeps exact powers of ten from rounding up
+    return max(0, math.ceil(-math.log10(precision) - 1e-9))
+
+
+def quantize(values, precision: float) -> np.ndarray:
+    """Rounds values to precision, flushing near-zeros to zero"""
+    values = np.round(np.asarray(values, dtype=np.float64), get_decimals(precision))
+    # adding zero turns -0.0 into 0.0
+    return values + 0.0
+
+
+def quantize_weights(values) -> np.ndarray:
+    """Rounds tangent-weights to the precision of a float32"""
+    values = np.asarray(values, dtype=np.float64)
+    magnitudes = np.abs(values)
+    # zeros have no magnitude to round to, and are kept as they are
+    nonzero = magnitudes > 0
+    exponents = np.zeros(values.shape)
+    exponents[nonzero] = WEIGHT_DIGITS - 1 - np.floor(np.log10(magnitudes[nonzero]))
+    exponents = np.clip(exponents, -300, 300)
+    # scaling by exact powers of ten, dividing for the negative ones
+    scales = 10.0 ** np.abs(exponents)
+    return np.where(
+        exponents >= 0,
+        np.round(values * scales) / scales,
+        np.round(values / scales) * scales,
+    )
+
+
+def quantize_value(value, attribute_type: str, policy: Dict[str, float]):
+    """
+    Quantizes a single pose-value by the precision of its attribute-type.
+    Non-float values are kept as is
+    """
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        return value
+    if isinstance(value, numbers.Integral):
+        return value
+    precision = policy[get_attribute_class(attribute_type)]
+    return float(quantize(value, precision))
+
+
+def quantize_key_data(key_data: dict, precision: float, angle_precision: float):
+    """Quantizes values, tangent angles and weights of key-data"""
+    keys = KeyArrays.from_key_data(key_data)
+    keys.values = quantize(keys.values, precision)
+    keys.in_angles = quantize(keys.in_angles, angle_precision)
+    keys.out_angles = quantize(keys.out_angles, angle_precision)
+    keys.in_weights = quantize_weights(keys.in_weights)
+    keys.out_weights = quantize_weights(keys.out_weights)
+    return keys.to_key_data()
+
+
+def quantize_samples(samples: dict, precision: float) -> dict:
+    values = quantize(decode_values(samples["values"]), precision)
+    return make_samples(
+        samples["start"], samples["step"], values, samples["interpolation"]
+    )
+
+
+def quantize_attribute_data(attribute_data: dict, policy: Dict[str, float]) -> dict:
+    """Gets a copy of an attribute's animation-data with values quantized"""
+    precision = policy[get_attribute_class(attribute_data.get("attributeType"))]
+    if is_sampled(attribute_data):
+        samples = quantize_samples(attribute_data[SAMPLES_KEY], precision)
+        return dict(attribute_data, **{SAMPLES_KEY: samples})
+    keys = attribute_data.get("keys")
+    if not keys:
+        return attribute_data
+    return dict(
+        attribute_data, keys=quantize_key_data(keys, precision, policy["angle"])
+    )
+
+
+def quantize_anim_data(
+    path_data: dict, precision: Optional[Dict[str, float]] = None
+) -> dict:
+    """Quantizes animation-data on all nodes in path_data"""
+    policy = get_policy(precision)
+    return {
+        node_path: {
+            name: quantize_attribute_data(attribute_data, policy)
+            for name, attribute_data in node_data.items()
+        }
+        for node_path, node_data in path_data.items()
+    }
+
+
+def get_anim_errors(path_data: dict, quantized_data: dict) -> Dict[str, float]:
+    """Gets the maximum difference in values per attribute-class"""
+    errors = dict()
+    for node_path, node_data in path_data.items():
+        for name, attribute_data in node_data.items():
+            other = quantized_data[node_path][name]
+            if is_sampled(attribute_data):
+                before = decode_values(attribute_data[SAMPLES_KEY]["values"])
+                after = decode_values(other[SAMPLES_KEY]["values"])
+            elif attribute_data.get("keys"):
+                before = KeyArrays.from_key_data(attribute_data["keys"]).values
+                after = KeyArrays.from_key_data(other["keys"]).values
+            else:
+                continue
+            attribute_class = get_attribute_class(attribute_data.get("attributeType"))
+            error = float(np.max(np.abs(before - after)))
+            errors[attribute_class] = max(errors.get(attribute_class, 0.0), error)
+    return errors
+
+
+def measure_quantization(
+    path_data: dict, precision: Optional[Dict[str, float]] = None
+) -> dict:
+    """
+    Measures the size and error trade-off of quantizing path_data:
+    json-size before and after, their ratio and the max error per
+    attribute-class
+    """
+    quantized_data = quantize_anim_data(path_data, precision)
+    before = len(json.dumps(path_data))
+    after = len(json.dumps(quantized_data))
+    report = {
+        "before": before,
+        "after": after,
+        "ratio": after / float(before) if before else 1.0,
+        "max_error": get_anim_errors(path_data, quantized_data),
+    }
+    _logger.debug(f"Quantization: {report}")
+    return report
@@ -0,0 +1,201 @@
+"""
+Dense sampled channels for baked animation.
+
+Instead of a key with tangent-data per frame, a sampled channel is
+stored as a start frame, a step and the values packed as float32 in a
+base64-string. Tangents are implied: linear, or step for held values.
+"""
+
+import base64
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from serial_animator.key_arrays import KeyArrays, TimeTransform
+from serial_animator.key_reduction import is_baked
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+SAMPLES_KEY = "samples"
+LINEAR = "linear"
+STEP = "step"
+VALUE_TYPE = np.dtype("<f4")
+MAX_STEP = 1.0
+
+
+def is_sampled(attribute_data: dict) -> bool:
+    return SAMPLES_KEY in attribute_data
+
+
+def encode_values(values) -> str:
+    """Packs values as little-endian float32 in a base64-string"""
+    packed = np.asarray(values, dtype=VALUE_TYPE).tobytes()
+    return base64.b64encode(packed).decode("ascii")
+
+
+def decode_values(text: str) -> np.ndarray:
+    """Unpacks values from a base64-string"""
+    return np.frombuffer(base64.b64decode(text), dtype=VALUE_TYPE).astype(np.float64)
+
+
+def make_samples(
+    start: float, step: float, values, interpolation: str = LINEAR
+) -> dict:
+    return {
+        "start": float(start),
+        "step": float(step),
+        "interpolation": interpolation,
+        "count": len(values),
+        "values": encode_values(values),
+    }
+
+
+def get_sample_times(samples: dict) -> np.ndarray:
+    return samples["start"] + np.arange(samples["count"]) * samples["step"]
+
+
+def get_interpolation(keys: KeyArrays) -> Optional[str]:
+    """
+    Gets STEP if all segments between keys hold their value, LINEAR if
+    all are linear or the curve is baked on every frame, or None if the
+    curve has other tangents
+    """
+    # the out-tangent of the last and in-tangent of the first key
+    # don't shape any segment
+    out_types = keys.out_types[:-1]
+    if all(t == STEP for t in out_types):
+        return STEP
+    if all(t == LINEAR for t in (*out_types, *keys.in_types[1:])):
+        return LINEAR
+    if is_baked(keys):
+        return LINEAR
+    return None
+
+
+def get_samples(key_data: dict) -> Optional[dict]:
+    """
+    Gets samples from key-data if keys are evenly spaced at most
+    MAX_STEP frames apart with linear or step tangents, or baked, or
+    None if the curve can't be stored as samples without changing its
+    shape
+    """
+    keys = KeyArrays.from_key_data(key_data)
+    if len(keys) < 2:
+        return None
+    steps = np.diff(keys.times)
+    step = float(steps[0])
+    if not 0 < step <= MAX_STEP or not np.allclose(steps, step):
+        return None
+    interpolation = get_interpolation(keys)
+    if interpolation is None:
+        return None
+    return make_samples(keys.times[0], step, keys.values, interpolation)
+
+
+def clip_samples(
+    samples: dict, start: Optional[float] = None, end: Optional[float] = None
+) -> Optional[dict]:
+    """Gets samples in range start to end, or None if none are in range"""
+    times = get_sample_times(samples)
+    lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+    hi = len(times)
+    if end is not None:
+        hi = int(np.searchsorted(times, end, side="right"))
+    if hi <= lo:
+        return None
+    if lo == 0 and hi == len(times):
+        return samples
+    values = decode_values(samples["values"])[lo:hi]
+    return make_samples(times[lo], samples["step"], values, samples["interpolation"])
+
+
+def transform_samples(samples: dict, transform: TimeTransform) -> dict:
+    """Gets samples with key-times transformed"""
+    start = transform.map_time(samples["start"])
+    step = samples["step"] * transform.scale
+    values = decode_values(samples["values"])
+    if step < 0:
+        start = start + step * (len(values) - 1)
+        step = -step
+        values = values[::-1]
+    return make_samples(start, step, values, samples["interpolation"])
+
+
+def split_samples(samples: dict, block_size: int) -> List[Tuple[int, dict]]:
+    """Splits samples into (block_index, samples) per block of frames"""
+    times = get_sample_times(samples)
+    values = decode_values(samples["values"])
+    block_indices = np.floor(times / block_size).astype(int)
+    blocks = list()
+    for block_index in np.unique(block_indices):
+        mask = block_indices == block_index
+        block_values = values[mask]
+        block_start = times[mask][0]
+        blocks.append(
+            (
+                int(block_index),
+                make_samples(
+                    block_start, samples["step"], block_values, samples["interpolation"]
+                ),
+            )
+        )
+    return blocks
+
+
+def concatenate_samples(samples_list: List[dict]) -> dict:
+    """Joins consecutive samples with the same step into one"""
+    first = samples_list[0]
+    if len(samples_list) == 1:
+        return first
+    values = np.concatenate([decode_values(s["values"]) for s in samples_list])
+    return make_samples(first["start"], first["step"], values, first["interpolation"])
+
+
+def samples_to_key_data(samples: dict) -> OrderedDict:
+    """Converts samples to key-data with the implied tangents"""
+    interpolation = samples["interpolation"]
+    in_type = LINEAR
+    out_type = STEP if interpolation == STEP else LINEAR
+    key_data = OrderedDict()
+    for time, value in zip(
+        get_sample_times(samples).tolist(), decode_values(samples["values"]).tolist()
+    ):
+        key_data[time] = (value, (0.0, 0.0, 1.0, 1.0, in_type, out_type, False, False))
+    return key_data
+
+
+def sample_node_data(node_data: dict) -> Tuple[dict, int]:
+    """
+    Converts evenly keyed attributes in node_data to samples. Returns
+    new node-data and the number of converted attributes
+    """
+    sampled_data = dict()
+    converted = 0
+    for attribute_name, attribute_data in node_data.items():
+        samples = None
+        if not is_sampled(attribute_data):
+            samples = get_samples(attribute_data.get("keys"))
+        if samples is None:
+            sampled_data[attribute_name] = attribute_data
+            continue
+        sampled_data[attribute_name] = {
+            k: v for k, v in attribute_data.items() if k != "keys"
+        }
+        sampled_data[attribute_name][SAMPLES_KEY] = samples
+        sampled_data[attribute_name]["weightedTangents"] = False
+        converted += 1
+    return sampled_data, converted
+
+
+def sample_anim_data(path_data: dict) -> dict:
+    """Converts evenly keyed attributes on all nodes to samples"""
+    sampled_data = dict()
+    converted = 0
+    for node_path, node_data in path_data.items():
+        sampled_data[node_path], node_converted = sample_node_data(node_data)
+        converted += node_converted
+    _logger.debug(f"Stored {converted} curves as samples")
+    return sampled_data
@@ -0,0 +1,154 @@
+"""
+Queue of saves written in a background-thread.
+
+A save is split in two: capturing data from the scene, which has to run
+on Maya's main thread and is kept short, and writing the archive, which
+encodes data, scales previews and writes the file. The writing is queued
+here as a job, and jobs run one at a time in submission order, so
+several saves can be pending while the user keeps working. Archives are
+written to a temporary file next to their path and renamed when done
+(see file_io.ArchiveWriter), so a library never shows half-written
+archives.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+import shutil
+import threading
+from typing import Callable, Iterable, List, Optional
+
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# called with the fraction of a save done and a description of the step
+Progress = Callable[[float, str], None]
+
+
+def ignore_progress(fraction: float, message: str = ""):
+    pass
+
+
+class SaveJob(object):
+    """
+    A queued save of out_path. write(progress=...) writes the archive,
+    reporting its progress. The directories in cleanup, like the
+    captured preview-images, are removed when the job has run.
+    listeners are called with the job when its state or progress changes
+    """
+
+    def __init__(
+        self,
+        out_path: Path,
+        write: Callable[[Progress], Path],
+        cleanup: Iterable[Path] = (),
+        listeners: Iterable[Callable] = (),
+    ):
+        self.out_path = Path(out_path)
+        self.write = write
+        self.cleanup = [Path(path) for path in cleanup]
+        self.state = PENDING
+        self.progress = 0.0
+        self.message = ""
+        self.error: Optional[BaseException] = None
+        self.future: Optional[Future] = None
+        self._listeners = listeners
+
+    def __repr__(self):
+        return f"SaveJob({self.out_path.name}, {self.state}, {self.progress:.0%})"
+
+    def is_finished(self) -> bool:
+        return self.state in (DONE, FAILED)
+
+    def set_progress(self, fraction: float, message: str = ""):
+        self.progress = min(max(fraction, 0.0), 1.0)
+        self.message = message
+        self._notify()
+
+    def _notify(self):
+        for listener in self._listeners:
+            listener(self)
+
+    def run(self) -> Optional[Path]:
+        self.state = RUNNING
+        self.set_progress(0.0, "Starting")
+        try:
+            path = self.write(progress=self.set_progress)
+        except Exception as e:
+            _logger.error(f"Couldn't save {self.out_path}: {e}")
+            self.error = e
+            self.state = FAILED
+            self._notify()
+            return None
+        finally:
+            for directory in self.cleanup:
+                shutil.rmtree(directory, ignore_errors=True)
+        self.state = DONE
+        self.set_progress(1.0, "Saved")
+        _logger.debug(f"Saved {path}")
+        return path
+
+
+class SaveQueue(object):
+    """
+    Runs save-jobs in a background-thread in submission order.
+    Listeners are called with a job when its state or progress changes,
+    from the thread running it
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._jobs = list()
+        self._listeners = list()
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[SaveJob], None]):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[SaveJob], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def submit(
+        self,
+        out_path: Path,
+        write: Callable[[Progress], Path],
+        cleanup: Iterable[Path] = (),
+    ) -> SaveJob:
+        """Queues writing out_path with write(progress)"""
+        job = SaveJob(out_path, write, cleanup, self._listeners)
+        job._notify()
+        with self._lock:
+            self._jobs = [j for j in self._jobs if not j.is_finished()]
+            self._jobs.append(job)
+            job.future = self._executor.submit(job.run)
+        return job
+
+    def get_jobs(self) -> List[SaveJob]:
+        """Gets jobs not finished yet, in the order they will be run"""
+        with self._lock:
+            return [job for job in self._jobs if not job.is_finished()]
+
+    def wait(self, timeout: Optional[float] = None):
+        """Waits for all queued jobs to finish"""
+        with self._lock:
+            futures = [job.future for job in self._jobs]
+        for future in futures:
+            future.result(timeout=timeout)
+
+
+_SAVE_QUEUE: Optional[SaveQueue] = None
+
+
+def get_save_queue() -> SaveQueue:
+    """Gets the library-wide save-queue"""
+    global _SAVE_QUEUE
+    if _SAVE_QUEUE is None:
+        _SAVE_QUEUE = SaveQueue()
+    return _SAVE_QUEUE
@@ -1,7 +1,7 @@
 import pathlib
 import getpass
 from typing import Optional
-import pymel.core as pm
+from maya import cmds
 from serial_animator.exceptions import SerialAnimatorSceneNotSavedError
 from serial_animator import log
 
@@ -9,7 +9,7 @@ _logger = log.log(__name__)
 
 
 def get_scene_name() -> pathlib.Path:
-    scene_name = pm.sceneName()
+    scene_name = cmds.file(query=True, sceneName=True)
     if not scene_name:
         raise SerialAnimatorSceneNotSavedError()
     return pathlib.Path(scene_name)
@@ -35,7 +35,7 @@ def get_current_workspace() -> pathlib.Path:
     """
     Gets current working directory
     """
-    return pathlib.Path(pm.workspace.getPath())
+    return pathlib.Path(cmds.workspace(query=True, rootDirectory=True))
 
 
 def get_workspace_lib_path() -> pathlib.Path:
@@ -1,17 +1,19 @@
 """Widgets for saving, loading and editing animation files"""
-import os
+from functools import partial
 from pathlib import Path
 import tarfile
-import tempfile
 
-from PySide2 import QtCore
+from PySide2 import QtGui
 import serial_animator.animation_io as animation_io
+import serial_animator.capture_policy as capture_policy
+import serial_animator.preview_pyramid as preview_pyramid
 from serial_animator.ui.utils import get_maya_main_window
 from serial_animator.ui.file_view import (
     FileLibraryView,
     FileWidgetHolderBase,
     FilePreviewWidgetBase,
 )
+from serial_animator.ui.playback_clock import get_loop_frame, get_playback_clock
 from serial_animator.ui.view_grabber import AnimationViewGrabber
 
 from serial_animator import log
@@ -23,17 +25,31 @@ _logger.setLevel("DEBUG")
 class AnimationWidget(FilePreviewWidgetBase):
     """Previews animation and loads it from a file on disk"""
 
-    def __init__(self, path):
-        super(AnimationWidget, self).__init__(path)
-        self.meta_data = animation_io.extract_meta_data(self.path)
+    def __init__(self, path, preview=None):
+        super(AnimationWidget, self).__init__(path, preview)
+        if self.header:
+            self.meta_data = self.header["meta_data"]
+        else:
+            self.meta_data = animation_io.extract_meta_data(
+                self.get_read_path(fetch=False)
+            )
         self.frame_rate = self.get_framerate()
         self.start_frame = self.get_start_frame()
         self.frame = self.start_frame
         self.end_frame = self.get_end_frame()
-        self._anim_timer = QtCore.QTimer(self)
-        self._anim_timer.timeout.connect(self.change_image)
         self._hover = False
         self.start_img = None
+        # atlas of packed frames matching the tile-size, or None for
+        # archives with loose frames
+        self.atlas = preview_pyramid.get_atlas(
+            self.meta_data.get("preview_atlases", list()), self.tile_size
+        )
+        # captured frame-numbers of sampled captures, or None if every
+        # frame was captured
+        self.preview_frames = self.meta_data.get("preview_frames")
+        # decoded atlases by name, kept while hovering
+        self._atlas_pixmaps = dict()
+        self._read_path = self.path
 
     def get_start_frame(self) -> int:
         return int(self.meta_data.get("frame_range")[0])
@@ -44,77 +60,107 @@ class AnimationWidget(FilePreviewWidgetBase):
     def get_framerate(self) -> float:
         return float(self.meta_data.get("time_unit"))
 
-    def change_image(self):
+    def show_playback_frame(self, index: int):
         """
-        If mouse is not over widget, set start-image. If the mouse is
-        over, loop animation by setting tmp image based on current frame
+        Shows the frame index frames into the looping animation. Called
+        by the playback-clock
         """
-        # set preview-image if we are not hovering
-        if self._hover is False:
-            self.set_start_image()
+        self.show_frame(get_loop_frame(index, self.start_frame, self.end_frame))
+
+    def show_frame(self, frame: int):
+        self.frame = frame
+        if self.atlas:
+            self.set_atlas_frame(self.frame)
             return
-        # reset animation if we are at the last frame, else move to next
-        # frame
-        if self.frame >= self.end_frame:
-            self.frame = self.start_frame
-        else:
-            self.frame += 1
+        if self.preview_frames:
+            frame = capture_policy.get_sampled_frame(self.preview_frames, frame)
+            if frame is None:
+                return
         # establish the file name of image file we are looking for in
-        # tar-archive
-        image_name = f"preview.{self.frame:04d}.jpg"
+        # tar-archive, at the pyramid-level matching the tile
+        image_name = preview_pyramid.get_level_name(
+            f"preview.{frame:04d}.jpg", self.preview_level
+        )
         self.set_temp_image(image_name)
 
+    def is_on_screen(self) -> bool:
+        """Checks if any of the widget is visible, and not scrolled away"""
+        return self.isVisible() and not self.visibleRegion().isEmpty()
+
     def start_anim(self):
         """
-        Starts animation-timer with correct frame-rate
+        Starts playing the image-sequence on the library's playback-clock
         """
-        if self._anim_timer.isActive():
-            return
-        self._anim_timer.setInterval(1000 / self.frame_rate)
-        self._anim_timer.start()
+        clock = get_playback_clock()
+        if not clock.is_playing(self):
+            # frames are read from a mirrored copy from here on
+            self._read_path = self.get_read_path()
+            clock.add(self)
+
+    def stop_anim(self):
+        """
+        Stops animation of image-sequence, and sets start-image
+        """
+        self._hover = False
+        get_playback_clock().remove(self)
+        self._atlas_pixmaps.clear()
+        self.set_start_image()
+        self.frame = self.start_frame
 
     def enterEvent(self, event):
         """
-        Opens archive, sets hover and starts animation of image-sequence
+        Sets hover and starts animation of image-sequence
         """
         self._hover = True
         self.start_anim()
 
     def leaveEvent(self, event):
-        """
-        Stops animation of image-sequence, and sets start-image
-        """
-        self._hover = False
-        self._anim_timer.stop()
-        self.set_start_image()
-        self.frame = self.start_frame
+        self.stop_anim()
+
+    def hideEvent(self, event):
+        super(AnimationWidget, self).hideEvent(event)
+        if self._hover:
+            self.stop_anim()
 
     def set_temp_image(self, preview_image_name):
         """
-        Opens archive and tries to extract preview_image_name to a
-        temporary location and sets it as widget image. Deletes tmp-file
+        Opens archive and tries to read preview_image_name and sets it as
+        widget image
         """
         try:
-            with tarfile.open(self.path) as tf:
-                img_file = tf.extractfile(preview_image_name)
-                with tempfile.NamedTemporaryFile(
-                        prefix="Serial_animator", suffix=".png", delete=False
-                ) as img:
-                    img.write(img_file.read())
-                    tmp_file_name = img.name
-                self.set_image(tmp_file_name)
-            # couldn't get it to work with a temp-file that deletes
-            # itself, so manually doing it here
-            os.remove(tmp_file_name)
+            with tarfile.open(self._read_path) as tf:
+                self.set_image_data(tf.extractfile(preview_image_name).read())
         except KeyError:
             pass
 
+    def set_atlas_frame(self, frame: int):
+        """
+        Sets frame cut from its atlas as widget image. Each atlas is read
+        and decoded once while hovering
+        """
+        atlas_frame = preview_pyramid.get_atlas_frame(self.atlas, frame)
+        if not atlas_frame:
+            return
+        name, rect = atlas_frame
+        pix = self._atlas_pixmaps.get(name)
+        if pix is None:
+            pix = QtGui.QPixmap()
+            try:
+                with tarfile.open(self._read_path) as tf:
+                    pix.loadFromData(tf.extractfile(name).read())
+            except KeyError:
+                return
+            self._atlas_pixmaps[name] = pix
+        self.setPixmap(self.scale_pixmap(pix.copy(*rect)))
+
     def mouseDoubleClickEvent(self, event):
         self.load_animation()
 
     def load_animation(self):
         nodes = animation_io.get_selection()
-        animation_io.load_animation(self.path, nodes)
+        animation_io.load_animation(
+            self.get_read_path(), nodes, skip_unchanged=True
+        )
 
 
 class AnimationWidgetHolder(FileWidgetHolderBase):
@@ -126,8 +172,8 @@ class AnimationWidgetHolder(FileWidgetHolderBase):
     FileType = "anim"
     DataWidgetClass = AnimationWidget
 
-    def __init__(self, path):
-        super(AnimationWidgetHolder, self).__init__(path)
+    def __init__(self, path, populate=True):
+        super(AnimationWidgetHolder, self).__init__(path, populate)
 
 
 class SerialAnimatorView(FileLibraryView):
@@ -150,13 +196,36 @@ class SerialAnimatorView(FileLibraryView):
         """Opens a preview viewport and grabs image-sequence from it"""
         img_path = out_dir / "preview"
         start, end = animation_io.get_frame_range()
-        grabber_window = self.ImageGrabber(img_path, start_frame=start, end_frame=end)
+        grabber_window = self.ImageGrabber(
+            img_path, start_frame=start, end_frame=end, policy=self.get_capture_policy()
+        )
         return grabber_window
 
+    def get_capture_policy(self) -> dict:
+        """
+        Gets the capture-policy from the "capture_max_frames",
+        "capture_size" and "capture_quality" settings
+        """
+        value = self.ui_settings.value
+        return capture_policy.get_policy(
+            max_frames=int(value("capture_max_frames", capture_policy.MAX_FRAMES)),
+            size=int(value("capture_size", capture_policy.CAPTURE_SIZE)),
+            quality=int(value("capture_quality", capture_policy.CAPTURE_QUALITY)),
+        )
+
     def save_data(self, img_path):
+        """
+        Captures animation of selected nodes and queues writing it with
+        the captured image-sequence
+        """
         out_path = self.get_out_path()
         preview_dir = img_path.parent
-        animation_io.save_animation_from_selection(out_path, preview_dir)
+        capture = animation_io.capture_animation_from_selection()
+        self.submit_save(
+            out_path,
+            partial(animation_io.write_animation, out_path, capture, preview_dir),
+            preview_dir,
+        )
 
 
 __VIEW = None
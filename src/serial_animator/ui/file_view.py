@@ -1,15 +1,23 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import os
 from pathlib import Path
+import shutil
 import sys
-from typing import Generator, List
+from typing import Callable, Generator, List, Optional, Tuple
 import subprocess
+import tarfile
 import tempfile
 import uuid
 
 from PySide2 import QtWidgets, QtCore, QtGui
 
 from serial_animator.utils import get_user_preference_dir, setup_scene_opened_callback
+import serial_animator.archive_header as archive_header
 import serial_animator.file_io
+import serial_animator.library_mirror as library_mirror
+import serial_animator.preview_pyramid as preview_pyramid
+import serial_animator.save_queue as save_queue
 import serial_animator.scene_paths as scene_paths
 from serial_animator.ui.widgets import MayaWidget, ScrollFlowWidget
 from serial_animator.ui.view_grabber import TmpViewport
@@ -18,13 +26,32 @@ from serial_animator import log
 
 _logger = log.log(__name__)
 
+# data-widgets created per turn of the event-loop when populating
+WIDGET_BATCH_SIZE = 32
+# lists directories and reads archive-headers for populating tabs
+_PREVIEW_READER = ThreadPoolExecutor(max_workers=2)
+
 
 class FilePreviewWidgetBase(QtWidgets.QLabel):
     """Widget displaying an image extracted from archive from path"""
 
-    def __init__(self, path: Path):
+    tile_size = preview_pyramid.TILE_SIZE
+
+    def __init__(self, path: Path, preview: Optional[Tuple] = None):
         super(FilePreviewWidgetBase, self).__init__()
         self.path = path
+        # header and poster-image come from one read at the start of
+        # the archive, or are None for archives without a header. A
+        # mirrored copy is only read if it is already current. preview
+        # is the header and poster if they were read in the background
+        if preview is None:
+            preview = self.read_preview(self.path)
+        self.header, self.poster = preview
+        # level of the preview-pyramid matching the tile-size, or None
+        # for the full-size images
+        self.preview_level = preview_pyramid.get_level(
+            self.get_preview_levels(), self.tile_size
+        )
         self.setText(str(self.path))
         self.set_start_image()
         self.setToolTip(str(self.path))
@@ -63,36 +90,123 @@ class FilePreviewWidgetBase(QtWidgets.QLabel):
     def load_data(self):
         raise NotImplementedError
 
+    def get_read_path(self, fetch: bool = True) -> Path:
+        """Gets the path to read the archive from, see library_mirror"""
+        return library_mirror.get_read_path(self.path, fetch=fetch)
+
+    @staticmethod
+    def read_preview(path: Path) -> Tuple[Optional[dict], Optional[bytes]]:
+        """Reads header and poster-image of archive at path"""
+        read_path = library_mirror.get_read_path(path, fetch=False)
+        return archive_header.read_header_and_poster(read_path)
+
+    def get_preview_levels(self) -> List[int]:
+        if not self.header:
+            return list()
+        return self.header["meta_data"].get("preview_levels", list())
+
     def set_start_image(self):
         """
-        Extracts the start-image from archive, and sets it as pix-map
+        Sets the poster-image read with the header as pix-map, or
+        extracts the start-image from archives without a header
         """
+        if self.poster:
+            self.set_image_data(self.poster)
+            return
         with tempfile.TemporaryDirectory(prefix="serial_animator_") as tmp_dir:
-            img_path = self.get_preview_image_path(self.path, Path(tmp_dir))
+            img_path = self.get_preview_image_path(
+                self.get_read_path(fetch=False), Path(tmp_dir)
+            )
             self.set_image(str(img_path))
 
     def set_image(self, img_path: str):
         pix = QtGui.QPixmap()
         if os.path.isfile(img_path):
             pix.load(img_path)
-            pix = pix.scaled(250, 250, QtCore.Qt.KeepAspectRatio)
+            pix = self.scale_pixmap(pix)
+        self.setPixmap(pix)
+
+    def set_image_data(self, data: bytes):
+        pix = QtGui.QPixmap()
+        if pix.loadFromData(data):
+            pix = self.scale_pixmap(pix)
         self.setPixmap(pix)
 
+    def scale_pixmap(self, pix: QtGui.QPixmap) -> QtGui.QPixmap:
+        """Scales pix to the tile-size, unless it is a level that fits"""
+        if pix.width() <= self.tile_size and pix.height() <= self.tile_size:
+            return pix
+        return pix.scaled(self.tile_size, self.tile_size, QtCore.Qt.KeepAspectRatio)
+
     @staticmethod
     def get_preview_image_path(path, directory) -> Path:
         return serial_animator.file_io.extract_file_from_archive(path, directory)
 
 
+class PreviewReader(QtCore.QObject):
+    """Reads previews of archives in a background-thread"""
+
+    # generation, list of (path, (header, poster))
+    read = QtCore.Signal(int, list)
+
+    def start(self, generation: int, files: Callable, read_preview: Callable):
+        """
+        Reads previews with read_preview(path) for the paths returned by
+        files() and emits them with generation
+        """
+        _PREVIEW_READER.submit(self._read, generation, files, read_preview)
+
+    def _read(self, generation: int, files: Callable, read_preview: Callable):
+        previews = list()
+        try:
+            for path in files():
+                try:
+                    previews.append((path, read_preview(path)))
+                except (OSError, tarfile.TarError) as e:
+                    _logger.warning(f"Couldn't read {path}: {e}")
+        except OSError as e:
+            _logger.warning(f"Couldn't list files: {e}")
+        try:
+            self.read.emit(generation, previews)
+        except RuntimeError:
+            # the holder was deleted while reading
+            pass
+
+
+class SaveProgress(QtCore.QObject):
+    """
+    Forwards changes of save-jobs from the save-queue's thread to the
+    UI-thread
+    """
+
+    changed = QtCore.Signal(object)
+
+    def __init__(self, parent=None):
+        super(SaveProgress, self).__init__(parent)
+        save_queue.get_save_queue().add_listener(self.on_job_changed)
+
+    def on_job_changed(self, job: save_queue.SaveJob):
+        try:
+            self.changed.emit(job)
+        except RuntimeError:
+            # the view was deleted while saving
+            save_queue.get_save_queue().remove_listener(self.on_job_changed)
+
+    def stop(self):
+        save_queue.get_save_queue().remove_listener(self.on_job_changed)
+
+
 class FileWidgetHolderBase(QtWidgets.QWidget):
     """
     A Widget holding Data-widgets in a flow-layout based on files in
-    a specified path
+    a specified path. If populate is False, the holder stays empty until
+    populate() is called
     """
 
     FileType: str
     DataWidgetClass = FilePreviewWidgetBase
 
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, populate: bool = True):
         super(FileWidgetHolderBase, self).__init__()
         self.path = path
         self.layout = QtWidgets.QVBoxLayout()
@@ -103,7 +217,15 @@ class FileWidgetHolderBase(QtWidgets.QWidget):
         self.path_label = QtWidgets.QLabel(str(path))
         self.path_label.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
         self.data_widgets = list()
-        self.update_content()
+        self.populated = False
+        # increased on each update, so results of older updates are
+        # dropped
+        self._generation = 0
+        self._pending = list()
+        self._preview_reader = PreviewReader(self)
+        self._preview_reader.read.connect(self.on_previews_read)
+        if populate:
+            self.update_content()
         self.setToolTip(str(self.path))
         self.setContextMenuPolicy(QtCore.Qt.ContextMenuPolicy.CustomContextMenu)
         self.customContextMenuRequested.connect(self.on_context_menu)
@@ -123,19 +245,57 @@ class FileWidgetHolderBase(QtWidgets.QWidget):
             if str(f).endswith(f".{self.FileType}"):
                 yield f
 
+    def list_files(self) -> List[Path]:
+        if not self.path.is_dir():
+            return list()
+        return list(self.get_files())
+
+    def populate(self):
+        """Populates the holder the first time it is called"""
+        if not self.populated:
+            self.update_content()
+
     def update_content(self):
+        """
+        Lists files and reads their previews in the background, and then
+        replaces the data-widgets
+        """
+        self.populated = True
+        self._generation += 1
+        self._preview_reader.start(
+            self._generation, self.list_files, self.DataWidgetClass.read_preview
+        )
+
+    def on_previews_read(self, generation: int, previews: list):
+        if generation != self._generation:
+            return
         self.clear_widgets()
-        if self.path.is_dir():
-            for f in self.get_files():
-                w = self.create_data_widget(f)
-                self.data_widgets.append(w)
-                self.data_widget_layout.addWidget(w)
-        if not self.data_widgets:
+        self._pending = previews
+        self.add_pending_widgets(generation)
+
+    def add_pending_widgets(self, generation: int):
+        """
+        Creates data-widgets in batches, letting the event-loop run in
+        between
+        """
+        if generation != self._generation:
+            return
+        batch = self._pending[:WIDGET_BATCH_SIZE]
+        del self._pending[:WIDGET_BATCH_SIZE]
+        for path, preview in batch:
+            w = self.create_data_widget(path, preview)
+            self.data_widgets.append(w)
+            self.data_widget_layout.addWidget(w)
+        if self._pending:
+            QtCore.QTimer.singleShot(0, lambda: self.add_pending_widgets(generation))
+        elif not self.data_widgets:
             self.data_widget_layout.addWidget(self.path_label)
             self.data_widgets.append(self.path_label)
 
-    def create_data_widget(self, path: Path) -> FilePreviewWidgetBase:
-        return self.DataWidgetClass(path)
+    def create_data_widget(
+            self, path: Path, preview: Optional[Tuple] = None
+    ) -> FilePreviewWidgetBase:
+        return self.DataWidgetClass(path, preview)
 
     def clear_widgets(self):
         """
@@ -174,6 +334,7 @@ class TabWidget(QtWidgets.QTabWidget):
         )
         self.file_watcher = QtCore.QFileSystemWatcher()
         self.file_watcher.directoryChanged.connect(self.dir_changed)
+        self.currentChanged.connect(self.populate_tab)
         self.setObjectName(f"SerialAnimator_TabWidget_{uuid.uuid4().hex}")
         self._callback_id = setup_scene_opened_callback(
             self.reload_tabs, parent=self.objectName()
@@ -185,12 +346,26 @@ class TabWidget(QtWidgets.QTabWidget):
         raise NotImplementedError
 
     def add_tabs(self):
-        for _, p in enumerate(self.get_asset_locations()):
-            name = p.name
-            tab = self.add_tab(p)
-            self.file_watcher.addPath(str(p))
-            self.addTab(tab, name)
-        self.set_current_tab_from_settings()
+        """
+        Adds empty tabs for all locations. Only the current tab is
+        populated, others are populated when first shown
+        """
+        self.blockSignals(True)
+        try:
+            for _, p in enumerate(self.get_asset_locations()):
+                name = p.name
+                tab = self.add_tab(p)
+                self.file_watcher.addPath(str(p))
+                self.addTab(tab, name)
+            self.set_current_tab_from_settings()
+        finally:
+            self.blockSignals(False)
+        self.populate_tab(self.currentIndex())
+
+    def populate_tab(self, index: int):
+        tab = self.widget(index)
+        if tab is not None:
+            tab.populate()
 
     def set_current_tab_from_settings(self):
         setting = self.ui_settings.value("tab_index") or 0
@@ -202,22 +377,54 @@ class TabWidget(QtWidgets.QTabWidget):
         self.ui_settings.setValue("tab_index", self.currentIndex())
 
     def add_tab(self, path) -> FileWidgetHolderBase:
-        return self.DataHolderWidget(path=path)
+        return self.DataHolderWidget(path=path, populate=False)
 
     def dir_changed(self, path: str):
         path = Path(path)
         tab_dict = dict()
 
-        tabs = [self.widget(i) for i in range(self.count())]
-        for tab in tabs:
+        for tab in self.get_tabs():
             tab_dict[tab.path] = tab
         tab = tab_dict.get(path)
-        if tab:
+        # tabs that were never shown are populated when they are
+        if tab and tab.populated:
             tab.update_content()
 
     def reload_tabs(self):
-        self.clear()
-        self.add_tabs()
+        """
+        Updates tabs to the current locations. Tabs for locations that
+        are unchanged, like the shared and user libraries, are kept with
+        their widgets, and only tabs for new locations are added
+        """
+        locations = list(self.get_asset_locations())
+        tabs = {tab.path: tab for tab in self.get_tabs()}
+        current_tab = self.currentWidget()
+        self.blockSignals(True)
+        try:
+            for path, tab in tabs.items():
+                if path not in locations:
+                    self.removeTab(self.indexOf(tab))
+                    self.file_watcher.removePath(str(path))
+                    tab.deleteLater()
+            for index, path in enumerate(locations):
+                tab = tabs.get(path)
+                if tab is None:
+                    tab = self.add_tab(path)
+                    self.file_watcher.addPath(str(path))
+                    self.insertTab(index, tab, path.name)
+                elif self.indexOf(tab) != index:
+                    self.tabBar().moveTab(self.indexOf(tab), index)
+            if current_tab is not None and self.indexOf(current_tab) >= 0:
+                self.setCurrentWidget(current_tab)
+            else:
+                self.set_current_tab_from_settings()
+        finally:
+            self.blockSignals(False)
+        self.populate_tab(self.currentIndex())
+        _logger.debug(f"Reloaded tabs, kept {len(set(tabs) & set(locations))}")
+
+    def get_tabs(self) -> List[FileWidgetHolderBase]:
+        return [self.widget(i) for i in range(self.count())]
 
     @classmethod
     def get_ui_settings_path(cls) -> str:
@@ -238,6 +445,10 @@ class FileLibraryView(MayaWidget):
 
     def __init__(self, parent=None):
         super(FileLibraryView, self).__init__(parent)
+        self.ui_settings = QtCore.QSettings(
+            self.get_ui_settings_path(), QtCore.QSettings.IniFormat
+        )
+        self.setup_library_mirror()
         self.setWindowFlags(QtCore.Qt.Window)
         self.main_layout = QtWidgets.QVBoxLayout()
         self.setLayout(self.main_layout)
@@ -257,6 +468,12 @@ class FileLibraryView(MayaWidget):
         self.save_button = QtWidgets.QPushButton("Save")
         self.save_layout.addWidget(self.save_button)
         self.save_button.clicked.connect(self.save_clicked)
+        self.save_progress_bar = QtWidgets.QProgressBar()
+        self.save_progress_bar.setRange(0, 100)
+        self.save_progress_bar.hide()
+        self.save_layout.addWidget(self.save_progress_bar)
+        self.save_progress = SaveProgress(self)
+        self.save_progress.changed.connect(self.on_save_changed)
 
         self.load_grp = QtWidgets.QGroupBox()
         self.main_layout.addWidget(self.load_grp)
@@ -272,14 +489,34 @@ class FileLibraryView(MayaWidget):
         self.load_layout.addWidget(self.tab_widget)
 
         self.setWindowTitle("FileLibraryBase")
-        self.ui_settings = QtCore.QSettings(
-            self.get_ui_settings_path(), QtCore.QSettings.IniFormat
-        )
         self.apply_settings()
 
     def apply_settings(self):
         self.restoreGeometry(self.ui_settings.value("geometry"))
 
+    def setup_library_mirror(self):
+        """
+        Mirrors the shared library to the local directory in the
+        "mirror_dir" setting, if set, and prefetches recently used
+        archives. The mirror's size in MB is set by "mirror_size"
+        """
+        mirror_dir = self.ui_settings.value("mirror_dir")
+        if not mirror_dir:
+            return
+        mirror = library_mirror.get_library_mirror()
+        if mirror is None or mirror.cache_dir != Path(mirror_dir):
+            max_bytes = library_mirror.MIRROR_MAX_BYTES
+            mirror_size = self.ui_settings.value("mirror_size")
+            if mirror_size:
+                max_bytes = int(mirror_size) * 1024**2
+            mirror = library_mirror.LibraryMirror(
+                mirror_dir,
+                roots=[scene_paths.get_shared_lib_path()],
+                max_bytes=max_bytes,
+            )
+            library_mirror.set_library_mirror(mirror)
+        mirror.prefetch_recent()
+
     @staticmethod
     def get_asset_locations() -> List[Path]:
         """Gets location of assets displayed in tabs"""
@@ -310,15 +547,26 @@ class FileLibraryView(MayaWidget):
         """
         self.ui_settings.setValue("geometry", self.saveGeometry())
         self.tab_widget.save_current_tab_to_settings()
+        self.save_progress.stop()
+        mirror = library_mirror.get_library_mirror()
+        if mirror is not None:
+            mirror.flush()
 
     def save_clicked(self):
         """
         Opens capture-viewport and connects it's snap-taken signal to
-        save_data
+        save_data. The captured images are kept until their save-job has
+        run, or removed if the window closes without capturing
         """
-        with tempfile.TemporaryDirectory(prefix="serial_animator_") as tmp_dir:
-            grabber_window = self.grab_preview(Path(tmp_dir))
-            grabber_window.snap_taken.connect(self.save_data)
+        capture_dir = Path(tempfile.mkdtemp(prefix="serial_animator_"))
+        grabber_window = self.grab_preview(capture_dir)
+        grabber_window.snap_taken.connect(self.save_data)
+        grabber_window.closed.connect(partial(self.on_grabber_closed, capture_dir))
+
+    @staticmethod
+    def on_grabber_closed(capture_dir: Path, snapped: bool):
+        if not snapped:
+            shutil.rmtree(capture_dir, ignore_errors=True)
 
     def grab_preview(self, out_dir) -> TmpViewport:
         img_path = Path(out_dir) / "preview.jpg"
@@ -326,8 +574,43 @@ class FileLibraryView(MayaWidget):
         return grabber_window
 
     def save_data(self, img_path):
+        """
+        Captures data from the scene and queues writing it with
+        submit_save
+        """
         raise NotImplementedError
 
+    def submit_save(
+            self, out_path: Path, write: Callable, capture_dir: Path
+    ) -> save_queue.SaveJob:
+        """
+        Queues write(progress) to save out_path in the background.
+        capture_dir is removed when it has run
+        """
+        return save_queue.get_save_queue().submit(
+            out_path, write, cleanup=[capture_dir]
+        )
+
+    def on_save_changed(self, job: save_queue.SaveJob):
+        """Shows progress of the running save and refreshes saved tabs"""
+        if job.state == save_queue.DONE:
+            for tab in self.tab_widget.get_tabs():
+                if tab.populated and Path(tab.path) == job.out_path.parent:
+                    tab.update_widget_from_path(job.out_path)
+        elif job.state == save_queue.FAILED:
+            _logger.warning(f"Couldn't save {job.out_path.name}: {job.error}")
+        jobs = save_queue.get_save_queue().get_jobs()
+        if not jobs:
+            self.save_progress_bar.hide()
+            return
+        current = jobs[0]
+        pending = f" ({len(jobs) - 1} queued)" if len(jobs) > 1 else ""
+        self.save_progress_bar.setFormat(
+            f"Saving {current.out_path.stem}{pending}: {current.message} %p%"
+        )
+        self.save_progress_bar.setValue(int(current.progress * 100))
+        self.save_progress_bar.show()
+
     def get_out_path(self) -> Path:
         file_name = f"{self.save_line_edit.text()}.{self.FileType}"
         current_tab_path = self.tab_widget.currentWidget().path
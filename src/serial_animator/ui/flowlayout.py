@@ -6,6 +6,9 @@ https://doc.qt.io/qtforpython/examples/example_widgets_layouts_flowlayout.html
 
 """
 import sys
+import time
+from typing import List, Tuple
+
 from PySide2 import QtWidgets, QtCore
 from serial_animator import log
 
@@ -28,8 +31,50 @@ class TestWindow(QtWidgets.QWidget):
         self.setWindowTitle("Flow Layout")
 
 
+def flow_positions(
+    sizes: List[Tuple[int, int]],
+    width: int,
+    space_x: int,
+    space_y: int,
+    positions: List[Tuple[int, int, int]],
+):
+    """
+    Flows items with sizes into rows within width, extending positions
+    from the first item without one. A position is the item's x and y,
+    and the height of its row so far, relative to the layout's corner
+    """
+    right = width - 1
+    x = y = line_height = 0
+    if positions:
+        last_x, y, line_height = positions[-1]
+        x = last_x + sizes[len(positions) - 1][0] + space_x
+    for item_width, item_height in sizes[len(positions) :]:
+        next_x = x + item_width + space_x
+        if next_x - space_x > right and line_height > 0:
+            x = 0
+            y = y + line_height + space_y
+            next_x = x + item_width + space_x
+            line_height = 0
+        line_height = max(line_height, item_height)
+        positions.append((x, y, line_height))
+        x = next_x
+
+
+def get_flow_height(positions: List[Tuple[int, int, int]]) -> int:
+    if not positions:
+        return 0
+    _, y, line_height = positions[-1]
+    return y + line_height
+
+
 class FlowLayout(QtWidgets.QLayout):
-    """Lays widgets out in a grid and rearranges when resized"""
+    """
+    Lays widgets out in a grid and rearranges when resized.
+    Size-hints and positions of items are cached. Positions are only
+    recomputed from the first item that was added, removed or changed
+    size, or all of them when the width changes, and only items that
+    moved get a new geometry
+    """
 
     def __init__(self, parent=None):
         super(FlowLayout, self).__init__(parent)
@@ -38,6 +83,16 @@ class FlowLayout(QtWidgets.QLayout):
             self.setContentsMargins(0, 0, 0, 0)
 
         self._item_list = list()
+        # cached size-hints and minimum sizes as (width, height)
+        self._sizes = list()
+        self._minimum_sizes = list()
+        self._sizes_changed = False
+        # positions for the width and spacing in _layout_key
+        self._positions = list()
+        self._layout_key = None
+        self._heights = dict()
+        # geometry last set on each item
+        self._geometries = list()
 
     def __del__(self):
         item = self.takeAt(0)
@@ -46,6 +101,9 @@ class FlowLayout(QtWidgets.QLayout):
 
     def addItem(self, item):
         self._item_list.append(item)
+        self._sizes.append(get_size(item.sizeHint()))
+        self._minimum_sizes.append(get_size(item.minimumSize()))
+        self._heights.clear()
 
     def count(self):
         return len(self._item_list)
@@ -57,10 +115,21 @@ class FlowLayout(QtWidgets.QLayout):
 
     def takeAt(self, index):
         if 0 <= index < len(self._item_list):
+            del self._sizes[index]
+            del self._minimum_sizes[index]
+            del self._positions[index:]
+            del self._geometries[index:]
+            self._heights.clear()
             return self._item_list.pop(index)
 
         return None
 
+    def invalidate(self):
+        """Size-hints are checked for changes before the next layout"""
+        super(FlowLayout, self).invalidate()
+        self._sizes_changed = True
+        self._heights.clear()
+
     def expandingDirections(self):
         return QtCore.Qt.Orientation(0)
 
@@ -68,8 +137,16 @@ class FlowLayout(QtWidgets.QLayout):
         return True
 
     def heightForWidth(self, width):
-        height = self._do_layout(QtCore.QRect(0, 0, width, 0), True)
-        return height
+        self._update_sizes()
+        key = self._get_layout_key(width)
+        if key == self._layout_key:
+            self._update_positions(width)
+            return get_flow_height(self._positions)
+        if width not in self._heights:
+            positions = list()
+            flow_positions(self._sizes, width, key[1], key[2], positions)
+            self._heights[width] = get_flow_height(positions)
+        return self._heights[width]
 
     def setGeometry(self, rect):
         super(FlowLayout, self).setGeometry(rect)
@@ -79,55 +156,106 @@ class FlowLayout(QtWidgets.QLayout):
         return self.minimumSize()
 
     def minimumSize(self):
-        size = QtCore.QSize()
-
-        for item in self._item_list:
-            size = size.expandedTo(item.minimumSize())
+        self._update_sizes()
+        size = QtCore.QSize(
+            max((w for w, _ in self._minimum_sizes), default=0),
+            max((h for _, h in self._minimum_sizes), default=0),
+        )
 
         size += QtCore.QSize(
             2 * self.contentsMargins().top(), 2 * self.contentsMargins().top()
         )
         return size
 
-    def _do_layout(self, rect, test_only):
-        x = rect.x()
-        y = rect.y()
-        line_height = 0
+    def _get_layout_key(self, width: int) -> Tuple[int, int, int]:
         spacing = self.spacing()
-        for item in self._item_list:
-            # style = item.widget().style()
-            layout_spacing_x = 1
-            # layout_spacing_x = style.layoutSpacing(
-            #     QtWidgets.QSizePolicy.PushButton,
-            #     QtWidgets.QSizePolicy.PushButton,
-            #     QtCore.Qt.Horizontal,
-            # )
-            layout_spacing_y = 1
-            # layout_spacing_y = style.layoutSpacing(
-            #     QtWidgets.QSizePolicy.PushButton,
-            #     QtWidgets.QSizePolicy.PushButton,
-            #     QtCore.Qt.Vertical,
-            # )
-
-            space_x = spacing + layout_spacing_x
-            space_y = spacing + layout_spacing_y
-            next_x = x + item.sizeHint().width() + space_x
-            if next_x - space_x > rect.right() and line_height > 0:
-                x = rect.x()
-                y = y + line_height + space_y
-                next_x = x + item.sizeHint().width() + space_x
-                line_height = 0
-
-            if not test_only:
-                item.setGeometry(QtCore.QRect(QtCore.QPoint(x, y), item.sizeHint()))
-
-            x = next_x
-            line_height = max(line_height, item.sizeHint().height())
-
-        return y + line_height - rect.y()
+        # layout-spacing from the style is 1, see note in module
+        return width, spacing + 1, spacing + 1
+
+    def _update_sizes(self):
+        """
+        Queries size-hints after the layout was invalidated, and drops
+        positions from the first item with a changed size
+        """
+        if not self._sizes_changed:
+            return
+        self._sizes_changed = False
+        sizes = [get_size(item.sizeHint()) for item in self._item_list]
+        changed = next(
+            (i for i, (a, b) in enumerate(zip(sizes, self._sizes)) if a != b),
+            len(sizes),
+        )
+        del self._positions[changed:]
+        self._sizes = sizes
+        self._minimum_sizes = [get_size(item.minimumSize()) for item in self._item_list]
+
+    def _update_positions(self, width: int):
+        key = self._get_layout_key(width)
+        if key != self._layout_key:
+            self._positions = list()
+            self._layout_key = key
+        flow_positions(self._sizes, width, key[1], key[2], self._positions)
+
+    def _do_layout(self, rect, test_only):
+        self._update_sizes()
+        self._update_positions(rect.width())
+        if not test_only:
+            del self._geometries[len(self._item_list) :]
+            for i, (item, (x, y, _), (width, height)) in enumerate(
+                zip(self._item_list, self._positions, self._sizes)
+            ):
+                geometry = (rect.x() + x, rect.y() + y, width, height)
+                if i < len(self._geometries):
+                    if self._geometries[i] == geometry:
+                        continue
+                    self._geometries[i] = geometry
+                else:
+                    self._geometries.append(geometry)
+                item.setGeometry(QtCore.QRect(*geometry))
+
+        return get_flow_height(self._positions)
+
+
+def get_size(size: QtCore.QSize) -> Tuple[int, int]:
+    return size.width(), size.height()
+
+
+def benchmark(count: int = 10000, repeat: int = 20) -> dict:
+    """
+    Times laying out count fixed-size items: the first layout, resizes
+    to new widths, relayouts at the same width after invalidating, and
+    removing and adding an item in the middle. Returns milliseconds per
+    layout for each
+    """
+    layout = FlowLayout()
+    for _ in range(count):
+        layout.addItem(QtWidgets.QSpacerItem(250, 250))
+
+    def time_layout(prepare, widths) -> float:
+        start = time.perf_counter()
+        for width in widths:
+            prepare()
+            layout.heightForWidth(width)
+            layout.setGeometry(QtCore.QRect(0, 0, width, 0))
+        return (time.perf_counter() - start) * 1000.0 / len(widths)
+
+    def take_and_add():
+        layout.takeAt(count // 2)
+        layout.addItem(QtWidgets.QSpacerItem(250, 250))
+
+    return {
+        "first": time_layout(lambda: None, [1000]),
+        "resize": time_layout(lambda: None, range(1001, 1001 + repeat)),
+        "invalidated": time_layout(layout.invalidate, [1000 + repeat] * repeat),
+        "take_and_add": time_layout(take_and_add, [1000 + repeat] * repeat),
+    }
 
 
 if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)
+    if "--benchmark" in sys.argv:
+        for name, milliseconds in benchmark().items():
+            print(f"{name}: {milliseconds:.2f} ms")
+        sys.exit()
     main_win = TestWindow()
     main_win.show()
@@ -0,0 +1,127 @@
+"""
+Library-wide clock driving hover-playback of animation-previews.
+
+One timer ticks for all playing previews. On each tick, every preview is
+asked for the frame matching the wall-clock time since it started, so
+previews keep their speed when decoding is slow: frames that are late
+are skipped rather than queued. Previews that are hidden or scrolled out
+of view are not updated. Previews deleted while playing are dropped.
+"""
+
+from collections import deque
+from typing import Callable, Optional
+
+from PySide2 import QtCore
+
+from serial_animator import log
+
+_logger = log.log(__name__)
+# _logger.setLevel("DEBUG")
+
+TICK_INTERVAL = 10
+# seconds of shown frames the achieved fps is measured over
+FPS_WINDOW = 1.0
+
+
+def get_loop_frame(index: int, start_frame: int, end_frame: int) -> int:
+    """Gets the frame index frames into looping start_frame to end_frame"""
+    length = end_frame - start_frame + 1
+    return start_frame + index % max(length, 1)
+
+
+class PlaybackClock(QtCore.QObject):
+    """
+    Ticks playing previews. A preview has a frame_rate, and methods
+    show_playback_frame(index) taking the number of frames since it
+    started, and is_on_screen(). time_source gets the time in seconds,
+    by default from an elapsed-timer
+    """
+
+    def __init__(self, parent=None, time_source: Optional[Callable[[], float]] = None):
+        super(PlaybackClock, self).__init__(parent)
+        self._elapsed = QtCore.QElapsedTimer()
+        self._elapsed.start()
+        self._time_source = time_source
+        self._timer = QtCore.QTimer(self)
+        self._timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self._timer.setInterval(TICK_INTERVAL)
+        self._timer.timeout.connect(self.tick)
+        # start-time in seconds and last shown index by preview
+        self._previews = dict()
+        self._shown_times = deque()
+        self.frames_shown = 0
+        self.frames_dropped = 0
+
+    def get_time(self) -> float:
+        if self._time_source is not None:
+            return self._time_source()
+        return self._elapsed.elapsed() / 1000.0
+
+    def add(self, preview):
+        """Starts playing preview from its first frame"""
+        self._previews[preview] = [self.get_time(), -1]
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def remove(self, preview):
+        self._previews.pop(preview, None)
+        if not self._previews and self._timer.isActive():
+            self._timer.stop()
+            _logger.debug(f"Playback stopped: {self.get_stats()}")
+            self._shown_times.clear()
+
+    def is_playing(self, preview) -> bool:
+        return preview in self._previews
+
+    def tick(self):
+        """Shows the current frame of each playing preview that is on screen"""
+        now = self.get_time()
+        for preview, state in list(self._previews.items()):
+            start_time, last_index = state
+            try:
+                index = int((now - start_time) * preview.frame_rate)
+                if not preview.is_on_screen():
+                    # paused previews catch up without counting drops
+                    state[1] = index
+                    continue
+                if index == last_index:
+                    continue
+                preview.show_playback_frame(index)
+            except RuntimeError:
+                # the preview's widget was deleted while playing
+                _logger.debug("Dropped deleted preview")
+                self.remove(preview)
+                continue
+            if last_index >= 0:
+                # frames between the last shown and this one were late
+                self.frames_dropped += index - last_index - 1
+            state[1] = index
+            self.frames_shown += 1
+            self._shown_times.append(now)
+        while self._shown_times and self._shown_times[0] < now - FPS_WINDOW:
+            self._shown_times.popleft()
+
+    def get_fps(self) -> float:
+        """Gets the frames shown per second by each playing preview"""
+        if not self._previews:
+            return 0.0
+        return len(self._shown_times) / FPS_WINDOW / len(self._previews)
+
+    def get_stats(self) -> dict:
+        return {
+            "previews": len(self._previews),
+            "fps": self.get_fps(),
+            "frames_shown": self.frames_shown,
+            "frames_dropped": self.frames_dropped,
+        }
+
+
+_PLAYBACK_CLOCK: Optional[PlaybackClock] = None
+
+
+def get_playback_clock() -> PlaybackClock:
+    """Gets the library-wide playback-clock"""
+    global _PLAYBACK_CLOCK
+    if _PLAYBACK_CLOCK is None:
+        _PLAYBACK_CLOCK = PlaybackClock()
+    return _PLAYBACK_CLOCK
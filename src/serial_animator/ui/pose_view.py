@@ -1,7 +1,10 @@
-from PySide2 import QtCore, QtGui
+from functools import partial
+import os
+from PySide2 import QtCore, QtGui, QtWidgets
 from pathlib import Path
-from serial_animator.utils import Undo
+from serial_animator.utils import Undo, get_user_preference_dir
 import serial_animator.pose_io as pose_io
+import serial_animator.pose_cache as pose_cache
 from serial_animator.ui.utils import get_maya_main_window
 from serial_animator.ui.file_view import (
     FileLibraryView,
@@ -24,8 +27,8 @@ class PoseWidget(FilePreviewWidgetBase):
         path (Path): The path to the pose file.
     """
 
-    def __init__(self, path: Path):
-        super(PoseWidget, self).__init__(path)
+    def __init__(self, path: Path, preview=None):
+        super(PoseWidget, self).__init__(path, preview)
         self.mouse_start = QtCore.QPoint()
         self.start_pose = None
         self.target_pose = None
@@ -102,9 +105,14 @@ class PoseWidget(FilePreviewWidgetBase):
         if not self.nodes:
             self.nodes = pose_io.get_nodes()
         if not self.target_pose:
-            self.target_pose = pose_io.read_pose_data_to_nodes(self.path, self.nodes)
+            self.target_pose = pose_io.read_pose_data_to_nodes(
+                self.get_read_path(), self.nodes
+            )
         pose_io.interpolate(
-            target=self.target_pose, origin=self.start_pose, weight=weight
+            target=self.target_pose,
+            origin=self.start_pose,
+            weight=weight,
+            skip_unchanged=True,
         )
         pose_io.refresh_viewport()
 
@@ -115,14 +123,15 @@ class PoseWidgetHolder(FileWidgetHolderBase):
     FileType = pose_io.get_pose_filetype()
     DataWidgetClass = PoseWidget
 
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, populate: bool = True):
         """
         Initializes the PoseWidgetHolder object.
 
         Args:
             path: The path to the file to be loaded.
+            populate: If False, poses are added when populate() is called.
         """
-        super(PoseWidgetHolder, self).__init__(path)
+        super(PoseWidgetHolder, self).__init__(path, populate)
 
 
 class PoseLibraryView(FileLibraryView):
@@ -139,12 +148,24 @@ class PoseLibraryView(FileLibraryView):
         Args:
             parent (QWidget): The parent widget, if any.
         """
+        pose_cache.set_persist_dir(self.get_pose_cache_dir())
         super(PoseLibraryView, self).__init__(parent)
         self.save_grp.setTitle("Save Pose")
         self.save_line_edit.setPlaceholderText("Pose Name")
+        self.sparse_check_box = QtWidgets.QCheckBox("Only save non-default values")
+        self.sparse_check_box.setToolTip(
+            "Leaves out values equal to the attribute's default. "
+            "They are restored when the pose is applied"
+        )
+        self.save_layout.insertWidget(1, self.sparse_check_box)
         self.load_grp.setTitle("Load Pose")
         self.setWindowTitle("Pose Library")
 
+    @staticmethod
+    def get_pose_cache_dir() -> str:
+        """Gets directory decoded poses are persisted to between sessions"""
+        return os.path.join(get_user_preference_dir(), "SerialAnimator_PoseCache")
+
     def save_clicked(self):
         """
         Overrides the save_clicked method of the superclass.
@@ -164,15 +185,21 @@ class PoseLibraryView(FileLibraryView):
         """
         Overrides the save_data method of the superclass.
 
-        Saves the pose from the selected controls and updates the widget
-        from the newly saved file.
+        Captures the pose from the selected controls and queues saving
+        it. The widget is updated from the saved file when it is written.
 
         Args:
             img_path: The path to the image file to be saved.
         """
         out_path = self.get_out_path()
-        pose_io.save_pose_from_selection(out_path, img_path)
-        self.tab_widget.currentWidget().update_widget_from_path(out_path)
+        data, meta_data = pose_io.capture_pose_from_selection(
+            sparse=self.sparse_check_box.isChecked()
+        )
+        self.submit_save(
+            out_path,
+            partial(pose_io.save_data, out_path, data, img_path, meta_data),
+            img_path.parent,
+        )
         _logger.debug(img_path)
 
 
@@ -1,6 +1,12 @@
+from typing import Optional
+
 from PySide2 import QtWidgets
-import pymel.core as pm
+from maya import OpenMayaUI
+import shiboken2
 
 
-def get_maya_main_window() -> QtWidgets.QMainWindow:
-    return pm.uitypes.toPySideControl(pm.MelGlobals.get("gMainWindow"))
+def get_maya_main_window() -> Optional[QtWidgets.QMainWindow]:
+    pointer = OpenMayaUI.MQtUtil.mainWindow()
+    if pointer is None:
+        return None
+    return shiboken2.wrapInstance(int(pointer), QtWidgets.QMainWindow)
@@ -1,13 +1,18 @@
+from __future__ import annotations
+
 import uuid
 from pathlib import Path
 from PySide2 import QtWidgets, QtCore
-import pymel.core as pm
+import serial_animator.capture_policy as capture_policy
+from serial_animator.lazy_import import lazy_import
 from serial_animator.ui.utils import get_maya_main_window
 
 from serial_animator import log
 
 _logger = log.log(__name__)
 
+pm = lazy_import("pymel.core")
+
 
 def get_current_camera() -> pm.nodetypes.Transform:
     current_viewport_name = pm.playblast(activeEditor=True).split("|")[-1]
@@ -26,11 +31,14 @@ def unlock_cam_attributes(camera):
 
 class TmpViewport(QtWidgets.QWidget):
     snap_taken = QtCore.Signal(Path)
+    # emitted on closing, with whether a snap was taken
+    closed = QtCore.Signal(bool)
 
     def __init__(self, out_path, parent=get_maya_main_window()):
         _logger.debug("opening tmp viewport")
         super(TmpViewport, self).__init__(parent=parent)
         self.out_path = out_path
+        self.snapped = False
         self.setWindowFlags(QtCore.Qt.Window)
         self.setWindowModality(QtCore.Qt.WindowModal)
         layout = QtWidgets.QVBoxLayout()
@@ -76,6 +84,7 @@ class TmpViewport(QtWidgets.QWidget):
             filename=self.out_path,
             force=True,
         )
+        self.snapped = True
         self.snap_taken.emit(self.out_path)
         self.close()
 
@@ -85,6 +94,7 @@ class TmpViewport(QtWidgets.QWidget):
         if pm.objExists(self.cam):
             pm.delete(self.cam)
         super(TmpViewport, self).closeEvent(event)
+        self.closed.emit(self.snapped)
 
     def keyPressEvent(self, event):
 
@@ -138,20 +148,38 @@ class GeometryCurveViewGrabber(TmpViewport):
 
 
 class AnimationViewGrabber(GeometryViewGrabber):
-    def __init__(self, *args, start_frame=0, end_frame=10, step=1, **kwargs):
-        """Captures a frame-range as a .jpg sequence"""
+    def __init__(self, *args, start_frame=0, end_frame=10, policy=None, **kwargs):
+        """
+        Captures a frame-range as a .jpg sequence, within the frame-count,
+        size and quality of policy (see capture_policy)
+        """
         self.start_frame = start_frame
         self.end_frame = end_frame
-        self.step = step
+        self.policy = policy or capture_policy.get_policy()
         super().__init__(*args, **kwargs)
 
+    def get_panel_size(self) -> tuple:
+        control = pm.modelPanel(self.model_panel, query=True, control=True)
+        width = pm.control(control, query=True, width=True)
+        height = pm.control(control, query=True, height=True)
+        return width, height
+
     def capture(self):
         pm.setFocus(self.model_panel)
-        frames = range(self.start_frame, self.end_frame, self.step)
+        frames = capture_policy.sample_frames(
+            self.start_frame, self.end_frame, self.policy["max_frames"]
+        )
+        width, height = capture_policy.get_capture_size(
+            *self.get_panel_size(), self.policy["size"]
+        )
+        _logger.debug(f"Capturing {len(frames)} frames at {width}x{height}")
         pm.playblast(
             filename=self.out_path,
             frame=frames,
             compression="jpg",
+            quality=self.policy["quality"],
+            widthHeight=(width, height),
+            percent=100,
             clearCache=True,
             format="image",
             offScreen=True,
@@ -159,5 +187,6 @@ class AnimationViewGrabber(GeometryViewGrabber):
             showOrnaments=False,
             viewer=False,
         )
+        self.snapped = True
         self.snap_taken.emit(self.out_path)
         self.close()
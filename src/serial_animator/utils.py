@@ -1,5 +1,5 @@
 import functools
-import pymel.core as pm
+from maya import cmds
 
 
 class ContextDecorator(object):
@@ -30,7 +30,7 @@ class ContextDecorator(object):
 
 
 def get_user_preference_dir() -> str:
-    return pm.internalVar(userPrefDir=True)
+    return cmds.internalVar(userPrefDir=True)
 
 
 def setup_scene_opened_callback(function, parent=None) -> int:
@@ -38,9 +38,9 @@ def setup_scene_opened_callback(function, parent=None) -> int:
     Sets up a callback when new scene is opened and returns scriptJob-id
     """
     if parent:
-        return pm.scriptJob(parent=parent, event=["SceneOpened", function])
+        return cmds.scriptJob(parent=parent, event=["SceneOpened", function])
     else:
-        return pm.scriptJob(event=["SceneOpened", function])
+        return cmds.scriptJob(event=["SceneOpened", function])
 
 
 class Undo(ContextDecorator):
@@ -54,26 +54,29 @@ class Undo(ContextDecorator):
 
     def __init__(self, name="PythonAction", undoable=True, **kwargs):
         super(Undo, self).__init__(**kwargs)
-        self.orig_state = pm.undoInfo(query=True, state=True)
+        self.orig_state = None
         self.state = undoable
         self.name = name
 
     def __enter__(self):
+        # queried here rather than on creation, so decorated functions
+        # can be defined outside a Maya session
+        self.orig_state = cmds.undoInfo(query=True, state=True)
         if self.state:
-            pm.undoInfo(
+            cmds.undoInfo(
                 openChunk=True,
                 chunkName=self.name,
                 undoName=self.name,
                 redoName=self.name,
             )
         else:
-            pm.undoInfo(stateWithoutFlush=False)
+            cmds.undoInfo(stateWithoutFlush=False)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.state:
-            pm.undoInfo(closeChunk=True)
+            cmds.undoInfo(closeChunk=True)
         else:
-            pm.undoInfo(state=self.orig_state)
+            cmds.undoInfo(state=self.orig_state)
 
 
 def is_interactive() -> bool:
@@ -82,7 +85,7 @@ def is_interactive() -> bool:
     # expected...but running mayapy.exe returns the same as normal
     # gui mode (2023.2)
     try:
-        if pm.about(batch=True):
+        if cmds.about(batch=True):
             return False
     except AttributeError:
         return False
@@ -1,8 +1,12 @@
+from collections import OrderedDict
+import json
 from pathlib import Path
 import pytest
 from pymel import core as pm
 import shutil
 
+from serial_animator.file_io import archive_files
+
 
 @pytest.fixture()
 def get_test_data_dir():
@@ -29,6 +33,76 @@ def preview_sequence(tmp_path, data_preview):
     return preview_path
 
 
+@pytest.fixture()
+def write_archive(tmp_path):
+    """
+    Gets a function writing a plain archive at tmp_path / name, with a
+    json-member per item in members, like
+    write_archive("a.pose", {"pose.json": pose, "meta_data.json": meta_data})
+    """
+
+    def write(name: str, members: dict) -> Path:
+        member_dir = tmp_path / "members" / name
+        member_dir.mkdir(parents=True)
+        paths = list()
+        for member_name, data in members.items():
+            paths.append(member_dir / member_name)
+            paths[-1].write_text(json.dumps(data))
+        return archive_files(paths, tmp_path / name)
+
+    return write
+
+
+@pytest.fixture()
+def make_key_data():
+    """
+    Gets a function making key-data as stored in anim-archives,
+    {time: (value, tangent)}, with the same tangent on every key
+    """
+
+    def make(
+        times,
+        values=None,
+        in_type="auto",
+        out_type="auto",
+        angle=0.0,
+        weight=1.0,
+    ) -> OrderedDict:
+        values = [0.0] * len(times) if values is None else values
+        tangent = (angle, angle, weight, weight, in_type, out_type, True, False)
+        key_data = OrderedDict()
+        for time, value in zip(times, values):
+            key_data[float(time)] = (float(value), tangent)
+        return key_data
+
+    return make
+
+
+@pytest.fixture()
+def make_attribute_data(make_key_data):
+    """
+    Gets a function making the anim-data of one attribute, keyword
+    arguments not listed are passed on to make_key_data
+    """
+
+    def make(
+        times,
+        values=None,
+        attribute_type="doubleLinear",
+        weighted_tangents=False,
+        **kwargs,
+    ) -> dict:
+        return {
+            "attributeType": attribute_type,
+            "preInfinity": "constant",
+            "postInfinity": "constant",
+            "weightedTangents": weighted_tangents,
+            "keys": make_key_data(times, values, **kwargs),
+        }
+
+    return make
+
+
 @pytest.fixture()
 def cube_keyable_data(scope="function"):
     return {
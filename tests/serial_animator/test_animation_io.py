@@ -2,6 +2,8 @@ from pathlib import Path
 import pytest
 import pymel.core as pm
 import serial_animator.animation_io as animation_io
+import serial_animator.archive_header as archive_header
+import serial_animator.curve_evaluation as curve_evaluation
 import logging
 
 from serial_animator import log
@@ -83,6 +85,33 @@ def test_load_animation(caplog, keyed_cube, preview_sequence, tmp_path):
     assert animation_io.has_animation(cube)
 
 
+def test_load_animation_transformed(keyed_cube, preview_sequence, tmp_path):
+    data_path = tmp_path / "keyed_cube.anim"
+    pm.select(keyed_cube)
+    pm.playbackOptions(min=0, max=20)
+    animation_io.save_animation_from_selection(data_path, preview_sequence)
+    pm.newFile(force=True)
+    cube = pm.polyCube(constructionHistory=False)[0]
+    animation_io.load_animation(path=data_path, nodes=[cube], offset=5, start=0)
+    assert list(animation_io.get_key_data(cube.tx).keys()) == [5.0, 15.0]
+    animation_io.load_animation(path=data_path, nodes=[cube], start=0, end=0)
+    assert 0.0 in animation_io.get_key_data(cube.tx)
+
+
+def test_load_chunked_animation(keyed_cube, preview_sequence, tmp_path):
+    data_path = tmp_path / "keyed_cube_chunked.anim"
+    pm.select(keyed_cube)
+    pm.playbackOptions(min=0, max=20)
+    animation_io.save_animation_from_selection(
+        data_path, preview_sequence, chunked=True, block_size=4
+    )
+    expected = animation_io.get_node_data(keyed_cube)
+    pm.newFile(force=True)
+    cube = pm.polyCube(constructionHistory=False)[0]
+    animation_io.load_animation(path=data_path, nodes=[cube])
+    assert animation_io.get_node_data(cube) == expected
+
+
 def test_set_node_data(caplog, keyed_cube):
     data = animation_io.get_node_data(keyed_cube)
     pm.newFile(force=True)
@@ -99,6 +128,16 @@ def test_set_node_data(caplog, keyed_cube):
         animation_io.set_node_data(new_cube, data)
 
 
+def test_set_node_data_skip_unchanged(keyed_cube):
+    data = animation_io.get_node_data(keyed_cube)
+    stats = animation_io.set_node_data(keyed_cube, data, skip_unchanged=True)
+    assert stats == {"written": 0, "skipped": 2}
+    pm.setKeyframe(keyed_cube, value=5, time=10, attribute="translateX")
+    stats = animation_io.set_node_data(keyed_cube, data, skip_unchanged=True)
+    assert stats == {"written": 1, "skipped": 1}
+    assert animation_io.get_node_data(keyed_cube) == data
+
+
 def test_get_nodes(keyed_cube, cube):
     pm.select(cube)
     assert len(animation_io.get_nodes_with_animation()) == 0
@@ -111,11 +150,14 @@ def test_save_animation_from_selection(tmp_path, preview_sequence, keyed_cube):
     pm.select(keyed_cube)
     result = animation_io.save_animation_from_selection(out_path, preview_sequence)
     assert result.is_file()
+    header = archive_header.read_header(result)
+    assert header["kind"] == "anim"
+    assert animation_io.extract_meta_data(result) == header["meta_data"]
 
 
 def test_get_selection(cube):
     pm.select(cube)
-    assert animation_io.get_selection() == [cube]
+    assert animation_io.get_selection() == [cube.fullPath()]
 
 
 def test_extract_meta_data(cube_anim_file):
@@ -125,6 +167,15 @@ def test_extract_meta_data(cube_anim_file):
     assert meta_data.get("time_unit") == 25.0
 
 
+def test_iter_animation_data(cube_anim_file):
+    data = animation_io.read_animation_data(cube_anim_file)
+    assert dict(animation_io.iter_animation_data(cube_anim_file)) == data
+    assert list(animation_io.iter_animation_data(cube_anim_file, ["|other"])) == []
+    for _, node_data in animation_io.iter_animation_data(cube_anim_file, end=10):
+        for attribute_data in node_data.values():
+            assert max(attribute_data["keys"].keys()) <= 10
+
+
 @pytest.fixture()
 def keyed_cube():
     cube = pm.polyCube(constructionHistory=False)[0]
@@ -147,3 +198,39 @@ def keyed_cube():
     pm.setKeyframe(cube, value=10, time=10, attribute="translateX")
     pm.keyTangent(cube.tx, time=10, inTangentType="flat", outTangentType="auto")
     yield cube
+
+
+def test_load_sampled_animation(preview_sequence, tmp_path):
+    cube = pm.polyCube(constructionHistory=False)[0]
+    for frame in range(10):
+        pm.setKeyframe(cube, value=frame * frame, time=frame, attribute="translateX")
+    pm.keyTangent(cube.tx, inTangentType="linear", outTangentType="linear")
+    pm.playbackOptions(min=0, max=9)
+    data_path = tmp_path / "sampled.anim"
+    pm.select(cube)
+    animation_io.save_animation_from_selection(
+        data_path, preview_sequence, sampled=True
+    )
+    data = animation_io.read_animation_data(data_path)
+    assert "samples" in next(iter(data.values()))["tx"]
+    pm.newFile(force=True)
+    cube = pm.polyCube(constructionHistory=False)[0]
+    animation_io.load_animation(path=data_path, nodes=[cube])
+    key_data = animation_io.get_key_data(cube.tx)
+    assert list(key_data.keys()) == [float(f) for f in range(10)]
+    assert key_data[3.0][0] == pytest.approx(9.0)
+
+
+def test_evaluate_against_scene():
+    cube = pm.polyCube(constructionHistory=False)[0]
+    for frame, value in [(0, 0), (6, 4), (13, -2), (20, 1)]:
+        pm.setKeyframe(cube, value=value, time=frame, attribute="translateX")
+    pm.keyTangent(cube.tx, time=(13, 13), outTangentType="step")
+    pm.setInfinity(cube.tx, preInfinity="linear", postInfinity="oscillate")
+    attribute_data = animation_io.get_attribute_data(cube.tx)
+    times = [-4, 0, 2.5, 6, 9.25, 13, 16, 20, 27.5, 45]
+    values = curve_evaluation.evaluate_attribute_data(
+        attribute_data, times, animation_io.get_time_unit()
+    )
+    for time, value in zip(times, values):
+        assert value == pytest.approx(cube.tx.get(time=time), abs=1e-4)
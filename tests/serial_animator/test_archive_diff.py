@@ -0,0 +1,152 @@
+from collections import OrderedDict
+import copy
+import json
+import pytest
+import serial_animator.archive_diff as archive_diff
+import serial_animator.chunked_archive as chunked_archive
+
+LINEAR = {"in_type": "linear", "out_type": "linear"}
+
+
+def test_diff_data_unchanged(anim_data):
+    report = archive_diff.diff_data("anim", anim_data, copy.deepcopy(anim_data))
+    assert not archive_diff.has_differences(report)
+    assert report["unchanged"] == 2
+
+
+def test_diff_data(anim_data):
+    other = copy.deepcopy(anim_data)
+    del other["|node"]["ty"]
+    other["|node"]["tz"] = anim_data["|node"]["tx"]
+    keys = other["|node"]["tx"]["keys"]
+    keys.pop(3.0)
+    keys[4.0] = (10.0, keys[4.0][1])
+    report = archive_diff.diff_data("anim", anim_data, other)
+    assert report["added"] == ["|node.tz"]
+    assert report["removed"] == ["|node.ty"]
+    channel_diff = report["changed"]["|node.tx"]
+    assert channel_diff["removed_times"] == [3.0]
+    assert channel_diff["added_times"] == []
+    assert channel_diff["max_deviation"] == pytest.approx(6.0)
+    assert 0 < channel_diff["rms_deviation"] < channel_diff["max_deviation"]
+
+
+def test_diff_settings(anim_data):
+    other = copy.deepcopy(anim_data)
+    other["|node"]["tx"]["postInfinity"] = "cycle"
+    report = archive_diff.diff_data("anim", anim_data, other)
+    assert report["changed"]["|node.tx"]["settings"] == {
+        "postInfinity": ["constant", "cycle"]
+    }
+
+
+def test_diff_pose():
+    pose = {"|node": {"tx": 1.0, "v": True}}
+    report = archive_diff.diff_data("pose", pose, {"|node": {"tx": 1.5, "v": True}})
+    assert list(report["changed"]) == ["|node.tx"]
+    assert report["changed"]["|node.tx"]["max_deviation"] == 0.5
+
+
+def test_diff_one_sided(anim_data):
+    other = copy.deepcopy(anim_data)
+    other["|node"]["ty"]["keys"] = OrderedDict()
+    report = archive_diff.diff_data("anim", anim_data, other)
+    channel_diff = report["changed"]["|node.ty"]
+    assert channel_diff["one_sided"]
+    assert channel_diff["max_deviation"] is None
+    assert "~ |node.ty keys +0 -10 one-sided" in archive_diff.format_report(
+        dict(report, a="a", b="b")
+    )
+
+
+def test_diff_pose_not_numbers():
+    pose = {"|node": {"rotateOrder": "xyz"}}
+    report = archive_diff.diff_data("pose", pose, {"|node": {"rotateOrder": "zyx"}})
+    channel_diff = report["changed"]["|node.rotateOrder"]
+    assert channel_diff["max_deviation"] is None
+    assert channel_diff["values"] == ["xyz", "zyx"]
+    text = archive_diff.format_report(dict(report, a="a", b="b"), as_json=True)
+    assert "Infinity" not in text
+
+
+def test_split_json_object():
+    raw = b' {"|a\\"{": {"x": [1, "]"], "y": {"z": 1}}, "|b": {}} '
+    assert archive_diff.split_json_object(raw) == {
+        '|a"{': (b'{"x": [1, "]"], "y": {"z": 1}}', 2),
+        "|b": (b"{}", 0),
+    }
+    assert archive_diff.split_json_object(b"{ }") == {}
+    with pytest.raises(json.JSONDecodeError):
+        archive_diff.split_json_object(b'{"|a": {}')
+
+
+def test_diff_archives(tmp_path, write_archive, anim_data):
+    other = copy.deepcopy(anim_data)
+    keys = other["|node"]["tx"]["keys"]
+    keys[0.0] = (1.0, keys[0.0][1])
+    path_a = write_archive("a.anim", anim_members(anim_data))
+    path_b = chunked_archive.write_chunked_archive(
+        tmp_path / "b.anim", other, {"time_unit": 24.0}, []
+    )
+    report = archive_diff.diff_archives(path_a, path_b)
+    assert list(report["changed"]) == ["|node.tx"]
+    text = archive_diff.format_report(report)
+    assert "~ |node.tx max 1" in text
+    assert json.loads(archive_diff.format_report(report, as_json=True)) == report
+
+
+def test_diff_large_archives(monkeypatch, write_archive, large_anim_data):
+    other = copy.deepcopy(large_anim_data)
+    keys = other["|node_0"]["tx"]["keys"]
+    keys[500.0] = (0.0, keys[500.0][1])
+    path_a = write_archive("a.anim", anim_members(large_anim_data))
+    path_b = write_archive("b.anim", anim_members(other))
+    decoded = list()
+    diff_data = archive_diff.diff_data
+
+    def decode_spy(kind, data_a, data_b, **kwargs):
+        decoded.append(list(data_a))
+        return diff_data(kind, data_a, data_b, **kwargs)
+
+    monkeypatch.setattr(archive_diff, "diff_data", decode_spy)
+    report = archive_diff.diff_archives(path_a, path_b)
+    # only the node whose json differs is decoded
+    assert decoded == [["|node_0"]]
+    assert list(report["changed"]) == ["|node_0.tx"]
+    assert report["unchanged"] == 99
+    assert json.loads(json.dumps(report)) == report
+
+
+def test_diff_archives_one_sided(write_archive, anim_data):
+    other = copy.deepcopy(anim_data)
+    other["|node_1"] = other.pop("|node")
+    path_a = write_archive("a.anim", anim_members(anim_data))
+    path_b = write_archive("b.anim", anim_members(other))
+    report = archive_diff.diff_archives(path_a, path_b)
+    assert report["added"] == ["|node_1.tx", "|node_1.ty"]
+    assert report["removed"] == ["|node.tx", "|node.ty"]
+    assert report["unchanged"] == 0
+
+
+def anim_members(anim_data):
+    return {"meta_data.json": {"time_unit": 24.0}, "anim_data.json": anim_data}
+
+
+@pytest.fixture()
+def anim_data(make_attribute_data):
+    return {
+        "|node": {
+            "tx": make_attribute_data(range(10), range(10), **LINEAR),
+            "ty": make_attribute_data(range(10), **LINEAR),
+        }
+    }
+
+
+@pytest.fixture()
+def large_anim_data(make_attribute_data):
+    # 100 curves of 1000 keys
+    frames = range(1000)
+    return {
+        f"|node_{i}": {"tx": make_attribute_data(frames, frames, **LINEAR)}
+        for i in range(100)
+    }
@@ -0,0 +1,93 @@
+import json
+import tarfile
+import serial_animator.archive_header as archive_header
+import serial_animator.chunked_archive as chunked_archive
+
+
+def test_write_archive(tmp_path, data_preview):
+    json_file = tmp_path / "anim_data.json"
+    json_file.write_text("{}")
+    out_path = archive_header.write_archive(
+        tmp_path / "out.anim",
+        [data_preview, json_file],
+        {"frame_range": [1, 10]},
+        kind="anim",
+        poster=data_preview,
+    )
+    with tarfile.open(out_path) as tf:
+        assert tf.getnames() == ["header.json", data_preview.name, json_file.name]
+    header, poster = archive_header.read_header_and_poster(out_path)
+    assert header["version"] == archive_header.HEADER_VERSION
+    assert header["kind"] == "anim"
+    assert header["meta_data"] == {"frame_range": [1, 10]}
+    assert poster == data_preview.read_bytes()
+
+
+def test_read_beyond_buffer(tmp_path, data_preview):
+    meta_data = {"nodes": [f"|node_{i}" for i in range(1000)]}
+    out_path = archive_header.write_archive(
+        tmp_path / "out.pose", [], meta_data, kind="pose", poster=data_preview
+    )
+    header, poster = archive_header.read_header_and_poster(out_path, read_size=1024)
+    assert header["meta_data"] == meta_data
+    assert poster == data_preview.read_bytes()
+
+
+def test_write_archive_from_memory(tmp_path, data_preview):
+    poster = ("preview_250.jpg", data_preview.read_bytes())
+    out_path = archive_header.write_archive(
+        tmp_path / "out.pose",
+        [("pose.json", iter([b"{", b"}"])), poster, data_preview],
+        {},
+        kind="pose",
+        poster=poster,
+    )
+    with tarfile.open(out_path) as tf:
+        assert tf.getnames() == [
+            "header.json",
+            "preview_250.jpg",
+            "pose.json",
+            data_preview.name,
+        ]
+        assert tf.extractfile("pose.json").read() == b"{}"
+    header, poster_data = archive_header.read_header_and_poster(out_path)
+    assert header["poster"]["name"] == "preview_250.jpg"
+    assert poster_data == poster[1]
+
+
+def test_without_poster(tmp_path):
+    out_path = archive_header.write_archive(tmp_path / "out.pose", [], {}, "pose")
+    header, poster = archive_header.read_header_and_poster(out_path)
+    assert header["poster"] is None
+    assert poster is None
+
+
+def test_read_header_without_header(cube_anim_file, tmp_path):
+    assert archive_header.read_header(cube_anim_file) is None
+    not_tar = tmp_path / "not_tar.anim"
+    not_tar.write_text("nothing")
+    assert archive_header.read_header(not_tar) is None
+
+
+def test_newer_version(tmp_path):
+    out_path = tmp_path / "out.anim"
+    payload = json.dumps({"version": archive_header.HEADER_VERSION + 1}).encode()
+    with tarfile.open(out_path, "w") as tf:
+        archive_header.add_members(
+            tf, [(archive_header.get_tar_info("header.json", len(payload)), payload)]
+        )
+    assert archive_header.read_header(out_path) is None
+
+
+def test_chunked_header(tmp_path, data_preview):
+    out_path = chunked_archive.write_chunked_archive(
+        tmp_path / "chunked.anim",
+        {},
+        {"nodes": []},
+        [data_preview],
+        poster=data_preview,
+    )
+    header, poster = archive_header.read_header_and_poster(out_path)
+    assert header["layout"] == "chunked"
+    assert poster == data_preview.read_bytes()
+    assert chunked_archive.is_chunked_archive(out_path)
@@ -0,0 +1,55 @@
+import json
+import serial_animator.archive_info as archive_info
+import serial_animator.chunked_archive as chunked_archive
+
+
+def test_read_archive_info(cube_anim_file):
+    info = archive_info.read_archive_info(cube_anim_file)
+    assert info["kind"] == "anim"
+    assert info["layout"] == "flat"
+    assert info["nodes"] == 1
+    assert info["size"] == cube_anim_file.stat().st_size
+    assert info["frame_range"] == info["meta_data"]["frame_range"]
+
+
+def test_read_chunked_archive_info(tmp_path):
+    path = chunked_archive.write_chunked_archive(
+        tmp_path / "chunked.anim", {}, {"nodes": [], "frame_range": [1, 10]}, []
+    )
+    info = archive_info.read_archive_info(path)
+    assert info["layout"] == "chunked"
+    assert info["nodes"] == 0
+    assert info["frame_range"] == [1, 10]
+
+
+def test_find_archives(tmp_path, cube_anim_file):
+    for directory in ["a", "a/b", "c"]:
+        (tmp_path / directory).mkdir()
+        (tmp_path / directory / "test.anim").write_bytes(cube_anim_file.read_bytes())
+        (tmp_path / directory / "test.txt").write_text("")
+    archives = archive_info.find_archives([tmp_path])
+    assert [a.relative_to(tmp_path).as_posix() for a in archives] == [
+        "a/b/test.anim",
+        "a/test.anim",
+        "c/test.anim",
+    ]
+
+
+def test_read_archive_infos(tmp_path, write_archive, cube_anim_file):
+    (tmp_path / "broken.pose").write_text("not a tar-file")
+    pose_path = write_archive(
+        "out.pose", {"pose.json": {}, "meta_data.json": {"nodes": ["|a", "|b"]}}
+    )
+    infos = archive_info.read_archive_infos([tmp_path, cube_anim_file])
+    by_name = {i["path"]: i for i in infos}
+    assert "error" in by_name[str(tmp_path / "broken.pose")]
+    assert by_name[str(pose_path)]["nodes"] == 2
+    assert by_name[str(cube_anim_file)]["nodes"] == 1
+
+
+def test_format_infos(cube_anim_file):
+    infos = [archive_info.read_archive_info(cube_anim_file)]
+    lines = archive_info.format_infos(infos).splitlines()
+    assert lines[0].split() == ["KIND", "NODES", "FRAME_RANGE", "SIZE", "PATH"]
+    assert lines[1].startswith("anim")
+    assert json.loads(archive_info.format_infos(infos, as_json=True)) == infos
@@ -0,0 +1,33 @@
+import serial_animator.capture_policy as capture_policy
+
+
+def test_sample_frames():
+    assert capture_policy.sample_frames(1, 5, 10) == [1, 2, 3, 4, 5]
+    frames = capture_policy.sample_frames(1, 1000, 120)
+    assert len(frames) == 120
+    assert frames[0] == 1 and frames[-1] == 1000
+    assert frames == sorted(set(frames))
+    assert capture_policy.sample_frames(10, 20, 1) == [10]
+
+
+def test_get_capture_size():
+    assert capture_policy.get_capture_size(1000, 500, 250) == (250, 125)
+    assert capture_policy.get_capture_size(300, 600, 250) == (125, 250)
+    assert capture_policy.get_capture_size(200, 100, 250) == (200, 100)
+
+
+def test_get_sampled_frame():
+    frames = [1, 10, 19]
+    assert capture_policy.get_sampled_frame(frames, 1) == 1
+    assert capture_policy.get_sampled_frame(frames, 9) == 1
+    assert capture_policy.get_sampled_frame(frames, 25) == 19
+    assert capture_policy.get_sampled_frame(frames, 0) is None
+
+
+def test_get_policy():
+    policy = capture_policy.get_policy(max_frames=0, size=96)
+    assert policy == {
+        "max_frames": 1,
+        "size": 96,
+        "quality": capture_policy.CAPTURE_QUALITY,
+    }
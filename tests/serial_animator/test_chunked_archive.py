@@ -0,0 +1,78 @@
+import pytest
+import serial_animator.chunked_archive as chunked_archive
+import serial_animator.sampled_channels as sampled_channels
+
+
+def test_split_node_data(anim_path_data):
+    attributes, blocks = chunked_archive.split_node_data(
+        anim_path_data["|node_0"], block_size=256
+    )
+    assert "keys" not in attributes["tx"]
+    assert attributes["tx"]["preInfinity"] == "constant"
+    assert sorted(blocks) == [0, 1, 2, 3]
+    assert len(blocks[0]["tx"]) == 256
+
+
+def test_write_chunked_archive(chunked_file, anim_path_data):
+    assert chunked_archive.is_chunked_archive(chunked_file)
+    data = dict(chunked_archive.iter_chunked_animation_data(chunked_file))
+    assert list(data.keys()) == list(anim_path_data.keys())
+    keys = data["|node_1"]["tx"]["keys"]
+    assert len(keys) == 1000
+    assert keys["999.0"] == [499.5, [0.0, 0.0, 1.0, 1.0, "auto", "auto", True, False]]
+
+
+def test_is_chunked_archive(cube_anim_file):
+    assert chunked_archive.is_chunked_archive(cube_anim_file) is False
+
+
+def test_partial_read(chunked_file):
+    data = dict(
+        chunked_archive.iter_chunked_animation_data(
+            chunked_file, node_names=["|node_2"], start=300, end=400
+        )
+    )
+    assert list(data.keys()) == ["|node_2"]
+    times = [float(t) for t in data["|node_2"]["tx"]["keys"]]
+    # only the block holding frames 256-511 is read
+    assert min(times) == 256
+    assert max(times) == 511
+
+
+def test_chunk_overlaps():
+    assert chunked_archive.chunk_overlaps([0, 256], 0, 10)
+    assert not chunked_archive.chunk_overlaps([0, 256], 256, 300)
+    assert not chunked_archive.chunk_overlaps([256, 512], 0, 255)
+    assert chunked_archive.chunk_overlaps([256, 512])
+
+
+def test_sampled_chunks(tmp_path, anim_path_data, data_preview):
+    sampled_data = sampled_channels.sample_anim_data(anim_path_data)
+    out_path = chunked_archive.write_chunked_archive(
+        tmp_path / "sampled.anim", sampled_data, {}, [data_preview], block_size=256
+    )
+    data = dict(chunked_archive.iter_chunked_animation_data(out_path))
+    assert data["|node_0"]["tx"]["samples"] == sampled_data["|node_0"]["tx"]["samples"]
+    assert "keys" not in data["|node_0"]["tx"]
+    data = dict(chunked_archive.iter_chunked_animation_data(out_path, start=300))
+    samples = data["|node_0"]["tx"]["samples"]
+    assert samples["start"] == 256.0
+    assert samples["count"] == 1000 - 256
+
+
+@pytest.fixture()
+def anim_path_data(make_attribute_data):
+    frames = range(1000)
+    data = dict()
+    for i in range(3):
+        values = [frame * 0.5 for frame in frames]
+        data[f"|node_{i}"] = {"tx": make_attribute_data(frames, values)}
+    return data
+
+
+@pytest.fixture()
+def chunked_file(tmp_path, anim_path_data, data_preview):
+    out_path = tmp_path / "chunked.anim"
+    return chunked_archive.write_chunked_archive(
+        out_path, anim_path_data, {"nodes": list(anim_path_data)}, [data_preview]
+    )
@@ -0,0 +1,32 @@
+import json
+import pytest
+from serial_animator import cli
+
+
+def test_diff_command(write_archive, capsys):
+    path_a = write_archive("a.pose", {"pose.json": {"|node": {"tx": 1.0}}})
+    path_b = write_archive("b.pose", {"pose.json": {"|node": {"tx": 2.0}}})
+    assert cli.main(["diff", str(path_a), str(path_a)]) == 0
+    capsys.readouterr()
+    assert cli.main(["diff", str(path_a), str(path_b), "--json"]) == 1
+    report = json.loads(capsys.readouterr().out)
+    assert list(report["changed"]) == ["|node.tx"]
+
+
+def test_ls_command(cube_anim_file, capsys):
+    assert cli.main(["ls", str(cube_anim_file.parent)]) == 0
+    out = capsys.readouterr().out
+    assert cube_anim_file.name in out
+    assert cli.main(["ls", str(cube_anim_file), "--json"]) == 0
+    infos = json.loads(capsys.readouterr().out)
+    assert infos[0]["nodes"] == 1
+
+
+def test_inspect_command(cube_anim_file, capsys):
+    assert cli.main(["inspect", str(cube_anim_file)]) == 0
+    assert "layout: flat" in capsys.readouterr().out
+
+
+def test_missing_command():
+    with pytest.raises(SystemExit):
+        cli.main([])
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+import serial_animator.curve_evaluation as curve_evaluation
+import serial_animator.sampled_channels as sampled_channels
+from serial_animator.key_arrays import KeyArrays, slope_to_angle
+
+FPS = 24.0
+
+
+@pytest.fixture()
+def make_keys(make_key_data):
+    def make(times, values, tangent_type="fixed", **kwargs):
+        key_data = make_key_data(
+            times, values, in_type=tangent_type, out_type=tangent_type, **kwargs
+        )
+        return KeyArrays.from_key_data(key_data)
+
+    return make
+
+
+def test_evaluate_linear(make_keys):
+    keys = make_keys([0, 10], [0, 10], angle=slope_to_angle(1.0, FPS))
+    values = curve_evaluation.evaluate_keys(keys, [0, 2.5, 10], FPS)
+    assert values == pytest.approx([0, 2.5, 10])
+
+
+def test_evaluate_flat(make_keys):
+    keys = make_keys([0, 10], [0, 10])
+    values = curve_evaluation.evaluate_keys(keys, [0, 5, 10], FPS)
+    assert values == pytest.approx([0, 5, 10])
+    # flat tangents ease in and out
+    assert curve_evaluation.evaluate_keys(keys, [2], FPS)[0] < 2
+
+
+def test_evaluate_step(make_keys):
+    keys = make_keys([0, 10, 20], [0, 10, 20], tangent_type="step")
+    values = curve_evaluation.evaluate_keys(keys, [0, 5, 9.9, 10, 15], FPS)
+    assert values == pytest.approx([0, 0, 0, 10, 10])
+    keys = make_keys([0, 10], [0, 10], tangent_type="stepnext")
+    values = curve_evaluation.evaluate_keys(keys, [0, 0.1, 10], FPS)
+    assert values == pytest.approx([0, 10, 10])
+
+
+def test_evaluate_weighted(make_keys):
+    # weights giving control-points a third of the segment away match
+    # the non-weighted hermite-curve
+    angle = 30.0
+    weight = 10 / FPS / np.cos(np.radians(angle))
+    keys = make_keys([0, 10], [0, 3], angle=angle, weight=weight)
+    times = np.linspace(0, 10, 11)
+    weighted = curve_evaluation.evaluate_keys(keys, times, FPS, weighted=True)
+    hermite = curve_evaluation.evaluate_keys(keys, times, FPS)
+    assert weighted == pytest.approx(hermite, abs=1e-6)
+
+
+@pytest.mark.parametrize(
+    "infinity,expected",
+    [
+        ("constant", [0, 10, 10]),
+        ("linear", [-5, 15, 25]),
+        ("cycle", [5, 5, 5]),
+        ("cycleRelative", [-5, 15, 25]),
+        ("oscillate", [5, 5, 5]),
+    ],
+)
+def test_evaluate_infinity(infinity, expected, make_keys):
+    keys = make_keys([0, 10], [0, 10], angle=slope_to_angle(1.0, FPS))
+    values = curve_evaluation.evaluate_keys(
+        keys, [-5, 15, 25], FPS, pre_infinity=infinity, post_infinity=infinity
+    )
+    assert values == pytest.approx(expected)
+
+
+def test_evaluate_oscillate(make_keys):
+    keys = make_keys([0, 10], [0, 10], angle=slope_to_angle(1.0, FPS))
+    values = curve_evaluation.evaluate_keys(
+        keys, [12, 18, 22], FPS, post_infinity="oscillate"
+    )
+    assert values == pytest.approx([8, 2, 2])
+
+
+def test_evaluate_single_key(make_keys):
+    keys = make_keys([5], [3])
+    assert curve_evaluation.evaluate_keys(keys, [0, 5, 10], FPS) == pytest.approx(
+        [3, 3, 3]
+    )
+
+
+def test_evaluate_samples():
+    samples = sampled_channels.make_samples(0, 1, [0, 2, 4])
+    values = curve_evaluation.evaluate_samples(samples, [-1, 0.5, 5])
+    assert values == pytest.approx([0, 1, 4])
+    samples = sampled_channels.make_samples(0, 1, [0, 2, 4], sampled_channels.STEP)
+    values = curve_evaluation.evaluate_samples(samples, [0.5, 1.5])
+    assert values == pytest.approx([0, 2])
+
+
+def test_sample_attribute_data(make_attribute_data):
+    attribute_data = make_attribute_data(
+        np.arange(0, 1000, 10), np.arange(100), in_type="fixed", out_type="fixed"
+    )
+    times, values = curve_evaluation.sample_attribute_data(
+        attribute_data, FPS, step=0.1
+    )
+    assert len(times) == 9901
+    assert values[0] == 0
+    assert values[-1] == 99
@@ -1,4 +1,7 @@
+import io
+import json
 from pathlib import Path
+import tarfile
 import pytest
 import serial_animator.file_io
 import logging
@@ -38,6 +41,83 @@ def test_read_data_from_archive(tmp_archive, cube_keyable_data):
     assert data == cube_keyable_data
 
 
+def test_read_json_members_from_archive(tmp_archive, cube_keyable_data):
+    data = serial_animator.file_io.read_json_members_from_archive(
+        tmp_archive, ["test.json", "missing.json"]
+    )
+    assert data == {"test.json": cube_keyable_data}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+def test_iter_json_object_items(chunk_size):
+    data = {
+        "|a": {"tx": [1.5, -2e-16], "name": 'with "quotes", {braces}'},
+        "|b": 12345678901,
+        "|c": {},
+    }
+    f = io.BytesIO(json.dumps(data, indent=4).encode("utf-8"))
+    items = serial_animator.file_io.iter_json_object_items(f, chunk_size=chunk_size)
+    assert dict(items) == data
+    f.seek(0)
+    items = serial_animator.file_io.iter_json_object_items(
+        f, keys=["|b"], chunk_size=chunk_size
+    )
+    assert list(items) == [("|b", 12345678901)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5])
+def test_iter_json_object_numbers(chunk_size):
+    # numbers cut at the end of a chunk must not be decoded early
+    data = {"|a": 1.5, "|b": -2.25e-3, "|c": 10.0, "|d": [0.125]}
+    for separators in [(",", ":"), (", ", ": ")]:
+        text = json.dumps(data, separators=separators)
+        f = io.BytesIO(text.encode("utf-8"))
+        items = serial_animator.file_io.iter_json_object_items(f, chunk_size=chunk_size)
+        assert dict(items) == data
+
+
+def test_iter_json_items_from_archive(tmp_archive, cube_keyable_data):
+    items = serial_animator.file_io.iter_json_items_from_archive(
+        tmp_archive, "test.json"
+    )
+    assert dict(items) == cube_keyable_data
+
+
+def test_archive_writer(tmp_path, json_file, cube_keyable_data):
+    out_path = tmp_path / "out" / "writer.tar"
+    chunks = serial_animator.file_io.iter_json_data(cube_keyable_data, chunk_size=64)
+    with serial_animator.file_io.ArchiveWriter(out_path) as writer:
+        offset = writer.add("bytes.bin", b"abc")
+        writer.add("buffer.bin", io.BytesIO(b"x" * 1000))
+        writer.add("streamed.json", chunks)
+        writer.add_file(json_file)
+        assert not out_path.exists()
+    assert out_path.read_bytes()[offset : offset + 3] == b"abc"
+    assert out_path.stat().st_size % tarfile.RECORDSIZE == 0
+    with tarfile.open(out_path) as tf:
+        assert tf.getnames() == writer.names
+        assert tf.extractfile("buffer.bin").read() == b"x" * 1000
+        assert json.load(tf.extractfile("streamed.json")) == cube_keyable_data
+        assert tf.extractfile("test.json").read() == json_file.read_bytes()
+
+
+def test_archive_writer_error(tmp_path):
+    out_path = tmp_path / "broken.tar"
+    with pytest.raises(ValueError):
+        with serial_animator.file_io.ArchiveWriter(out_path) as writer:
+            writer.add("bytes.bin", b"abc")
+            raise ValueError()
+    assert not out_path.exists()
+    assert not list(tmp_path.iterdir())
+
+
+def test_iter_json_data(cube_keyable_data):
+    data = b"".join(
+        serial_animator.file_io.iter_json_data(cube_keyable_data, chunk_size=16)
+    )
+    assert data == json.dumps(cube_keyable_data, indent=4).encode("utf-8")
+
+
 @pytest.fixture()
 def json_file(tmp_path, cube_keyable_data):
     path = tmp_path / "test.json"
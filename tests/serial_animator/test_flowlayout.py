@@ -0,0 +1,23 @@
+from serial_animator.ui.flowlayout import benchmark, flow_positions, get_flow_height
+
+
+def test_flow_positions():
+    sizes = [(40, 10), (40, 20), (40, 10), (100, 5)]
+    positions = list()
+    flow_positions(sizes, 100, 2, 3, positions)
+    assert positions == [(0, 0, 10), (42, 0, 20), (0, 23, 10), (0, 36, 5)]
+    assert get_flow_height(positions) == 41
+
+
+def test_flow_positions_incremental():
+    sizes = [(30 + i % 7 * 10, 20 + i % 3 * 5) for i in range(100)]
+    positions = list()
+    flow_positions(sizes, 250, 1, 1, positions)
+    resumed = positions[:37]
+    flow_positions(sizes, 250, 1, 1, resumed)
+    assert resumed == positions
+
+
+def test_benchmark():
+    timings = benchmark(count=1000, repeat=2)
+    assert set(timings) == {"first", "resize", "invalidated", "take_and_add"}
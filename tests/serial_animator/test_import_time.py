@@ -0,0 +1,83 @@
+import json
+import re
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("maya.cmds")
+
+# seconds the core modules may take to import, including their dependencies
+IMPORT_BUDGET = 1.5
+CORE_MODULES = [
+    "serial_animator.find_nodes",
+    "serial_animator.pose_io",
+    "serial_animator.animation_io",
+    "serial_animator.scene_paths",
+    "serial_animator.utils",
+]
+# slow modules only needed for less frequent work
+LAZY_MODULES = ["pymel.core", "PySide2"]
+
+
+def import_core_modules() -> subprocess.CompletedProcess:
+    """
+    Imports core modules in a new interpreter without initializing
+    maya.standalone, printing which of LAZY_MODULES were imported
+    """
+    modules = ", ".join(CORE_MODULES)
+    code = (
+        f"import json, sys; import {modules}; "
+        f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    )
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+    )
+
+
+def load_animation(path) -> subprocess.CompletedProcess:
+    """
+    Loads animation from path onto a cube and captures it again in a
+    new maya.standalone, printing if PyMEL was imported
+    """
+    code = (
+        "import sys; import maya.standalone; maya.standalone.initialize(); "
+        "from pathlib import Path; from maya import cmds; "
+        "import serial_animator.animation_io as animation_io; "
+        "cube = cmds.ls(cmds.polyCube(constructionHistory=False), long=True)[0]; "
+        f"animation_io.load_animation(Path({str(path)!r}), nodes=[cube]); "
+        "cmds.select(cube); animation_io.capture_animation_from_selection(); "
+        "print('pymel.core' in sys.modules)"
+    )
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+
+
+def test_core_modules_import_without_standalone():
+    result = import_core_modules()
+    assert result.returncode == 0, result.stderr[-2000:]
+
+
+def test_core_modules_dont_import_lazy_modules():
+    result = import_core_modules()
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+
+def test_core_modules_import_time():
+    result = import_core_modules()
+    assert result.returncode == 0, result.stderr[-2000:]
+    # lines are "import time: self [us] | cumulative | imported package"
+    cumulative = 0
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s?(\S+)", line)
+        if match and match.group(2) in CORE_MODULES:
+            cumulative += int(match.group(1))
+    assert cumulative / 1e6 < IMPORT_BUDGET
+
+
+def test_load_animation_doesnt_import_pymel(cube_anim_file):
+    result = load_animation(cube_anim_file)
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert result.stdout.strip().splitlines()[-1] == "False"
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+import numpy as np
+import pytest
+from serial_animator import key_arrays
+
+
+def test_from_key_data(key_data):
+    keys = key_arrays.KeyArrays.from_key_data(key_data)
+    assert len(keys) == 3
+    assert keys.times.tolist() == [0.0, 5.0, 10.0]
+    assert keys.to_key_data() == key_data
+
+
+def test_from_json_key_data(key_data):
+    json_data = {str(k): [v[0], list(v[1])] for k, v in key_data.items()}
+    keys = key_arrays.KeyArrays.from_key_data(json_data)
+    assert keys.to_key_data() == key_data
+
+
+def test_clip(key_data):
+    keys = key_arrays.KeyArrays.from_key_data(key_data)
+    assert keys.clip(0, 5).times.tolist() == [0.0, 5.0]
+    assert keys.clip(start=1).times.tolist() == [5.0, 10.0]
+    assert keys.clip(end=0).times.tolist() == [0.0]
+    assert len(keys.clip(20, 30)) == 0
+
+
+def test_convert_time_unit(key_data):
+    transform = key_arrays.TimeTransform()
+    transform.convert_time_unit(24, 30)
+    keys = transform.apply(key_arrays.KeyArrays.from_key_data(key_data))
+    assert keys.times.tolist() == pytest.approx([0.0, 6.25, 12.5])
+    assert keys.out_angles.tolist() == pytest.approx([45.0, 0.0, 0.0])
+
+
+def test_fit_range(key_data):
+    transform = key_arrays.TimeTransform()
+    transform.fit_range((0, 10), (100, 120))
+    keys = transform.apply(key_arrays.KeyArrays.from_key_data(key_data))
+    assert keys.times.tolist() == pytest.approx([100.0, 110.0, 120.0])
+    # doubling time halves the slope of the tangents
+    assert keys.out_angles[0] == pytest.approx(26.56505117707799)
+
+
+def test_offset(key_data):
+    transform = key_arrays.TimeTransform()
+    transform.offset(-5)
+    assert transform.map_time(5) == 0
+    data = key_arrays.transform_key_data(key_data, transform, start=0)
+    assert list(data.keys()) == [0.0, 5.0]
+
+
+def test_scale_tangents():
+    angles, weights = key_arrays.scale_tangents(
+        np.array([45.0]), np.array([2.0**0.5]), 2.0
+    )
+    assert angles[0] == pytest.approx(26.56505117707799)
+    assert weights[0] == pytest.approx(5.0**0.5)
+
+
+@pytest.fixture()
+def key_data():
+    return OrderedDict(
+        [
+            (0.0, (0.0, (45.0, 45.0, 1.0, 1.0, "fixed", "fixed", True, False))),
+            (5.0, (1.0, (0.0, 0.0, 1.0, 1.0, "auto", "auto", True, False))),
+            (10.0, (0.0, (0.0, 0.0, 1.0, 1.0, "flat", "step", False, True))),
+        ]
+    )
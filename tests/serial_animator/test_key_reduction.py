@@ -0,0 +1,54 @@
+import math
+import numpy as np
+import pytest
+import serial_animator.key_reduction as key_reduction
+from serial_animator.key_arrays import KeyArrays
+
+
+def test_reduce_static_curve(make_key_data):
+    key_data = make_key_data(range(50), [1.0] * 50)
+    keys, report = key_reduction.reduce_key_data(key_data, 0.001, fps=24)
+    assert list(keys.keys()) == [0.0]
+    assert report["after"] == 1
+    assert report["ratio"] == pytest.approx(1 / 50.0)
+
+
+def test_reduce_baked_curve(make_key_data):
+    values = [math.sin(frame * 0.1) for frame in range(200)]
+    key_data = make_key_data(range(200), values)
+    keys, report = key_reduction.reduce_key_data(key_data, 0.001, fps=24)
+    assert report["before"] == 200
+    assert report["after"] < 40
+    assert report["max_error"] <= 0.001
+    assert 0.0 in keys and 199.0 in keys
+
+
+def test_keep_sparse_curve(make_key_data):
+    key_data = make_key_data([0, 10, 20], [0.0, 1.0, 0.0])
+    keys, report = key_reduction.reduce_key_data(key_data, 0.001, fps=24)
+    assert keys is None
+    assert report["ratio"] == 1.0
+
+
+def test_fit_keys():
+    times = np.arange(100, dtype=float)
+    values = np.abs(times - 50.0)
+    indices, slopes, max_error = key_reduction.fit_keys(times, values, 0.01)
+    assert max_error <= 0.01
+    assert len(indices) < len(times)
+
+
+def test_is_baked(make_key_data):
+    assert key_reduction.is_baked(KeyArrays.from_key_data(make_key_data(range(5))))
+    stepped = make_key_data(range(5), out_type="step")
+    assert not key_reduction.is_baked(KeyArrays.from_key_data(stepped))
+
+
+def test_reduce_anim_data(make_attribute_data):
+    values = [frame * 0.5 for frame in range(100)]
+    tx = make_attribute_data(range(100), values, weighted_tangents=True)
+    path_data = {"|node": {"tx": tx}}
+    data, reports = key_reduction.reduce_anim_data(path_data, fps=24)
+    assert len(data["|node"]["tx"]["keys"]) == 2
+    assert data["|node"]["tx"]["weightedTangents"] is False
+    assert reports["|node"]["tx"]["after"] == 2
@@ -0,0 +1,111 @@
+import os
+import shutil
+
+import pytest
+
+import serial_animator.library_mirror as library_mirror
+
+
+@pytest.fixture()
+def share(tmp_path, cube_anim_file):
+    share_dir = tmp_path / "share"
+    share_dir.mkdir()
+    for i in range(4):
+        shutil.copy(cube_anim_file, share_dir / f"cube_{i}.anim")
+    return share_dir
+
+
+class CountingFileSystem(library_mirror.LocalFileSystem):
+    """Counts the copies and reads reaching the source file system"""
+
+    def __init__(self):
+        self.calls = {"copy": 0, "read": 0}
+
+    def copy(self, path, out_path):
+        self.calls["copy"] += 1
+        super(CountingFileSystem, self).copy(path, out_path)
+
+    def read(self, path, size: int = -1, offset: int = 0) -> bytes:
+        self.calls["read"] += 1
+        return super(CountingFileSystem, self).read(path, size, offset)
+
+
+def get_mirror(tmp_path, share, **kwargs) -> library_mirror.LibraryMirror:
+    return library_mirror.LibraryMirror(tmp_path / "mirror", roots=[share], **kwargs)
+
+
+def test_read_through(tmp_path, share):
+    mirror = get_mirror(tmp_path, share)
+    path = share / "cube_0.anim"
+    local_path = mirror.get_path(path)
+    assert local_path.parent == tmp_path / "mirror"
+    assert local_path.read_bytes() == path.read_bytes()
+    assert mirror.get_path(path) == local_path
+    assert mirror.get_stats()["hits"] == 1
+    # paths outside the roots aren't mirrored
+    assert mirror.get_path(tmp_path / "other.anim") == tmp_path / "other.anim"
+
+
+def test_changed_source(tmp_path, share):
+    mirror = get_mirror(tmp_path, share)
+    path = share / "cube_0.anim"
+    local_path = mirror.get_path(path)
+    path.write_bytes(b"changed")
+    os.utime(path, ns=(0, 10**9))
+    assert mirror.get_path(path, fetch=False) == path
+    assert mirror.get_path(path).read_bytes() == b"changed"
+    assert mirror.current_bytes == len(b"changed")
+    assert local_path.read_bytes() == b"changed"
+
+
+def test_eviction(tmp_path, share):
+    size = (share / "cube_0.anim").stat().st_size
+    mirror = get_mirror(tmp_path, share, max_bytes=size * 2)
+    local_paths = [mirror.get_path(share / f"cube_{i}.anim") for i in range(3)]
+    assert not local_paths[0].exists()
+    assert all(p.exists() for p in local_paths[1:])
+    assert mirror.current_bytes == size * 2
+    # least recently used is evicted, not least recently added
+    mirror.get_path(share / "cube_1.anim")
+    mirror.get_path(share / "cube_3.anim")
+    assert local_paths[1].exists()
+    assert not local_paths[2].exists()
+
+
+def test_index_between_sessions(tmp_path, share):
+    mirror = get_mirror(tmp_path, share)
+    for i in range(3):
+        mirror.get_path(share / f"cube_{i}.anim")
+    index = (tmp_path / "mirror" / library_mirror.INDEX_NAME).read_bytes()
+    mirror.get_path(share / "cube_0.anim")
+    # hits only reorder the index in memory
+    assert (tmp_path / "mirror" / library_mirror.INDEX_NAME).read_bytes() == index
+    mirror.flush()
+    mirror = get_mirror(tmp_path, share)
+    assert mirror.get_recent(2) == [share / "cube_0.anim", share / "cube_2.anim"]
+    for future in mirror.prefetch_recent():
+        future.result()
+    assert mirror.get_stats()["hits"] == 3
+
+
+def test_unreachable_source(tmp_path, share):
+    mirror = get_mirror(tmp_path, share)
+    path = share / "cube_0.anim"
+    data = path.read_bytes()
+    local_path = mirror.get_path(path)
+    path.unlink()
+    assert mirror.get_path(path) == local_path
+    assert local_path.read_bytes() == data
+
+
+def test_source_copied_once(tmp_path, share):
+    file_system = CountingFileSystem()
+    mirror = get_mirror(tmp_path, share, file_system=file_system)
+    paths = sorted(share.iterdir())
+    for _ in range(5):
+        for path in paths:
+            mirror.get_path(path).read_bytes()
+    # each archive crosses the slow file system once, later reads are local
+    assert file_system.calls["copy"] == len(paths)
+    assert file_system.calls["read"] == 0
+    assert mirror.get_stats()["hits"] == len(paths) * 4
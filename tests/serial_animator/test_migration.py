@@ -0,0 +1,83 @@
+import json
+import shutil
+import tarfile
+import serial_animator.archive_diff as archive_diff
+import serial_animator.archive_header as archive_header
+import serial_animator.migration as migration
+from serial_animator.file_io import archive_files
+
+
+def test_migrate_archive(tmp_path, cube_anim_file):
+    path = tmp_path / "cube.anim"
+    shutil.copy(cube_anim_file, path)
+    result = migration.migrate_archive(path)
+    assert result["status"] == "migrated"
+    assert result["after"] == path.stat().st_size < result["before"]
+    header, poster = archive_header.read_header_and_poster(path)
+    assert header["kind"] == "anim"
+    assert poster is not None
+    assert archive_diff.read_archive(path) == archive_diff.read_archive(cube_anim_file)
+    assert not list(tmp_path.glob("*" + migration.MIGRATING_SUFFIX))
+    assert migration.migrate_archive(path)["status"] == "skipped"
+
+
+def test_migrate_pose(tmp_path, data_preview):
+    pose_path = tmp_path / "pose.json"
+    pose_path.write_text(json.dumps({"|node": {"tx": 1.0}}, indent=4))
+    path = archive_files([pose_path, data_preview], tmp_path / "old.pose")
+    result = migration.migrate_archive(path)
+    assert result["status"] == "migrated"
+    header, poster = archive_header.read_header_and_poster(path)
+    assert header["meta_data"]["nodes"] == ["|node"]
+    assert poster == data_preview.read_bytes()
+    assert archive_diff.read_archive(path)[1] == {"|node": {"tx": 1.0}}
+
+
+def test_dry_run(tmp_path, cube_anim_file):
+    path = tmp_path / "cube.anim"
+    shutil.copy(cube_anim_file, path)
+    result = migration.migrate_archive(path, dry_run=True)
+    assert result["status"] == "migrated"
+    assert path.read_bytes() == cube_anim_file.read_bytes()
+
+
+def test_migrate_broken_archive(tmp_path):
+    path = tmp_path / "broken.anim"
+    path.write_text("not a tar-file")
+    result = migration.migrate_archive(path)
+    assert result["status"] == "failed"
+    assert path.read_text() == "not a tar-file"
+
+
+def test_migrate_colliding_members(tmp_path, data_preview):
+    pose_path = tmp_path / "pose.json"
+    pose_path.write_text(json.dumps({"|node": {"tx": 1.0}}))
+    path = tmp_path / "nested.pose"
+    with tarfile.open(str(path), mode="w:") as tf:
+        tf.add(str(pose_path), arcname="pose.json")
+        tf.add(str(data_preview), arcname="a/preview.jpg")
+        tf.add(str(data_preview), arcname="b/preview.jpg")
+    data = path.read_bytes()
+    result = migration.migrate_archive(path)
+    assert result["status"] == "failed"
+    assert "preview.jpg" in result["error"]
+    assert path.read_bytes() == data
+
+
+def test_migrate_library(tmp_path, cube_anim_file):
+    for i in range(4):
+        shutil.copy(cube_anim_file, tmp_path / f"cube_{i}.anim")
+    (tmp_path / "broken.pose").write_text("not a tar-file")
+    # a valid tar-file with data of an unexpected shape
+    pose_path = tmp_path / "pose.json"
+    pose_path.write_text("[1, 2]")
+    archive_files([pose_path], tmp_path / "corrupt.pose")
+    pose_path.unlink()
+    report = migration.migrate_library([tmp_path], max_workers=2)
+    assert report["migrated"] == 4
+    assert report["failed"] == 2
+    assert all(r["error"] for r in report["results"] if r["status"] == "failed")
+    assert report["bytes_saved"] == report["bytes_before"] - report["bytes_after"]
+    assert "4 migrated" in migration.format_report(report)
+    report = migration.migrate_library([tmp_path], max_workers=2)
+    assert report["skipped"] == 4
@@ -0,0 +1,104 @@
+import pytest
+from PySide2 import QtCore
+
+from serial_animator.ui.playback_clock import PlaybackClock, get_loop_frame
+
+
+class FakeTime(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakePreview(object):
+    def __init__(self, frame_rate: float = 10.0):
+        self.frame_rate = frame_rate
+        self.on_screen = True
+        self.deleted = False
+        self.shown = list()
+
+    def is_on_screen(self) -> bool:
+        if self.deleted:
+            raise RuntimeError("Internal C++ object already deleted.")
+        return self.on_screen
+
+    def show_playback_frame(self, index: int):
+        self.shown.append(index)
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+@pytest.fixture()
+def fake_time():
+    return FakeTime()
+
+
+@pytest.fixture()
+def clock(app, fake_time):
+    clock = PlaybackClock(time_source=fake_time)
+    yield clock
+    clock._timer.stop()
+
+
+def test_get_loop_frame():
+    assert get_loop_frame(0, 10, 19) == 10
+    assert get_loop_frame(12, 10, 19) == 12
+    assert get_loop_frame(10, 10, 19) == 10
+
+
+def test_wall_clock_frames(clock, fake_time):
+    preview = FakePreview()
+    clock.add(preview)
+    clock.tick()
+    fake_time.now = 0.5
+    clock.tick()
+    # no time passed since the last tick, so no new frame is shown
+    clock.tick()
+    assert preview.shown == [0, 5]
+
+
+def test_dropped_frames(clock, fake_time):
+    preview = FakePreview()
+    clock.add(preview)
+    clock.tick()
+    fake_time.now = 0.1
+    clock.tick()
+    fake_time.now = 0.5
+    clock.tick()
+    assert preview.shown == [0, 1, 5]
+    assert clock.frames_shown == 3
+    assert clock.frames_dropped == 3
+
+
+def test_off_screen_pauses(clock, fake_time):
+    preview = FakePreview()
+    clock.add(preview)
+    clock.tick()
+    preview.on_screen = False
+    fake_time.now = 0.5
+    clock.tick()
+    preview.on_screen = True
+    fake_time.now = 0.6
+    clock.tick()
+    assert preview.shown == [0, 6]
+    assert clock.frames_dropped == 0
+
+
+def test_deleted_preview(clock, fake_time):
+    deleted = FakePreview()
+    preview = FakePreview()
+    clock.add(deleted)
+    clock.add(preview)
+    deleted.deleted = True
+    fake_time.now = 0.1
+    clock.tick()
+    assert not clock.is_playing(deleted)
+    assert clock.is_playing(preview)
+    assert preview.shown == [1]
+    clock.remove(preview)
+    assert not clock._timer.isActive()
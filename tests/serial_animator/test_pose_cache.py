@@ -0,0 +1,81 @@
+import os
+import pytest
+import serial_animator.pose_cache as pose_cache
+
+
+def test_get_from_memory(pose_path, counting_loader, cube_keyable_data):
+    cache = pose_cache.PoseCache()
+    assert cache.get(pose_path, counting_loader) == (cube_keyable_data, {})
+    assert cache.get(pose_path, counting_loader) == (cube_keyable_data, {})
+    assert counting_loader.calls == 1
+    assert cache.hits == 1
+
+
+def test_returns_new_dict(pose_path, counting_loader):
+    cache = pose_cache.PoseCache()
+    data, _ = cache.get(pose_path, counting_loader)
+    data["|pCube1"]["tx"] = 100.0
+    assert cache.get(pose_path, counting_loader)[0]["|pCube1"]["tx"] != 100.0
+
+
+def test_bool_values_are_kept(pose_path, counting_loader):
+    cache = pose_cache.PoseCache()
+    cache.get(pose_path, counting_loader)
+    assert cache.get(pose_path, counting_loader)[0]["|pCube1"]["v"] is True
+
+
+def test_invalidate_on_change(pose_path, counting_loader):
+    cache = pose_cache.PoseCache()
+    cache.get(pose_path, counting_loader)
+    pose_path.write_text("changed content")
+    stat = os.stat(pose_path)
+    os.utime(pose_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    cache.get(pose_path, counting_loader)
+    assert counting_loader.calls == 2
+    assert len(cache._entries) == 1
+
+
+def test_memory_bound(tmp_path, counting_loader):
+    cache = pose_cache.PoseCache(max_bytes=250)
+    for i in range(5):
+        path = tmp_path / f"pose_{i}.pose"
+        path.write_text(str(i))
+        cache.get(path, counting_loader)
+    assert cache.current_bytes <= 250
+    assert len(cache._entries) == 2
+
+
+def test_persist(tmp_path, pose_path, counting_loader, cube_keyable_data):
+    persist_dir = tmp_path / "cache"
+    cache = pose_cache.PoseCache(persist_dir=persist_dir)
+    cache.get(pose_path, counting_loader)
+    assert len(list(persist_dir.iterdir())) == 1
+    new_cache = pose_cache.PoseCache(persist_dir=persist_dir)
+    assert new_cache.get(pose_path, counting_loader)[0] == cube_keyable_data
+    assert counting_loader.calls == 1
+
+
+def test_meta_data(pose_path):
+    cache = pose_cache.PoseCache()
+    meta = {"encoding": "sparse", "tolerance": 1e-5}
+    _, cached_meta = cache.get(pose_path, lambda p: ({"|pCube1": {"tx": 1.0}}, meta))
+    assert cached_meta == meta
+    cached_meta["encoding"] = "dense"
+    assert cache.get(pose_path, lambda p: (dict(), dict()))[1] == meta
+
+
+@pytest.fixture()
+def pose_path(tmp_path):
+    path = tmp_path / "cached.pose"
+    path.write_text("content")
+    return path
+
+
+@pytest.fixture()
+def counting_loader(cube_keyable_data):
+    def loader(path):
+        loader.calls += 1
+        return cube_keyable_data, dict()
+
+    loader.calls = 0
+    return loader
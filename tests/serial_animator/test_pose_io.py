@@ -5,6 +5,7 @@ import pymel.core as pm
 
 import serial_animator.file_io
 import serial_animator.pose_io as pose_io
+import serial_animator.quantization as quantization
 import serial_animator.find_nodes
 
 
@@ -75,6 +76,67 @@ def test_interpolate(pose_file, cube_keyable_data, caplog):
     pose_io.interpolate(target=target_pose, origin=start_pose, weight=0.2)
 
 
+def test_get_keyable_data_sparse(posed_cube):
+    data = pose_io.get_keyable_data(posed_cube, sparse=True)
+    assert "tx" in data
+    for attribute_name in ["v", "tz", "sx", "sy", "sz"]:
+        assert attribute_name not in data
+    reference = pose_io.get_keyable_data(posed_cube)
+    assert pose_io.get_keyable_data(posed_cube, sparse=True, reference=reference) == {}
+
+
+def test_save_sparse_pose(tmp_path, data_preview, posed_cube, cube_keyable_data):
+    out_path = tmp_path / "sparse.pose"
+    pm.select(posed_cube)
+    pose_io.save_pose_from_selection(out_path, data_preview, sparse=True)
+    saved_data = pose_io.read_pose_data(out_path)
+    assert "sx" not in saved_data[posed_cube.fullPath()]
+    assert pose_io.read_pose_meta_data(out_path)["encoding"] == "sparse"
+    assert pose_io.read_pose_meta_data(out_path)["nodes"] == [posed_cube.fullPath()]
+    pm.newFile(force=True)
+    cube = pm.polyCube(constructionHistory=False)[0]
+    cube.sx.set(3)
+    cube.v.set(False)
+    pose = pose_io.read_pose_data_to_nodes(out_path, [cube])
+    pose_io.interpolate(target=pose, origin=dict(), weight=1)
+    for k, v in cube_keyable_data.get(cube.fullPath()).items():
+        assert cube.attr(k).get() == pytest.approx(v)
+
+
+def test_get_keyable_data_quantized(posed_cube):
+    posed_cube.tx.set(1.23456789)
+    posed_cube.rx.set(7.951386703658792e-16)
+    policy = quantization.get_policy()
+    data = pose_io.get_keyable_data(posed_cube, policy=policy)
+    assert data["tx"] == 1.2346
+    assert data["rx"] == 0.0
+    assert data["v"] is True
+
+
+def test_interpolate_skip_unchanged(pose_file, posed_cube):
+    target_pose = pose_io.read_pose_data_to_nodes(pose_file, [posed_cube])
+    stats = pose_io.interpolate(
+        target=target_pose, origin=dict(), weight=1, skip_unchanged=True
+    )
+    assert stats["written"] == 0
+    assert stats["skipped"] == len(target_pose[posed_cube])
+    posed_cube.tx.set(100)
+    stats = pose_io.interpolate(
+        target=target_pose, origin=dict(), weight=1, skip_unchanged=True
+    )
+    assert stats["written"] == 1
+    assert posed_cube.tx.get() == pytest.approx(target_pose[posed_cube]["tx"])
+
+
+def test_get_node_plugs(posed_cube):
+    plugs = pose_io.get_node_plugs(posed_cube.fullPath(), ["tx", "ry", "missing"])
+    assert list(plugs) == ["tx", "ry"]
+    posed_cube.ry.set(45)
+    for name, plug in plugs.items():
+        value = pose_io.get_value(f"{posed_cube.fullPath()}.{name}")
+        assert pose_io.get_plug_value(plug) == pytest.approx(value)
+
+
 @pytest.fixture()
 def posed_cube(cube, cube_keyable_data):
     cube_data = cube_keyable_data.get(cube.fullPath())
@@ -0,0 +1,120 @@
+from PySide2 import QtGui
+
+import serial_animator.preview_pyramid as preview_pyramid
+
+
+def test_get_level_name():
+    assert preview_pyramid.get_level_name("preview.jpg", 96) == "preview_96.jpg"
+    assert (
+        preview_pyramid.get_level_name("preview.0012.jpg", 250)
+        == "preview_250.0012.jpg"
+    )
+    assert (
+        preview_pyramid.get_level_name("preview.0012.jpg", None) == "preview.0012.jpg"
+    )
+
+
+def test_get_level():
+    assert preview_pyramid.get_level([96, 250], 64) == 96
+    assert preview_pyramid.get_level([250, 96], 200) == 250
+    assert preview_pyramid.get_level([96, 250], 512) is None
+    assert preview_pyramid.get_level([], 96) is None
+
+
+def test_build_pyramid(tmp_path, preview_sequence):
+    images = sorted(preview_sequence.iterdir())
+    out_paths = preview_pyramid.build_pyramid(images, tmp_path / "pyramid")
+    assert len(out_paths) == len(images) * len(preview_pyramid.PREVIEW_LEVELS)
+    for level in preview_pyramid.PREVIEW_LEVELS:
+        image = QtGui.QImage(
+            str(
+                tmp_path
+                / "pyramid"
+                / preview_pyramid.get_level_name(images[0].name, level)
+            )
+        )
+        assert not image.isNull()
+        assert max(image.width(), image.height()) <= level
+
+
+def test_build_levels(data_preview):
+    levels = preview_pyramid.build_levels(data_preview, name="preview.jpg")
+    assert [name for name, _ in levels] == ["preview_96.jpg", "preview_250.jpg"]
+    for (_, data), level in zip(levels, preview_pyramid.PREVIEW_LEVELS):
+        image = QtGui.QImage.fromData(data)
+        assert not image.isNull()
+        assert max(image.width(), image.height()) <= level
+
+
+def test_pack_atlases(tmp_path, preview_sequence):
+    images = sorted(preview_sequence.iterdir())
+    atlas, out_paths = preview_pyramid.pack_atlases(
+        images, tmp_path / "pyramid", 96, columns=2, rows=2
+    )
+    assert len(out_paths) == 3
+    assert atlas["first_frame"] == 0
+    assert atlas["frame_count"] == len(images)
+    assert atlas["atlases"] == [p.name for p in out_paths]
+    width, height = atlas["frame_size"]
+    assert max(width, height) <= 96
+    image = QtGui.QImage(str(out_paths[0]))
+    assert (image.width(), image.height()) == (width * 2, height * 2)
+    # the last atlas only holds the rows it needs
+    image = QtGui.QImage(str(out_paths[-1]))
+    assert (image.width(), image.height()) == (width * 2, height)
+
+
+def test_get_atlas_frame():
+    atlas = {
+        "level": 96,
+        "frame_size": [96, 54],
+        "columns": 4,
+        "rows": 4,
+        "first_frame": 1,
+        "frame_count": 20,
+        "atlases": ["preview_96.atlas.0000.jpg", "preview_96.atlas.0001.jpg"],
+    }
+    assert preview_pyramid.get_atlas_frame(atlas, 1) == (
+        "preview_96.atlas.0000.jpg",
+        (0, 0, 96, 54),
+    )
+    assert preview_pyramid.get_atlas_frame(atlas, 7) == (
+        "preview_96.atlas.0000.jpg",
+        (192, 54, 96, 54),
+    )
+    assert preview_pyramid.get_atlas_frame(atlas, 18) == (
+        "preview_96.atlas.0001.jpg",
+        (96, 0, 96, 54),
+    )
+    assert preview_pyramid.get_atlas_frame(atlas, 0) is None
+    assert preview_pyramid.get_atlas_frame(atlas, 21) is None
+
+
+def test_get_sampled_atlas_frame():
+    atlas = {
+        "level": 96,
+        "frame_size": [96, 54],
+        "columns": 2,
+        "rows": 2,
+        "first_frame": 1,
+        "frame_count": 5,
+        "frames": [1, 10, 20, 30, 40],
+        "atlases": ["preview_96.atlas.0000.jpg", "preview_96.atlas.0001.jpg"],
+    }
+    assert preview_pyramid.get_atlas_frame(atlas, 15) == (
+        "preview_96.atlas.0000.jpg",
+        (96, 0, 96, 54),
+    )
+    assert preview_pyramid.get_atlas_frame(atlas, 45) == (
+        "preview_96.atlas.0001.jpg",
+        (0, 0, 96, 54),
+    )
+    assert preview_pyramid.get_atlas_frame(atlas, 0) is None
+
+
+def test_get_atlas():
+    atlases = [{"level": 250}, {"level": 96}]
+    assert preview_pyramid.get_atlas(atlases, 64)["level"] == 96
+    assert preview_pyramid.get_atlas(atlases, 250)["level"] == 250
+    assert preview_pyramid.get_atlas(atlases, 512)["level"] == 250
+    assert preview_pyramid.get_atlas([], 96) is None
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+import serial_animator.quantization as quantization
+import serial_animator.sampled_channels as sampled_channels
+
+
+def test_quantize():
+    values = quantization.quantize([1.23456789, -2.526906870875038, 1e-310], 1e-4)
+    assert values.tolist() == [1.2346, -2.5269, 0.0]
+    values = quantization.quantize([-7.951386703658792e-16], 1e-3)
+    assert str(values[0]) == "0.0"
+
+
+@pytest.mark.parametrize("precision", [5e-4, 3e-4, 2e-3, 0.25, 1e-4, 1.0])
+def test_quantize_error(precision):
+    values = np.random.default_rng(0).uniform(-100, 100, 10000)
+    error = np.abs(quantization.quantize(values, precision) - values).max()
+    # never coarser than rounding to a grid of precision
+    assert error <= precision / 2
+
+
+def test_quantize_weights():
+    weights = quantization.quantize_weights([1.0, 0.333333333333333])
+    assert weights.tolist() == [1.0, 0.3333333]
+    weights = quantization.quantize_weights([0.0, 123456789.0, 2.00000049])
+    assert weights.tolist() == [0.0, 123456800.0, 2.0]
+
+
+def test_quantize_value():
+    policy = quantization.get_policy({"rotate": 0.1})
+    assert quantization.quantize_value(12.345, "doubleAngle", policy) == 12.3
+    assert quantization.quantize_value(12.345, "doubleLinear", policy) == 12.345
+    assert quantization.quantize_value(True, "bool", policy) is True
+    assert quantization.quantize_value(3, "enum", policy) == 3
+
+
+def test_quantize_anim_data(path_data):
+    data = quantization.quantize_anim_data(path_data)
+    keys = data["|node"]["tx"]["keys"]
+    value, tangent = keys[1.0]
+    assert value == 0.9983
+    assert tangent[0] == 45.0
+    assert tangent[2] == 0.3333333
+    assert tangent[4:] == ("spline", "spline", True, False)
+    assert path_data["|node"]["tx"]["keys"][1.0][0] == np.sin(0.1) * 10
+
+
+def test_quantize_samples(path_data):
+    sampled_data = sampled_channels.sample_anim_data(path_data)
+    data = quantization.quantize_anim_data(sampled_data, {"translate": 0.01})
+    values = sampled_channels.decode_values(data["|node"]["tx"]["samples"]["values"])
+    assert values[1] == pytest.approx(1.0, abs=1e-6)
+
+
+def test_measure_quantization(path_data):
+    report = quantization.measure_quantization(path_data)
+    assert report["after"] < report["before"]
+    assert report["ratio"] < 0.8
+    assert report["max_error"]["translate"] <= 0.5e-4
+    assert report["max_error"]["rotate"] <= 0.5e-3
+
+
+@pytest.fixture()
+def path_data(make_attribute_data):
+    frames = np.arange(100)
+    values = np.sin(frames * 0.1) * 10.0 ** (frames % 3)
+    node_data = dict()
+    for name, attribute_type in [("tx", "doubleLinear"), ("rx", "doubleAngle")]:
+        node_data[name] = make_attribute_data(
+            frames,
+            values,
+            attribute_type=attribute_type,
+            in_type="spline",
+            out_type="spline",
+            angle=45.0000001,
+            weight=1 / 3.0,
+        )
+    return {"|node": node_data}
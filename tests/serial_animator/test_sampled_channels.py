@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+import serial_animator.sampled_channels as sampled_channels
+from serial_animator.key_arrays import TimeTransform
+
+
+def test_encode_values():
+    values = [0.0, 1.5, -2.25]
+    text = sampled_channels.encode_values(values)
+    assert isinstance(text, str)
+    assert sampled_channels.decode_values(text).tolist() == values
+
+
+def test_get_samples(baked_key_data):
+    samples = sampled_channels.get_samples(baked_key_data)
+    assert samples["start"] == 10.0
+    assert samples["step"] == 1.0
+    assert samples["count"] == 100
+    assert samples["interpolation"] == sampled_channels.LINEAR
+    times = sampled_channels.get_sample_times(samples)
+    assert times[-1] == 109.0
+
+
+def test_get_samples_uneven(make_key_data):
+    key_data = make_key_data([0.0, 1.0, 3.0])
+    assert sampled_channels.get_samples(key_data) is None
+    key_data = make_key_data([0.0, 10.0, 20.0])
+    assert sampled_channels.get_samples(key_data) is None
+
+
+def test_get_samples_step(make_key_data):
+    key_data = make_key_data([0.0, 1.0, 2.0], out_type="step")
+    samples = sampled_channels.get_samples(key_data)
+    assert samples["interpolation"] == sampled_channels.STEP
+
+
+def test_get_samples_spline(make_key_data):
+    key_data = make_key_data([0.0, 1.0], in_type="spline", out_type="spline")
+    assert sampled_channels.get_samples(key_data) is None
+    key_data = make_key_data([0.0, 0.5, 1.0], out_type="spline")
+    # keys on every frame are baked, so smooth tangents are implied
+    assert sampled_channels.get_samples(key_data) is not None
+
+
+def test_get_samples_mixed(make_key_data):
+    key_data = make_key_data(range(10), in_type="linear", out_type="linear")
+    time, (value, tangent) = next(iter(key_data.items()))
+    key_data[time] = (value, (*tangent[:5], "step", *tangent[6:]))
+    assert sampled_channels.get_samples(key_data) is None
+
+
+def test_clip_samples(baked_key_data):
+    samples = sampled_channels.get_samples(baked_key_data)
+    clipped = sampled_channels.clip_samples(samples, 20, 29.5)
+    assert clipped["start"] == 20.0
+    assert clipped["count"] == 10
+    assert sampled_channels.clip_samples(samples, 200, 300) is None
+    assert sampled_channels.clip_samples(samples) is samples
+
+
+def test_transform_samples(baked_key_data):
+    samples = sampled_channels.get_samples(baked_key_data)
+    transform = TimeTransform()
+    transform.convert_time_unit(24, 30)
+    transformed = sampled_channels.transform_samples(samples, transform)
+    assert transformed["start"] == pytest.approx(12.5)
+    assert transformed["step"] == pytest.approx(1.25)
+
+
+def test_split_and_concatenate(baked_key_data):
+    samples = sampled_channels.get_samples(baked_key_data)
+    blocks = sampled_channels.split_samples(samples, block_size=32)
+    assert [b[0] for b in blocks] == [0, 1, 2, 3]
+    joined = sampled_channels.concatenate_samples([b[1] for b in blocks])
+    assert joined == samples
+
+
+def test_samples_to_key_data(baked_key_data):
+    samples = sampled_channels.get_samples(baked_key_data)
+    key_data = sampled_channels.samples_to_key_data(samples)
+    assert list(key_data.keys()) == list(baked_key_data.keys())
+    for time, (value, tangent) in key_data.items():
+        assert value == pytest.approx(baked_key_data[time][0], abs=1e-6)
+        assert tangent[4:6] == ("linear", "linear")
+
+
+def test_sample_anim_data(baked_key_data, make_key_data):
+    path_data = {
+        "|node": {
+            "tx": {"attributeType": "doubleLinear", "keys": baked_key_data},
+            "ty": {"attributeType": "doubleLinear", "keys": make_key_data([0, 10])},
+        }
+    }
+    data = sampled_channels.sample_anim_data(path_data)
+    assert sampled_channels.is_sampled(data["|node"]["tx"])
+    assert "keys" not in data["|node"]["tx"]
+    assert not sampled_channels.is_sampled(data["|node"]["ty"])
+
+
+@pytest.fixture()
+def baked_key_data(make_key_data):
+    times = np.arange(10, 110, dtype=float)
+    return make_key_data(
+        times, np.sin(times * 0.1), in_type="linear", out_type="linear"
+    )
@@ -0,0 +1,53 @@
+import threading
+
+import serial_animator.archive_header as archive_header
+import serial_animator.save_queue as save_queue
+
+
+def test_save_queue(tmp_path):
+    queue = save_queue.SaveQueue()
+    changes = list()
+    queue.add_listener(lambda job: changes.append((job.out_path.name, job.state)))
+    capture_dir = tmp_path / "capture"
+    capture_dir.mkdir()
+    release = threading.Event()
+
+    def write(out_path, progress):
+        release.wait(5)
+        progress(0.5, "Writing archive")
+        return archive_header.write_archive(out_path, [], {}, kind="pose")
+
+    first = queue.submit(
+        tmp_path / "first.pose",
+        lambda progress: write(tmp_path / "first.pose", progress),
+        cleanup=[capture_dir],
+    )
+    second = queue.submit(
+        tmp_path / "second.pose",
+        lambda progress: write(tmp_path / "second.pose", progress),
+    )
+    assert queue.get_jobs() == [first, second]
+    release.set()
+    queue.wait(timeout=5)
+    assert first.state == second.state == save_queue.DONE
+    assert first.progress == 1.0
+    assert not queue.get_jobs()
+    assert not capture_dir.exists()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["first.pose", "second.pose"]
+    # jobs run in submission order
+    done = [name for name, state in changes if state == save_queue.DONE]
+    assert done == ["first.pose", "second.pose"]
+    assert ("first.pose", save_queue.PENDING) in changes
+
+
+def test_failed_save(tmp_path):
+    queue = save_queue.SaveQueue()
+
+    def write(progress):
+        raise OSError("disk full")
+
+    job = queue.submit(tmp_path / "failed.pose", write)
+    queue.wait(timeout=5)
+    assert job.state == save_queue.FAILED
+    assert isinstance(job.error, OSError)
+    assert not queue.get_jobs()